@@ -24,10 +24,139 @@ class Settings(BaseSettings):
     lancedb_dir: Path = ROOT_DIR / "db" / "lancedb"
     lancedb_table: str = "segments"
 
+    # Prebuilt read-only index bundle (python -m knowledge_base.bundle build)
+    bundle_dir: Path = ROOT_DIR / "bundles"
+    use_bundle: bool = True
+    bundle_verify: bool = True
+
     # Models
     embed_model: str = "models/text-embedding-004"
+    embed_dim: int = 768  # vectors returned by embed_model
+
+    # Embedding backend: "gemini" (embed_model via the API) or "hash" (local n-gram features, offline).
+    # Indexes must be rebuilt after switching; searches against a mismatched index fail.
+    embedder: str = "gemini"
+    hash_embed_dim: int = 4096
     chat_model: str = "gemini-2.0-flash"
 
+    # Generation model routing (backend/routing.py): "auto" picks a tier per question
+    # by type and context size; "fast", "default" (chat_model) or "large" pin one tier.
+    route_policy: str = "auto"
+    route_fast_model: str = "gemini-2.0-flash-lite"
+    route_fast_max_tokens: int = 300
+    route_default_max_tokens: int = 1024
+    route_large_model: str = "gemini-2.5-flash"
+    route_large_max_tokens: int = 2048
+    route_lookup_max_words: int = 12  # longer questions are not treated as lookups
+    route_fast_context_chars: int = 4000  # lookups over more context use the default tier
+    route_large_context_chars: int = 9000
+    route_latency_window: int = 50  # recent generations per model used for the p95 latency check
+    route_latency_max_age_s: float = 300.0  # older samples are ignored, so stepped-down tiers get retried
+
+    # Chunking. Part of the table version: changing it (or the embedder) builds a new table.
+    chunk_size: int = 1200
+    chunk_overlap: int = 200
+
+    # Sharded tables: "none", "collection" (one table per collection) or "hash"
+    # (shard_count tables by source_file). Searches fan out to all shards concurrently.
+    shard_by: str = "none"
+    shard_count: int = 4
+    shard_search_threads: int = 8
+
+    # Blue/green table versions (python -m knowledge_base.tables list|activate|cleanup)
+    active_table: str = ""  # pin a physical table; default follows the published pointer
+    table_versions_keep: int = 1  # older versions kept for rollback after a publish
+
+    # Startup warm-up (GET /ready returns 503 until it completes)
+    warmup_enabled: bool = True
+    warmup_embed: bool = True
+    warmup_query: str = ""  # optional synthetic question run end-to-end
+    warmup_retry_s: float = 5.0  # after a failed warm-up, retry on the next probe after this (doubling)
+    warmup_retry_max_s: float = 300.0
+
+    # Request tracing: "none" (IDs/headers only), "jsonl" or "otlp"
+    trace_exporter: str = "none"
+    trace_file: Path = ROOT_DIR / "traces" / "spans.jsonl"
+    otlp_endpoint: str = "http://localhost:4318"  # OTLP/HTTP collector; /v1/traces is appended
+    trace_queue_size: int = 1000  # finished traces waiting for export; more are dropped (and counted)
+    trace_export_backoff_max_s: float = 60.0  # after failed exports, traces are dropped for up to this long
+
+    # Opt-in request profiling (middleware is only installed when one is enabled)
+    profile_sample_rate: float = 0.0  # share of requests to profile, e.g. 0.01
+    profile_header: bool = False  # profile requests sent with "X-Profile: 1"
+    profile_paths: str = "/rag/"  # path prefix eligible for profiling
+    profile_format: str = "speedscope"  # "speedscope" (sampled stacks) or "pstats" (cProfile)
+    profile_interval_ms: float = 1.0
+    profile_dir: Path = ROOT_DIR / "profiles"
+
+    # Embedding quota (client-side rate limiting + retries)
+    embed_requests_per_minute: float = 1500
+    embed_tokens_per_minute: float = 1_000_000
+    embed_max_retries: int = 6
+    embed_batch_size: int = 100
+
+    # Precomputed FAQ answers (consulted by the API before running the RAG)
+    answer_store_path: Path = ROOT_DIR / "db" / "answers.sqlite"
+    faq_concurrency: int = 4
+
+    # Ingestion reads data/**/*.md directly (markup stripped in memory)
+    ingest_markdown: bool = True
+
+    # Ingestion pipeline: process pool -> async embedding -> batched writes
+    ingest_workers: int = 0  # 0 = os.cpu_count()
+    ingest_embed_concurrency: int = 4
+    ingest_queue_size: int = 64
+    ingest_write_batch_rows: int = 2000
+
+    # Background ingestion via POST /ingest (appends to the live table)
+    ingest_api_queue_size: int = 100
+    ingest_api_job_history: int = 500
+    ingest_api_save_sources: bool = True  # also write uploads to data/ so rebuilds keep them
+    ingest_api_enabled: bool = True  # serve.py turns it off with several workers (one writer per table)
+
+    # Exact + near-duplicate (MinHash/LSH) detection before embedding
+    dedup_enabled: bool = True
+    dedup_threshold: float = 0.85
+    dedup_num_perm: int = 128
+    dedup_bands: int = 32
+    dedup_shingle_size: int = 5
+
+    # Multi-query expansion with rank fusion: "off", "rules" or "llm"
+    query_expansion: str = "off"
+    query_expansion_variants: int = 3
+
+    # Neighbour-chunk expansion: grow each hit by chunk_index ± n (0 = off)
+    neighbor_window: int = 0
+
+    # End-to-end time budget per question; past it the answer is extractive (no LLM)
+    request_deadline_s: float = 30.0
+    generation_min_s: float = 1.0  # don't start generation with less time than this left
+    extractive_sentences: int = 3
+
+    # Chat sessions (POST /chat), in memory per worker process
+    chat_max_sessions: int = 1000  # least recently used sessions are evicted beyond this
+    chat_session_ttl_s: float = 1800
+    chat_history_turns: int = 3  # recent turns quoted verbatim; older ones are summarized
+    chat_answer_chars: int = 600  # per quoted answer
+    chat_summary_chars: int = 1200  # summary of older turns; oldest lines dropped first
+    chat_reuse_min_coverage: float = 0.7  # share of a follow-up's content words found in the previous context
+
+    # Memory budgets and diagnostics (knowledge_base/memory.py)
+    memory_budget_mb: float = 0  # process RSS cap; above it caches are trimmed (0 = off)
+    memory_check_interval_s: float = 5.0
+    memory_diagnostics: bool = False  # expose GET /debug/memory
+    memory_tracemalloc: bool = False  # trace allocations from startup (slows allocation down)
+    memory_tracemalloc_frames: int = 1
+    hash_cache_mb: float = 32  # HashEmbedder per-word features
+    chat_sessions_mb: float = 64
+    lance_cache_mb: float = 256  # LanceDB index cache; the metadata cache gets a quarter of it
+    lance_read_consistency_s: float = 5.0  # how stale an open table may be before it checks for new commits
+
+    # Query-focused context compression before generation
+    compress_context: bool = False
+    compress_max_chars: int = 2500
+    compress_min_sentence_chars: int = 30
+
 
 
 
@@ -1,41 +1,104 @@
+import asyncio
+import time
+from functools import lru_cache
+from typing import Literal
+
 from pydantic_ai import Agent
+from backend.config import settings
 from backend.data_models import RagResponse
 from backend.constants import VECTOR_DATABASE_PATH
+from backend.routing import choose_route, model_metrics
 import lancedb
 
 
-vector_db = lancedb.connect(uri=VECTOR_DATABASE_PATH)
+RetrievalMode = Literal["tool", "single"]
+
+SYSTEM_PROMPT = (
+    "You are Kokchun, a teacher in data engineering with deep expertise in the subject. "
+    "Always answer strictly based on the retrieved course material. "
+    "You may use your teaching experience to make the explanation clearer, but never invent information. "
+    "If the retrieved sources are not sufficient to answer the question, say so explicitly. "
+    "Keep the answer clear, concise, and straight to the point, with a maximum of 6 sentences. "
+    "Always mention which file or material was used as the source."
+)
+
+# Default model; single-round mode picks one per question (backend/routing.py).
+MODEL = f"google-gla:{settings.chat_model}"
+
+
+@lru_cache(maxsize=1)
+def get_vector_db():
+    # Connect on first use instead of at import time
+    return lancedb.connect(uri=VECTOR_DATABASE_PATH)
 
 
+def search_articles(query: str, k: int = 3) -> list[dict]:
+    return get_vector_db()["articles"].search(query=query).limit(k).to_list()
+
+
+def format_results(results: list[dict]) -> str:
+    """Compact, numbered context block: one header line + content per hit."""
+    if not results:
+        return "No matching course material found."
+    return "\n\n".join(
+        f"[{i}] {r['filename']} ({r['filepath']})\n{r['content'].strip()}"
+        for i, r in enumerate(results, start=1)
+    )
+
+
+# Tool-calling mode: the model decides when (and with which query) to retrieve.
+# Costs at least two LLM round trips: tool call, then answer.
 rag_agent = Agent(
-    model="google-gla:gemini-2.5-flash",
+    model=MODEL,
     retries=2,
-    system_prompt=(
-        "You are Kokchun, a teacher in data engineering with deep expertise in the subject. "
-        "Always answer strictly based on the retrieved course material. "
-        "You may use your teaching experience to make the explanation clearer, but never invent information. "
-        "If the retrieved sources are not sufficient to answer the question, say so explicitly. "
-        "Keep the answer clear, concise, and straight to the point, with a maximum of 6 sentences. "
-        "Always mention which file or material was used as the source."
-    ),
+    system_prompt=SYSTEM_PROMPT,
     output_type=RagResponse,
 )
 
 
-
 @rag_agent.tool_plain
 def retrieve_top_documents(query: str, k=3) -> str:
     """
     Uses vector search to find the closest k matching documents to the query
     """
-    results = vector_db["articles"].search(query=query).limit(k).to_list()
+    return format_results(search_articles(query, k))
+
+
+# Single-round mode: retrieve once up front and put the context into the
+# first (and only) LLM call.
+context_agent = Agent(
+    model=MODEL,
+    retries=2,
+    system_prompt=SYSTEM_PROMPT,
+    output_type=RagResponse,
+)
+
+
+def build_prompt(question: str, results: list[dict]) -> str:
+    return f"RETRIEVED COURSE MATERIAL:\n{format_results(results)}\n\nQUESTION:\n{question}"
+
+
+async def run_rag(question: str, mode: RetrievalMode = "single", k: int = 3):
+    """
+    Answer `question` with the chosen retrieval mode and return the agent run
+    result (`.output` is a RagResponse, `.usage()` counts LLM requests).
+    """
+    if mode == "tool":
+        return await rag_agent.run(question)
+    if mode == "single":
+        # The search embeds the question over the network: keep it off the event loop.
+        results = await asyncio.to_thread(search_articles, question, k)
+        prompt = build_prompt(question, results)
+        route = choose_route(question, len(prompt))
+        start = time.perf_counter()
+        result = await context_agent.run(
+            prompt, model=f"google-gla:{route.model}", model_settings={"max_tokens": route.max_tokens}
+        )
+        usage = result.usage()
+        model_metrics.record(route, time.perf_counter() - start, usage.input_tokens, usage.output_tokens)
+        return result
+    raise ValueError(f"Unknown retrieval mode: {mode!r}")
 
-    return f"""
-    
-    Filename: {results[0]["filename"]},
-    
-    Filepath: {results[0]["filepath"]},
 
-    Content: {results[0]["content"]}
-    
-    """
\ No newline at end of file
+async def ask(question: str, mode: RetrievalMode = "single", k: int = 3) -> RagResponse:
+    return (await run_rag(question, mode=mode, k=k)).output
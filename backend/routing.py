@@ -0,0 +1,180 @@
+"""
+Generation model routing. Picks the chat model and output cap per question
+from three tiers (settings.route_*):
+
+  - "fast":    short lookups ("what is X", "who", "when", yes/no) over a small
+               context; a lite model with a low max_tokens
+  - "default": settings.chat_model
+  - "large":   multi-part or explanatory questions ("how", "why", "compare",
+               several questions at once) or a large retrieved context
+
+settings.route_policy is "auto" (the rules above), or "fast", "default" or
+"large" to pin one tier. Routing is also latency-aware: every generation
+records its latency and tokens per model (model_metrics), and a tier whose
+recent p95 latency does not fit the request's remaining time budget is
+stepped down to the next faster tier. Samples older than
+settings.route_latency_max_age_s no longer count, so a stepped-down tier (which
+gets no traffic, hence no new samples) is tried again once its slow samples
+have aged out.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from backend.config import settings
+
+
+TIERS = ("fast", "default", "large")
+
+_WORD = re.compile(r"\w+")
+LOOKUP_START = re.compile(
+    r"^\s*(what\s+(is|are|does)|who|when|where|which|define|is|are|does|do|can)\b", re.IGNORECASE
+)
+EXPLAIN_WORDS = {
+    "how", "why", "explain", "compare", "comparison", "difference", "differences", "versus", "vs",
+    "pros", "cons", "tradeoffs", "steps", "walk", "design", "architecture", "example", "examples",
+}
+
+
+@dataclass
+class Route:
+    tier: str
+    model: str
+    max_tokens: int
+    reason: str
+    hint: str = ""  # appended to the prompt
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"tier": self.tier, "model": self.model, "max_tokens": self.max_tokens, "reason": self.reason}
+
+
+def classify_question(question: str) -> str:
+    """Classify as "lookup", "explain" or "general" from the wording alone."""
+    words = [w.lower() for w in _WORD.findall(question)]
+    if question.count("?") > 1 or EXPLAIN_WORDS & set(words):
+        return "explain"
+    if LOOKUP_START.match(question) and len(words) <= settings.route_lookup_max_words:
+        return "lookup"
+    return "general"
+
+
+def tier_route(tier: str, reason: str) -> Route:
+    if tier == "fast":
+        return Route(tier, settings.route_fast_model, settings.route_fast_max_tokens, reason,
+                     hint="Answer in at most three sentences.")
+    if tier == "large":
+        return Route(tier, settings.route_large_model, settings.route_large_max_tokens, reason)
+    if tier == "default":
+        return Route(tier, settings.chat_model, settings.route_default_max_tokens, reason)
+    raise ValueError(f"Unknown model tier {tier!r} (expected one of {', '.join(TIERS)})")
+
+
+def choose_route(question: str, context_chars: int, budget_s: Optional[float] = None,
+                 policy: Optional[str] = None) -> Route:
+    """Route for a question with `context_chars` of context and `budget_s` seconds left for generation."""
+    policy = policy or settings.route_policy
+    if policy in TIERS:
+        route = tier_route(policy, "policy")
+    elif policy != "auto":
+        raise ValueError(f"Unknown route policy {policy!r} (expected 'auto' or one of {', '.join(TIERS)})")
+    else:
+        kind = classify_question(question)
+        if kind == "explain":
+            route = tier_route("large", "explain")
+        elif context_chars >= settings.route_large_context_chars:
+            route = tier_route("large", "large_context")
+        elif kind == "lookup" and context_chars <= settings.route_fast_context_chars:
+            route = tier_route("fast", "lookup")
+        else:
+            route = tier_route("default", kind)
+
+    if budget_s is not None:
+        # Step down while the tier's recent p95 latency would not fit the time left.
+        tier = TIERS.index(route.tier)
+        while tier > 0:
+            p95 = model_metrics.p95(route.model)
+            if p95 is None or p95 <= budget_s:
+                break
+            tier -= 1
+            route = tier_route(TIERS[tier], f"latency:{route.tier}")
+            route.reason = f"{route.reason}>{budget_s:.1f}s"
+    return route
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ModelMetrics:
+    """Per-model generation latency (recent window, up to `max_age_s` old) and token counts; thread-safe."""
+
+    def __init__(self, window: int, max_age_s: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self._lock = threading.Lock()
+        self._window = window
+        self._max_age_s = max_age_s
+        self._clock = clock
+        self._latencies: Dict[str, Deque[Tuple[float, float]]] = {}  # (recorded at, seconds)
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._routes: Dict[str, int] = {}
+
+    def record(self, route: Route, seconds: Optional[float], input_tokens: int = 0, output_tokens: int = 0,
+               ok: bool = True) -> None:
+        """`seconds` is None for failures that say nothing about latency (quota errors)."""
+        with self._lock:
+            totals = self._totals.setdefault(route.model, {
+                "calls": 0, "errors": 0, "timed": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0,
+            })
+            totals["calls"] += 1
+            totals["errors"] += 0 if ok else 1
+            totals["input_tokens"] += input_tokens
+            totals["output_tokens"] += output_tokens
+            if seconds is not None:
+                totals["timed"] += 1
+                totals["seconds"] += seconds
+                self._latencies.setdefault(route.model, deque(maxlen=self._window)).append((self._clock(), seconds))
+            key = f"{route.tier}:{route.reason}"
+            self._routes[key] = self._routes.get(key, 0) + 1
+
+    def _recent(self, model: str) -> List[float]:
+        """Sorted latencies of `model` recorded within max_age_s (caller holds the lock)."""
+        oldest = self._clock() - self._max_age_s
+        return sorted(s for at, s in self._latencies.get(model, ()) if at >= oldest)
+
+    def p95(self, model: str) -> Optional[float]:
+        with self._lock:
+            recent = self._recent(model)
+        if len(recent) < 5:
+            return None  # too few calls to judge
+        return _percentile(recent, 0.95)
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            models = {}
+            for model, totals in self._totals.items():
+                recent = self._recent(model)
+                calls, ok = int(totals["calls"]), int(totals["calls"] - totals["errors"])
+                models[model] = {
+                    "calls": calls,
+                    "errors": int(totals["errors"]),
+                    "mean_ms": round(1000 * totals["seconds"] / totals["timed"], 1) if totals["timed"] else None,
+                    "p50_ms": round(1000 * _percentile(recent, 0.5), 1) if recent else None,
+                    "p95_ms": round(1000 * _percentile(recent, 0.95), 1) if recent else None,
+                    "mean_input_tokens": round(totals["input_tokens"] / ok, 1) if ok else None,
+                    "mean_output_tokens": round(totals["output_tokens"] / ok, 1) if ok else None,
+                }
+            return {"policy": settings.route_policy, "models": models, "routes": dict(self._routes)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._latencies.clear()
+            self._totals.clear()
+            self._routes.clear()
+
+
+model_metrics = ModelMetrics(settings.route_latency_window, settings.route_latency_max_age_s)
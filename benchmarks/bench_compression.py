@@ -0,0 +1,86 @@
+"""
+Measure prompt size and latency with and without context compression.
+
+    uv run python -m benchmarks.bench_compression [--questions benchmarks/questions.txt] [--llm]
+
+Retrieval runs once per question; the same chunks are then formatted raw and
+compressed. Without --llm only prompt tokens and compression overhead are
+reported; with --llm each prompt is also sent to the agent to time generation.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+from backend.config import settings
+from knowledge_base.compression import compress_chunks
+from knowledge_base.rag_agent import agent, build_prompt
+from knowledge_base.rate_limit import estimate_tokens
+from knowledge_base.retriever import embed_query, retrieve
+from knowledge_base.warm_faq import read_questions
+
+
+HERE = Path(__file__).resolve().parent
+
+
+async def run(questions, k: int, with_llm: bool) -> None:
+    raw_tokens, small_tokens, compress_ms = [], [], []
+    raw_llm_ms, small_llm_ms = [], []
+
+    for q in questions:
+        qvec = embed_query(q)
+        chunks = retrieve(q, k=k, qvec=qvec)
+        if not chunks:
+            print(f"[SKIP] {q!r}: no chunks")
+            continue
+
+        start = time.perf_counter()
+        small = compress_chunks(
+            chunks,
+            qvec,
+            max_chars=settings.compress_max_chars,
+            min_sentence_chars=settings.compress_min_sentence_chars,
+        )
+        compress_ms.append(1000 * (time.perf_counter() - start))
+
+        raw_prompt = build_prompt(q, chunks)
+        small_prompt = build_prompt(q, small)
+        raw_tokens.append(estimate_tokens([raw_prompt]))
+        small_tokens.append(estimate_tokens([small_prompt]))
+
+        if with_llm:
+            for prompt, sink in ((raw_prompt, raw_llm_ms), (small_prompt, small_llm_ms)):
+                start = time.perf_counter()
+                await agent.run(prompt)
+                sink.append(1000 * (time.perf_counter() - start))
+
+        print(f"[OK] {q!r}: {raw_tokens[-1]} -> {small_tokens[-1]} tokens")
+
+    if not raw_tokens:
+        return
+    mean_raw, mean_small = statistics.mean(raw_tokens), statistics.mean(small_tokens)
+    print(f"\nquestions:           {len(raw_tokens)}")
+    print(f"prompt tokens (mean): {mean_raw:.0f} -> {mean_small:.0f} ({100 * (1 - mean_small / mean_raw):.0f}% fewer)")
+    print(f"compression (mean):   {statistics.mean(compress_ms):.0f} ms (incl. sentence embedding)")
+    if with_llm:
+        mean_raw_ms, mean_small_ms = statistics.mean(raw_llm_ms), statistics.mean(small_llm_ms)
+        print(f"generation (mean):    {mean_raw_ms:.0f} ms -> {mean_small_ms:.0f} ms")
+        print(
+            "end-to-end delta:     "
+            f"{mean_small_ms + statistics.mean(compress_ms) - mean_raw_ms:+.0f} ms per question"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=Path, default=HERE / "questions.txt")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--llm", action="store_true", help="also time generation")
+    args = parser.parse_args()
+    asyncio.run(run(read_questions(args.questions), args.k, args.llm))
+
+
+if __name__ == "__main__":
+    main()
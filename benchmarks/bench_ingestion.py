@@ -0,0 +1,95 @@
+"""
+Ingestion pipeline throughput vs. worker count on a synthetic corpus.
+
+    uv run python -m benchmarks.bench_ingestion --files 10000 --workers 1 2 4 8
+
+Generates markdown transcripts in a temp dir and runs run_pipeline against a
+temp LanceDB with a stub embedder (fixed latency per call, no network), so
+the numbers show how the CPU stage scales and whether it keeps the embedding
+stage fed.
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import lancedb
+import numpy as np
+
+from backend.config import settings
+from knowledge_base import ingestion
+
+
+WORDS = (
+    "data pipeline lancedb vector embedding fastapi azure function pydantic gemini model "
+    "query chunk table schema docker deploy python dataframe duckdb sql join index cloud "
+    "so um basically like you know right okay let's see here we go now then"
+).split()
+
+
+def make_corpus(root: Path, n_files: int, chars: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    for i in range(n_files):
+        words, size = [], 0
+        while size < chars:
+            w = rng.choice(WORDS)
+            words.append(w)
+            size += len(w) + 1
+        paras = [" ".join(words[j:j + 120]) for j in range(0, len(words), 120)]
+        body = "\n\n".join(f"**Speaker:** [00:{j % 60:02d}:00] {p}." for j, p in enumerate(paras))
+        (root / f"video_{i:05d}.md").write_text(f"# Video {i}\n\n{body}\n", encoding="utf-8")
+
+
+def stub_embedder(dim: int, latency_ms: float):
+    def embed(texts):
+        time.sleep(latency_ms / 1000)
+        rng = np.random.default_rng(len(texts))
+        return rng.random((len(texts), dim), dtype=np.float32).tolist()
+
+    return embed
+
+
+def run_once(files, db_dir: Path, workers: int, concurrency: int, embed) -> ingestion.PipelineStats:
+    settings.lancedb_dir = db_dir
+    db = lancedb.connect(str(db_dir))
+    cp, table = ingestion.start_or_resume(db, embed, fresh=True)
+    stats = asyncio.run(ingestion.run_pipeline(files, cp, table, embed, workers=workers, concurrency=concurrency))
+    db.drop_table(cp.table)
+    ingestion.Checkpoint.clear()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--chars", type=int, default=6_000, help="approx. characters per transcript")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--concurrency", type=int, default=8, help="embedding tasks")
+    parser.add_argument("--embed-ms", type=float, default=20, help="stub latency per embedding call")
+    parser.add_argument("--dim", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus, db_dir = Path(tmp) / "corpus", Path(tmp) / "db"
+        corpus.mkdir()
+        print(f"Generating {args.files} transcripts (~{args.chars} chars each)...")
+        make_corpus(corpus, args.files, args.chars)
+        files = sorted(corpus.glob("*.md"))
+        embed = stub_embedder(args.dim, args.embed_ms)
+
+        print(f"{'workers':>7} {'seconds':>8} {'files/s':>9} {'chunks/s':>9} {'speedup':>8}")
+        base = None
+        for w in args.workers:
+            stats = run_once(files, db_dir, w, args.concurrency, embed)
+            base = base or stats.seconds
+            print(
+                f"{w:>7} {stats.seconds:>8.1f} {stats.files / stats.seconds:>9.0f} "
+                f"{stats.chunks / stats.seconds:>9.0f} {base / stats.seconds:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Per-request overhead of the Azure Functions proxy (function_app.py) over calling the ASGI app directly.
+
+    uv run python -m benchmarks.bench_proxy --requests 5000
+
+Each mode sends the same request to the FastAPI app in-process, sequentially:
+
+  - direct:      the ASGI app called with a hand-built scope (what uvicorn does)
+  - proxy:       function_app.fastapi_proxy, i.e. func.HttpRequest -> the
+                 module-level AsgiMiddleware -> app -> func.HttpResponse
+  - per-request: a new AsgiMiddleware for every request, as the removed
+                 knowledge_base/f-a.py and frontend/f-aa.py entry points did
+
+The difference between proxy and direct is what the Functions host adapter
+costs per request, on top of the host's own HTTP handling.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+
+async def call_asgi(app, method: str, path: str, body: bytes = b"") -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1234), "server": ("localhost", 80),
+    }
+    sent = False
+    status = 0
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def timed(fn: Callable[[], Awaitable[int]], n: int) -> List[float]:
+    for _ in range(min(200, n)):
+        assert await fn() == 200
+    out = []
+    for _ in range(n):
+        start = time.perf_counter()
+        await fn()
+        out.append(1e6 * (time.perf_counter() - start))
+    return out
+
+
+async def main_async(args) -> None:
+    import azure.functions as func
+    from azure.functions import AsgiMiddleware
+
+    import function_app
+    from knowledge_base.api import app
+
+    proxy = function_app.fastapi_proxy.build().get_user_function()
+
+    def request() -> func.HttpRequest:
+        return func.HttpRequest(method="GET", url=f"http://localhost{args.path}", headers={}, params={}, body=b"")
+
+    async def via_proxy() -> int:
+        return (await proxy(request(), None)).status_code
+
+    async def per_request() -> int:
+        return (await AsgiMiddleware(app).handle_async(request(), None)).status_code
+
+    modes = {
+        "direct": lambda: call_asgi(app, "GET", args.path),
+        "proxy": via_proxy,
+        "per-request": per_request,
+    }
+    results = {name: await timed(fn, args.requests) for name, fn in modes.items()}
+    base = statistics.median(results["direct"])
+    print(f"GET {args.path}, {args.requests} sequential requests per mode (µs)")
+    print(f"{'mode':<12} {'p50':>8} {'p99':>8} {'overhead p50':>13}")
+    for name, us in results.items():
+        us.sort()
+        p50, p99 = statistics.median(us), us[int(0.99 * (len(us) - 1))]
+        print(f"{name:<12} {p50:>8.1f} {p99:>8.1f} {p50 - base:>+13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--path", default="/test", help="a cheap GET route, so the adapter dominates")
+    args = parser.parse_args()
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
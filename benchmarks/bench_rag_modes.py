@@ -0,0 +1,96 @@
+"""
+Compare LLM round trips and end-to-end latency of backend.rag retrieval modes.
+
+    uv run python -m benchmarks.bench_rag_modes                    # real Gemini + LanceDB
+    uv run python -m benchmarks.bench_rag_modes --offline --llm-ms 600
+
+--offline swaps in a stub LLM (FunctionModel that sleeps --llm-ms per call)
+and a stub retriever, so the numbers isolate the cost of the extra round trip.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import statistics
+import time
+
+from backend import rag
+
+
+QUESTIONS = [
+    "What is LanceDB?",
+    "How do I deploy a FastAPI app to Azure?",
+    "What is Pydantic used for?",
+    "How does logistic regression work?",
+    "What is dlt?",
+]
+
+
+def install_offline_stubs(llm_ms: float):
+    """Patch retrieval and return a stub model to override both agents with."""
+    from pydantic_ai.messages import ModelResponse, ToolCallPart, ToolReturnPart
+    from pydantic_ai.models.function import FunctionModel
+
+    def fake_search(query: str, k: int = 3) -> list[dict]:
+        return [
+            {"filename": f"doc_{i}", "filepath": f"/data/doc_{i}.md", "content": f"Notes about {query}. " * 40}
+            for i in range(k)
+        ]
+
+    async def fake_llm(messages, info):
+        await asyncio.sleep(llm_ms / 1000)
+        already_retrieved = any(
+            isinstance(part, ToolReturnPart) for m in messages for part in getattr(m, "parts", [])
+        )
+        if info.function_tools and not already_retrieved:
+            return ModelResponse(parts=[ToolCallPart("retrieve_top_documents", {"query": "q"})])
+        answer = {"filename": "doc_0", "filepath": "/data/doc_0.md", "answer": "stub answer"}
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, answer)])
+
+    rag.search_articles = fake_search
+    return FunctionModel(fake_llm)
+
+
+async def bench_mode(mode: str, questions: list[str], repeat: int) -> dict:
+    latencies, round_trips = [], []
+    for _ in range(repeat):
+        for q in questions:
+            start = time.perf_counter()
+            result = await rag.run_rag(q, mode=mode)
+            latencies.append(time.perf_counter() - start)
+            round_trips.append(result.usage().requests)
+    latencies.sort()
+    return {
+        "mode": mode,
+        "runs": len(latencies),
+        "llm_round_trips": statistics.mean(round_trips),
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p95_ms": 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "mean_ms": 1000 * statistics.mean(latencies),
+    }
+
+
+async def main_async(args) -> None:
+    with contextlib.ExitStack() as stack:
+        if args.offline:
+            model = install_offline_stubs(args.llm_ms)
+            stack.enter_context(rag.rag_agent.override(model=model))
+            stack.enter_context(rag.context_agent.override(model=model))
+        for mode in ("tool", "single"):
+            r = await bench_mode(mode, QUESTIONS, args.repeat)
+            print(
+                f"{r['mode']:>6}: runs={r['runs']} round_trips={r['llm_round_trips']:.2f} "
+                f"p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms mean={r['mean_ms']:.0f}ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--offline", action="store_true", help="stub LLM and retriever")
+    parser.add_argument("--llm-ms", type=float, default=500, help="stub LLM latency per call")
+    parser.add_argument("--repeat", type=int, default=2)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Measure vector search latency on one table vs. the same rows hash-sharded.
+
+    uv run python -m benchmarks.bench_shards [--rows 20000,100000] [--shards 1,2,4,8] [--dim 256]
+
+Builds synthetic corpora (random unit vectors, 10 chunks per source file,
+two collections) in a temporary LanceDB directory, then times
+`search(q).where("collection = 'transcripts'").limit(k)` through
+ShardedTable with each shard count. 1 shard is the unsharded baseline.
+Shards are searched on settings.shard_search_threads threads, so the gain
+depends on the number of cores available.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+
+from knowledge_base.shards import ShardedTable
+
+
+def make_rows(n: int, dim: int, rng: np.random.Generator):
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [
+        {"collection": "transcripts" if i % 4 else "notes", "source_file": f"video_{i // 10}.md",
+         "chunk_index": i % 10, "text": f"chunk {i}", "embedding": vectors[i].tolist()}
+        for i in range(n)
+    ]
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def run(rows_list, shard_counts, dim: int, queries: int, k: int) -> None:
+    rng = np.random.default_rng(0)
+    schema = pa.schema([
+        ("collection", pa.string()),
+        ("source_file", pa.string()),
+        ("chunk_index", pa.int64()),
+        ("text", pa.string()),
+        ("embedding", pa.list_(pa.float32(), dim)),
+    ])
+    qvecs = rng.normal(size=(queries, dim)).astype(np.float32)
+
+    print(f"{'rows':>8} {'shards':>6} {'p50 ms':>8} {'p95 ms':>8} {'vs 1':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = lancedb.connect(tmp)
+        for n in rows_list:
+            rows = make_rows(n, dim, rng)
+            baseline = None
+            for count in shard_counts:
+                table = ShardedTable.create(db, f"bench_{n}_{count}", schema, "hash", count)
+                table.add(rows)
+                table.search(qvecs[0]).limit(k).to_list()  # warm up file handles
+                times = []
+                for q in qvecs:
+                    start = time.perf_counter()
+                    table.search(q).where("collection = 'transcripts'").limit(k).to_list()
+                    times.append(1000 * (time.perf_counter() - start))
+                p50 = statistics.median(times)
+                baseline = baseline or p50
+                print(f"{n:>8} {count:>6} {p50:>8.1f} {percentile(times, 95):>8.1f} {baseline / p50:>5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="20000,100000", help="comma-separated corpus sizes")
+    parser.add_argument("--shards", default="1,2,4,8", help="comma-separated shard counts")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    run(
+        [int(n) for n in args.rows.split(",")],
+        [int(c) for c in args.shards.split(",")],
+        args.dim,
+        args.queries,
+        args.k,
+    )
+
+
+if __name__ == "__main__":
+    main()
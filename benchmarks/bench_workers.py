@@ -0,0 +1,145 @@
+"""
+Memory and throughput of the pre-fork server (knowledge_base/serve.py) for 1..N workers.
+
+    uv run python -m benchmarks.bench_workers --workers 1 2 4 --rows 100000 --duration 15
+
+For each worker count the app is started in a subprocess with the stand-in
+backends from benchmarks/load_test.py (synthetic memory-mapped bundle, stub
+embedding and LLM), loaded closed-loop, then every worker's memory is read
+from /proc/<pid>/smaps_rollup (Linux only):
+
+  - RSS counts every resident page, including bundle pages shared with the
+    other workers, so it overstates the real cost of a worker
+  - PSS splits shared pages between the processes mapping them; the sum of
+    PSS over master + workers is the physical memory the server uses
+
+Throughput only scales with workers up to the number of CPUs; with the default
+stand-ins most request time is spent waiting on the (stub) LLM, so a single
+worker already overlaps many requests and extra workers mostly add headroom
+for the CPU-bound parts (search, JSON, routing).
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.load_test import HERE, free_port, install_stand_ins, run_load, wait_ready
+
+
+def serve(args) -> None:
+    from knowledge_base import serve as server
+
+    with tempfile.TemporaryDirectory() as tmp:
+        install_stand_ins(Path(tmp), args.rows, args.embed_ms, args.llm_ms, args.jitter)
+        from knowledge_base.api import app
+
+        server.serve(app, "127.0.0.1", args.port, args.serve)
+
+
+def children(pid: int) -> List[int]:
+    out = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # Fields after the ")" closing the command name: state, ppid, ...
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            out.append(int(entry.name))
+    return sorted(out)
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    fields = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":", 1)
+        fields[key] = int(value.split()[0])
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "shared": fields["Shared_Clean"] + fields["Shared_Dirty"]}
+
+
+async def measure(args, workers: int, questions: List[str]) -> Dict:
+    port = free_port()
+    cmd = [
+        sys.executable, "-m", "benchmarks.bench_workers", "--serve", str(workers), "--port", str(port),
+        "--rows", str(args.rows), "--embed-ms", str(args.embed_ms), "--llm-ms", str(args.llm_ms),
+        "--jitter", str(args.jitter),
+    ]
+    env = {**os.environ, "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "bench")}
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient() as client:
+            await wait_ready(client, base, timeout=120)
+        load_args = argparse.Namespace(
+            concurrency=args.concurrency, rate=0, duration=args.duration, fast_ratio=args.fast_ratio,
+            timeout=60, seed=0,
+        )
+        report = await run_load(f"{base}/rag/query", load_args, questions)
+        pids = children(proc.pid)
+        mem = [memory_kb(pid) for pid in pids]
+        master = memory_kb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    mb = 1024
+    return {
+        "workers": len(pids),
+        "throughput_rps": report["throughput_rps"],
+        "p50_ms": report["p50_ms"],
+        "p99_ms": report["p99_ms"],
+        "rss_per_worker_mb": round(sum(m["rss"] for m in mem) / len(mem) / mb, 1),
+        "pss_per_worker_mb": round(sum(m["pss"] for m in mem) / len(mem) / mb, 1),
+        "shared_per_worker_mb": round(sum(m["shared"] for m in mem) / len(mem) / mb, 1),
+        "total_pss_mb": round((master["pss"] + sum(m["pss"] for m in mem)) / mb, 1),
+        "sum_rss_mb": round((master["rss"] + sum(m["rss"] for m in mem)) / mb, 1),
+    }
+
+
+async def main_async(args) -> None:
+    questions = [q.strip() for q in (HERE / "questions.txt").read_text(encoding="utf-8").splitlines()
+                 if q.strip() and not q.startswith("#")]
+    print(f"rows={args.rows} concurrency={args.concurrency} duration={args.duration}s cpus={os.cpu_count()}")
+    header = (f"{'workers':>7} {'req/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'RSS/w MB':>9} "
+              f"{'PSS/w MB':>9} {'shared/w':>9} {'sum RSS':>8} {'total PSS':>9}")
+    print(header)
+    for n in args.workers:
+        r = await measure(args, n, questions)
+        print(f"{r['workers']:>7} {r['throughput_rps']:>7} {r['p50_ms']:>7} {r['p99_ms']:>7} "
+              f"{r['rss_per_worker_mb']:>9} {r['pss_per_worker_mb']:>9} {r['shared_per_worker_mb']:>9} "
+              f"{r['sum_rss_mb']:>8} {r['total_pss_mb']:>9}")
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic bundle rows")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15, help="seconds per worker count")
+    parser.add_argument("--fast-ratio", type=float, default=0.0, help="share of requests with mode=fast")
+    parser.add_argument("--embed-ms", type=float, default=80)
+    parser.add_argument("--llm-ms", type=float, default=1200)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--serve", type=int, metavar="WORKERS", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+HTTP load test for /rag/query with local stand-in embedding and LLM backends.
+
+    uv run python -m benchmarks.load_test --concurrency 32 --rate 40 --duration 30
+    uv run python -m benchmarks.load_test --target proxy     # through function_app.py's AsgiMiddleware
+    uv run python -m benchmarks.load_test --save-baseline load_baseline.json
+    uv run python -m benchmarks.load_test --baseline load_baseline.json   # exit 1 on regression
+    uv run python -m benchmarks.load_test --url https://<app>/rag/query  # existing deployment
+
+By default the app runs in a subprocess (so the load generator does not share
+its GIL) with the real request path: FastAPI routing, answer store lookup,
+deadline handling and exact search over a synthetic memory-mapped bundle.
+Only the network backends are replaced: embedding calls sleep --embed-ms and
+return vectors near a corpus row, the LLM sleeps --llm-ms. Latencies get
+log-normal jitter (--jitter) so tails look like real provider tails.
+
+With --rate, arrivals are open-loop Poisson and latency is measured from the
+scheduled send time, so queueing caused by a saturated server is counted
+(no coordinated omission). With --rate 0, `concurrency` users send back to back.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+
+import httpx
+import numpy as np
+
+
+HERE = Path(__file__).resolve().parent
+DIM = 64
+
+
+# --- server side: stand-in backends ------------------------------------------
+
+
+def jittered(ms: float, jitter: float) -> float:
+    """Latency in seconds: `ms` scaled by a log-normal factor with median 1."""
+    return ms / 1000 * (random.lognormvariate(0, jitter) if jitter > 0 else 1.0)
+
+
+def install_stand_ins(tmp: Path, rows: int, embed_ms: float, llm_ms: float, jitter: float) -> None:
+    """Point the app at a synthetic bundle and swap Gemini (embeddings + LLM) for local stubs."""
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ModelResponse, TextPart
+    from pydantic_ai.models.function import FunctionModel
+
+    from backend.config import settings
+    from knowledge_base import bundle, embedders, rag_agent
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(rows, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    words = "lancedb fastapi azure pydantic gemini asgi embedding vector chunk deploy streamlit".split()
+    texts = [
+        f"In this part we talk about {words[i % len(words)]}. " + "Some transcript sentence here. " * 30
+        for i in range(rows)
+    ]
+
+    settings.bundle_dir = tmp / "bundles"
+    settings.use_bundle = True
+    settings.answer_store_path = tmp / "answers.sqlite"
+    settings.warmup_query = ""
+    bundle.write_bundle(
+        bundle.bundle_path("load"),
+        vectors=vectors,
+        texts=texts,
+        source_files=[f"video_{i // 20:04d}.md" for i in range(rows)],
+        chunk_indices=[i % 20 for i in range(rows)],
+        collections=["transcripts"] * rows,
+        char_spans=[(0, len(t)) for t in texts],
+        meta={"version": "load", "embed_model": "stand-in"},
+    )
+    bundle.activate("load")
+
+    class StandInEmbedder(embedders.Embedder):
+        name, dim = "stand-in", DIM
+
+        def embed(self, texts, deadline=None):
+            time.sleep(jittered(embed_ms, jitter))
+            out = []
+            for t in texts:
+                seed = int.from_bytes(hashlib.sha1(t.encode("utf-8")).digest()[:4], "little")
+                v = vectors[seed % rows] + np.random.default_rng(seed).normal(scale=0.02, size=DIM)
+                out.append(v.astype(np.float32).tolist())
+            return out
+
+    async def llm(messages, info):
+        await asyncio.sleep(jittered(llm_ms, jitter))
+        return ModelResponse(parts=[TextPart("Stub answer.\n\nSources\n- (video_0000.md, chunk 0)")])
+
+    embedders.set_embedder(StandInEmbedder())
+    stand_in = FunctionModel(llm)
+    rag_agent.agent = Agent(model=stand_in, system_prompt=rag_agent.SYSTEM_PROMPT)
+    rag_agent.get_model = lambda name: stand_in  # every routed tier (backend/routing.py)
+
+
+def proxy_app():
+    """
+    ASGI shim standing in for the Functions host: each HTTP request becomes a
+    func.HttpRequest handed to function_app.py's proxy function, as in Azure
+    (which also sends no lifespan events to the FastAPI app).
+    """
+    import azure.functions as func
+
+    import function_app
+
+    handler = function_app.fastapi_proxy.build().get_user_function()
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while (message := await receive())["type"] != "lifespan.shutdown":
+                await send({"type": "lifespan.startup.complete"})
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        query = scope["query_string"].decode()
+        req = func.HttpRequest(
+            method=scope["method"],
+            url=f"http://localhost{scope['path']}" + (f"?{query}" if query else ""),
+            headers={k.decode(): v.decode() for k, v in scope["headers"]},
+            params=dict(parse_qsl(query)),
+            body=body,
+        )
+        resp = await handler(req, None)
+        headers = [(k.encode(), v.encode()) for k, v in resp.headers.items()]
+        await send({"type": "http.response.start", "status": resp.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": resp.get_body()})
+
+    return app
+
+
+def serve(args) -> None:
+    import uvicorn
+
+    with tempfile.TemporaryDirectory() as tmp:
+        install_stand_ins(Path(tmp), args.rows, args.embed_ms, args.llm_ms, args.jitter)
+        if args.target == "proxy":
+            app = proxy_app()
+        else:
+            from knowledge_base.api import app
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "benchmarks.load_test", "--serve",
+        "--target", args.target, "--port", str(args.port), "--rows", str(args.rows),
+        "--embed-ms", str(args.embed_ms), "--llm-ms", str(args.llm_ms), "--jitter", str(args.jitter),
+    ]
+    env = {**os.environ, "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "load-test")}
+    return subprocess.Popen(cmd, env=env)
+
+
+async def wait_ready(client: httpx.AsyncClient, base: str, timeout: float = 60) -> None:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            if (await client.get(f"{base}/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{base} did not become ready within {timeout}s")
+
+
+# --- client side: load generation --------------------------------------------
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def summarize(latencies: List[float], statuses: Counter, seconds: float) -> Dict:
+    total = sum(statuses.values())
+    ok = statuses.get(200, 0)
+    return {
+        "requests": total,
+        "ok": ok,
+        "error_rate": round((total - ok) / total, 4) if total else 0.0,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "throughput_rps": round(ok / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(max(latencies), 1) if latencies else 0.0,
+    }
+
+
+def payloads(questions: List[str], fast_ratio: float, rng: random.Random):
+    while True:
+        payload = {"prompt": rng.choice(questions)}
+        if rng.random() < fast_ratio:
+            payload["mode"] = "fast"
+        yield payload
+
+
+async def run_load(url: str, args, questions: List[str]) -> Dict:
+    rng = random.Random(args.seed)
+    make = payloads(questions, args.fast_ratio, rng)
+    latencies: List[float] = []  # successful requests only, in ms
+    statuses: Counter = Counter()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def one(payload: Dict, scheduled: float) -> None:
+            async with sem:
+                try:
+                    res = await client.post(url, json=payload)
+                    status = res.status_code
+                except httpx.TimeoutException:
+                    status = "timeout"
+                except httpx.TransportError:
+                    status = "connection_error"
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(1000 * (time.perf_counter() - scheduled))
+
+        start = time.perf_counter()
+        end = start + args.duration
+        if args.rate > 0:
+            tasks = []
+            next_at = start
+            while next_at < end:
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                tasks.append(asyncio.create_task(one(next(make), next_at)))
+                next_at += rng.expovariate(args.rate)
+            await asyncio.gather(*tasks)
+        else:
+
+            async def user() -> None:
+                while time.perf_counter() < end:
+                    await one(next(make), time.perf_counter())
+
+            await asyncio.gather(*(user() for _ in range(args.concurrency)))
+        seconds = time.perf_counter() - start
+
+    return summarize(latencies, statuses, seconds)
+
+
+def regressions(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Human-readable list of metrics that got worse than `baseline` by more than `tolerance`."""
+    problems = []
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        if report[key] > baseline[key] * (1 + tolerance):
+            problems.append(f"{key} {report[key]} > baseline {baseline[key]} (+{tolerance:.0%})")
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        problems.append(
+            f"throughput_rps {report['throughput_rps']} < baseline {baseline['throughput_rps']} (-{tolerance:.0%})"
+        )
+    if report["error_rate"] > baseline["error_rate"] + 0.01:
+        problems.append(f"error_rate {report['error_rate']} > baseline {baseline['error_rate']} + 0.01")
+    return problems
+
+
+def print_report(report: Dict) -> None:
+    print(
+        f"requests={report['requests']} ok={report['ok']} error_rate={report['error_rate']:.2%} "
+        f"throughput={report['throughput_rps']}/s"
+    )
+    print(
+        f"latency p50={report['p50_ms']}ms p95={report['p95_ms']}ms "
+        f"p99={report['p99_ms']}ms max={report['max_ms']}ms"
+    )
+    print("statuses:", report["statuses"])
+
+
+async def main_async(args) -> int:
+    questions = [q.strip() for q in args.questions.read_text(encoding="utf-8").splitlines()
+                 if q.strip() and not q.startswith("#")]
+
+    server: Optional[subprocess.Popen] = None
+    url = args.url
+    try:
+        if url is None:
+            args.port = args.port or free_port()
+            server = start_server(args)
+            base = f"http://127.0.0.1:{args.port}"
+            url = f"{base}/rag/query"
+            async with httpx.AsyncClient() as client:
+                await wait_ready(client, base)
+
+        print(f"Target {url}: concurrency={args.concurrency} rate={args.rate or 'closed-loop'} "
+              f"duration={args.duration}s")
+        report = await run_load(url, args, questions)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    report["config"] = {
+        k: getattr(args, k)
+        for k in ("target", "concurrency", "rate", "duration", "fast_ratio", "embed_ms", "llm_ms", "jitter", "rows")
+    }
+    print_report(report)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print("Saved baseline to", args.save_baseline)
+    if args.baseline:
+        problems = regressions(report, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        for p in problems:
+            print("[REGRESSION]", p)
+        if problems:
+            return 1
+        print("No regression against", args.baseline)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="load an already running endpoint instead of starting the app")
+    parser.add_argument("--target", choices=["api", "proxy"], default="api")
+    parser.add_argument("--concurrency", type=int, default=16, help="max in-flight requests")
+    parser.add_argument("--rate", type=float, default=0, help="arrivals/s (Poisson); 0 = closed loop")
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--questions", type=Path, default=HERE / "questions.txt")
+    parser.add_argument("--fast-ratio", type=float, default=0.0, help="share of requests with mode=fast")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--embed-ms", type=float, default=80, help="stand-in embedding latency")
+    parser.add_argument("--llm-ms", type=float, default=1200, help="stand-in LLM latency")
+    parser.add_argument("--jitter", type=float, default=0.3, help="sigma of the log-normal latency factor")
+    parser.add_argument("--rows", type=int, default=20_000, help="synthetic bundle rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
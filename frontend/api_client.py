@@ -0,0 +1,168 @@
+"""
+Reusable HTTP client for the RAG API.
+
+One `requests.Session` per process keeps TCP/TLS connections to Azure alive
+between questions; the Streamlit app caches the client with st.cache_resource
+so it survives reruns. Answers are cached per browser session (see
+app_streamlit.py), and `stream()` consumes server-sent events / NDJSON when
+the API streams, falling back to a single JSON answer otherwise.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+
+class AnswerCache:
+    """Small LRU cache of prompt -> answer."""
+
+    def __init__(self, maxsize: int = 64) -> None:
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, prompt: str) -> Optional[str]:
+        key = normalize_prompt(prompt)
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, prompt: str, answer: str) -> None:
+        key = normalize_prompt(prompt)
+        self._items[key] = answer
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class RagClient:
+    def __init__(
+        self,
+        api_url: str,
+        function_key: Optional[str] = None,
+        timeout: float = 120,
+        pool_size: int = 4,
+        deadline_s: Optional[float] = None,
+    ) -> None:
+        self.api_url = api_url
+        self.timeout = timeout
+        # Server-side time budget; the API answers extractively rather than run past it.
+        self.deadline_s = deadline_s
+        # If auth_level=FUNCTION in Azure, the key is passed as query param ?code=...
+        self.params = {"code": function_key} if function_key else None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def post(self, prompt: str, stream: bool = False) -> requests.Response:
+        payload = {"prompt": prompt}  # matches OpenAPI schema: Prompt(prompt: str, ...)
+        if self.deadline_s is not None:
+            payload["deadline_s"] = self.deadline_s
+        return self.session.post(
+            self.api_url,
+            json=payload,
+            params=self.params,
+            timeout=self.timeout,
+            stream=stream,
+        )
+
+    def ask(self, prompt: str, cache: Optional[AnswerCache] = None) -> Dict:
+        """
+        POST a question and return the decoded JSON body.
+        Raises requests.HTTPError for non-2xx and ValueError for non-JSON bodies.
+        """
+        if cache is not None:
+            hit = cache.get(prompt)
+            if hit is not None:
+                return {"answer": hit, "cached": True}
+
+        response = self.post(prompt)
+        response.raise_for_status()
+        data = response.json()
+
+        answer = data.get("answer") or data.get("result")
+        # Extractive fallbacks (generation timed out) are worth retrying later, not caching.
+        if cache is not None and answer and data.get("mode") != "extractive":
+            cache.put(prompt, answer)
+        return data
+
+    def stream(self, prompt: str, cache: Optional[AnswerCache] = None) -> Iterator[str]:
+        """
+        Yield the answer incrementally. Understands `text/event-stream`
+        (`data: ...` lines) and NDJSON (`{"delta": ...}` per line); any other
+        response is treated as a regular JSON answer and yielded once. Yields
+        nothing (and caches nothing) when the API returned no answer; like
+        ask(), extractive fallbacks are not cached.
+        """
+        if cache is not None:
+            hit = cache.get(prompt)
+            if hit is not None:
+                yield hit
+                return
+
+        parts = []
+        with self.post(prompt, stream=True) as response:
+            if not response.ok:
+                response.content  # read the error detail now: the stream is closed when the handler sees it
+            response.raise_for_status()
+            ctype = response.headers.get("Content-Type", "")
+
+            if "text/event-stream" in ctype or "ndjson" in ctype:
+                for line in response.iter_lines(decode_unicode=True):
+                    piece = parse_stream_line(line)
+                    if piece:
+                        parts.append(piece)
+                        yield piece
+            else:
+                data = response.json()
+                piece = data.get("answer") or data.get("result") or ""
+                if data.get("mode") == "extractive":
+                    cache = None  # a fallback (generation timed out): worth retrying later, not caching
+                if piece:
+                    parts.append(piece)
+                    yield piece
+
+        if cache is not None and parts:
+            cache.put(prompt, "".join(parts))
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def describe_http_error(error: requests.HTTPError) -> Tuple[str, str]:
+    """Headline (status and trace ID, which identifies the request's spans) and body of an API error."""
+    response = error.response
+    trace_id = response.headers.get("X-Trace-ID", "n/a")
+    return f"API error: {response.status_code} (trace {trace_id})", response.text[:4000]
+
+
+def parse_stream_line(line: Optional[str]) -> str:
+    if not line:
+        return ""
+    if line.startswith("data:"):
+        line = line[5:].strip()
+        if line == "[DONE]":
+            return ""
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return line
+    if isinstance(obj, dict):
+        return obj.get("delta") or obj.get("answer") or ""
+    return str(obj)
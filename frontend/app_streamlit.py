@@ -1,8 +1,11 @@
+import itertools
 import os
 import requests
 import streamlit as st
 from dotenv import load_dotenv
 
+from api_client import AnswerCache, RagClient, describe_http_error
+
 # Load environment variables from .env (if present)
 load_dotenv()
 
@@ -26,20 +29,17 @@ FUNCTION_KEY = os.getenv("KANILLA_FUNCTION_KEY")
 st.set_page_config(page_title="datatalks-rg", page_icon="🧠")
 
 
-def post_rag(prompt: str) -> requests.Response:
-    headers = {"Content-Type": "application/json"}
+@st.cache_resource
+def get_client() -> RagClient:
+    # One pooled keep-alive session per server process, shared across reruns
+    return RagClient(API_URL, function_key=FUNCTION_KEY, timeout=120, deadline_s=60)
 
-    # If auth_level=FUNCTION in Azure, you need the key:
-    # it can be passed as query param ?code=...
-    params = {"code": FUNCTION_KEY} if FUNCTION_KEY else None
 
-    return requests.post(
-        API_URL,
-        json={"prompt": prompt},  # matches OpenAPI schema: Prompt(prompt: str)
-        headers=headers,
-        params=params,
-        timeout=120,
-    )
+def get_answer_cache() -> AnswerCache:
+    # Per browser session: repeated questions don't hit the API again
+    if "answer_cache" not in st.session_state:
+        st.session_state.answer_cache = AnswerCache(maxsize=64)
+    return st.session_state.answer_cache
 
 
 def layout():
@@ -54,23 +54,21 @@ def layout():
     if st.button("Send") and question.strip():
         with st.spinner("Thinking..."):
             try:
-                response = post_rag(question.strip())
-
-                if response.status_code != 200:
-                    st.error(f"API error: {response.status_code}")
-                    st.code(response.text[:4000])
-                    return
-
-                try:
-                    data = response.json()
-                except ValueError:
-                    st.error("API returned non-JSON response")
-                    st.code(response.text[:4000])
-                    return
-
+                pieces = get_client().stream(question.strip(), cache=get_answer_cache())
+                # Wait for the first piece, so errors are shown without an empty "Answer" heading
+                first = next(pieces, None)
                 st.subheader("Answer")
-                st.write(data.get("answer") or data.get("result") or "No answer returned")
-
+                if first is None:
+                    st.write("No answer returned")
+                else:
+                    st.write_stream(itertools.chain([first], pieces))
+
+            except requests.HTTPError as e:
+                headline, detail = describe_http_error(e)
+                st.error(headline)
+                st.code(detail)
+            except ValueError:
+                st.error("API returned non-JSON response")
             except requests.Timeout:
                 st.error("Request timed out (try again or increase timeout).")
             except Exception as e:
@@ -1,15 +0,0 @@
-import azure.functions as func
-from azure.functions import AsgiMiddleware
-
-app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
-
-
-def get_fastapi_app():
-    # Lazy import: avoids crashing during Functions indexing on Azure
-    from knowledge_base.api import app as fastapi_app
-    return fastapi_app
-
-
-@app.route(route="{*path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
-async def fastapi_proxy(req: func.HttpRequest, context: func.Context) -> func.HttpResponse:
-    return await AsgiMiddleware(get_fastapi_app()).handle_async(req, context)
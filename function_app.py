@@ -45,10 +45,19 @@ def datatalks_rg(req: func.HttpRequest) -> func.HttpResponse:
 
     return func.HttpResponse("OK. Pass ?name=... or JSON {'name': '...'}", status_code=200)
 
-# Public health check without key
+# Public health check without key. Point the Azure health check here:
+# it returns 503 until the API has warmed up (index mapped, clients created).
 @app.route(route="health", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
-def health(req: func.HttpRequest) -> func.HttpResponse:
-    return func.HttpResponse("ok", status_code=200)
+async def health(req: func.HttpRequest) -> func.HttpResponse:
+    from knowledge_base import warmup
+    from backend.config import settings
+
+    if not settings.warmup_enabled:
+        return func.HttpResponse("ok", status_code=200)
+    warmup.start_warmup()
+    if warmup.state.ready:
+        return func.HttpResponse("ok", status_code=200)
+    return func.HttpResponse(warmup.state.to_dict()["status"], status_code=503)
 
 # Ultra-minimal endpoint to test indexing (no FastAPI involved)
 @app.route(route="ping", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
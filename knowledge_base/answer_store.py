@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+ChunkKey = Tuple[str, int]  # (source_file, chunk_index)
+
+
+def normalize_question(question: str) -> str:
+    """Cache key: case- and whitespace-insensitive, trailing punctuation ignored."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class StoredAnswer:
+    question: str
+    answer: str
+    sources: List[ChunkKey]
+    created_at: float
+
+
+class AnswerStore:
+    """
+    Persistent question -> answer store (SQLite).
+
+    Each answer records the (source_file, chunk_index, text hash) of the chunks
+    it was generated from, so it can be invalidated when those chunks change.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as con, con:
+            con.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS answer_sources (
+                    key TEXT NOT NULL REFERENCES answers(key) ON DELETE CASCADE,
+                    source_file TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    text_hash TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_sources_chunk
+                    ON answer_sources (source_file, chunk_index);
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=10)
+        con.execute("PRAGMA foreign_keys = ON")
+        return con
+
+    def get(self, question: str) -> Optional[StoredAnswer]:
+        key = normalize_question(question)
+        with closing(self._connect()) as con:
+            row = con.execute(
+                "SELECT question, answer, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            sources = con.execute(
+                "SELECT source_file, chunk_index FROM answer_sources WHERE key = ? ORDER BY rowid",
+                (key,),
+            ).fetchall()
+        return StoredAnswer(row[0], row[1], [(s, int(i)) for s, i in sources], row[2])
+
+    def put(self, question: str, answer: str, chunks: Iterable) -> None:
+        """Store an answer with its source chunks (objects with source_file, chunk_index, text)."""
+        key = normalize_question(question)
+        sources = [(key, c.source_file, int(c.chunk_index), chunk_hash(c.text)) for c in chunks]
+        with closing(self._connect()) as con, con:
+            con.execute("DELETE FROM answers WHERE key = ?", (key,))
+            con.execute(
+                "INSERT INTO answers (key, question, answer, created_at) VALUES (?, ?, ?, ?)",
+                (key, question, answer, time.time()),
+            )
+            con.executemany(
+                "INSERT INTO answer_sources (key, source_file, chunk_index, text_hash) VALUES (?, ?, ?, ?)",
+                sources,
+            )
+
+    def source_chunks(self) -> List[ChunkKey]:
+        """All (source_file, chunk_index) referenced by stored answers."""
+        with closing(self._connect()) as con:
+            rows = con.execute(
+                "SELECT DISTINCT source_file, chunk_index FROM answer_sources"
+            ).fetchall()
+        return [(s, int(i)) for s, i in rows]
+
+    def invalidate(self, current: Dict[ChunkKey, str]) -> int:
+        """
+        Drop answers whose source chunks changed or disappeared.
+        `current` maps (source_file, chunk_index) -> text hash in the live table.
+        Returns the number of answers removed.
+        """
+        with closing(self._connect()) as con, con:
+            rows = con.execute(
+                "SELECT key, source_file, chunk_index, text_hash FROM answer_sources"
+            ).fetchall()
+            # Compare per answer: two answers may hold different hashes of one chunk.
+            keys = {k for k, src, idx, h in rows if current.get((src, int(idx))) != h}
+            con.executemany("DELETE FROM answers WHERE key = ?", [(k,) for k in keys])
+        return len(keys)
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as con:
+            return con.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+_store: Optional[AnswerStore] = None
+
+
+def answer_store() -> AnswerStore:
+    """Process-wide store at settings.answer_store_path."""
+    global _store
+    if _store is None:
+        from backend.config import settings
+
+        _store = AnswerStore(settings.answer_store_path)
+    return _store
+
+
+def invalidate_from_table(table) -> int:
+    """Re-check every stored answer's sources against a (newly published) LanceDB table."""
+    store = answer_store()
+    files = sorted({src for src, _ in store.source_chunks()})
+    if not files:
+        return 0
+    in_list = ", ".join("'" + f.replace("'", "''") + "'" for f in files)
+    rows = (
+        table.search()
+        .where(f"source_file IN ({in_list})")
+        .select(["source_file", "chunk_index", "text"])
+        .limit(None)
+        .to_list()
+    )
+    current = {(r["source_file"], int(r["chunk_index"])): chunk_hash(r["text"]) for r in rows}
+    return store.invalidate(current)
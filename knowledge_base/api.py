@@ -1,7 +1,33 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+from backend.config import settings
+from backend.routing import model_metrics
+from knowledge_base import warmup
+from knowledge_base.answer_store import answer_store
+from knowledge_base.bundle import load_bundle
+from knowledge_base.deadline import Deadline, DeadlineExceeded
+from knowledge_base.ingest_jobs import QueueFull, Transcript, ingest_queue
+from knowledge_base.memory import install_memory_budget, report as memory_report
+from knowledge_base.profiling import install_profiling
+from knowledge_base.sessions import chat, session_store
+from knowledge_base.tracing import TracingMiddleware, span
+from knowledge_base.rag_agent import answer_with_sources
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background; /ready reports 503 until it has finished
+    if settings.warmup_enabled:
+        warmup.start_warmup()
+    ingest_queue().start()
+    yield
 
-from knowledge_base.rag_agent import answer_question
 
 app = FastAPI(
     title="RAG Youtuber API",
@@ -9,15 +35,54 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
+    lifespan=lifespan,
 )
+# Opt-in (settings.profile_*); not installed at all when disabled
+install_profiling(app)
+# RSS budget check after requests (settings.memory_budget_mb); not installed without a budget
+install_memory_budget(app)
+# Outermost: request/trace IDs in X-Request-ID / X-Trace-ID, spans per settings.trace_exporter
+app.add_middleware(TracingMiddleware)
 
 class Prompt(BaseModel):
     prompt: str
+    # Multi-query expansion for this request (default: settings.query_expansion)
+    expand: Optional[Literal["off", "rules", "llm"]] = None
+    # Include chunk_index ± n around each hit (default: settings.neighbor_window)
+    neighbors: Optional[int] = Field(default=None, ge=0, le=5)
+    # End-to-end time budget in seconds (default: settings.request_deadline_s)
+    deadline_s: Optional[float] = Field(default=None, gt=0, le=120)
+    # "fast" skips the LLM and returns the top retrieved sentences with citations
+    mode: Literal["full", "fast"] = "full"
+
+class ChatMessage(BaseModel):
+    message: str
+    # Omit to start a new session; unknown or expired ids also start a new one
+    session_id: Optional[str] = Field(default=None, max_length=64)
+    deadline_s: Optional[float] = Field(default=None, gt=0, le=120)
+    mode: Literal["full", "fast"] = "full"
+
+class TranscriptIn(BaseModel):
+    name: str = Field(description='File name ending in .md or .txt, e.g. "FastAPI intro.md"')
+    text: str
+    collection: Optional[str] = None
+
+class IngestRequest(BaseModel):
+    transcripts: List[TranscriptIn] = Field(min_length=1)
 
 @app.get("/")
 async def root():
     return {"status": "ok", "message": "RAG Youtuber API is running", "docs": "/docs"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once warm-up completed, 503 while warming or failed."""
+    if not settings.warmup_enabled:
+        return {"status": "ready", "warmup": "disabled"}
+    # Hosts that skip ASGI lifespan events (Azure Functions) start it here.
+    warmup.start_warmup()
+    return JSONResponse(warmup.state.to_dict(), status_code=200 if warmup.state.ready else 503)
+
 @app.get("/test")
 async def test():
     return {"test": "hello"}
@@ -26,8 +91,99 @@ async def test():
 async def query_documentation(query: Prompt):
     if not query.prompt.strip():
         raise HTTPException(status_code=400, detail="Prompt cannot be empty")
+    deadline = Deadline.after(query.deadline_s or settings.request_deadline_s)
+    # Precomputed FAQ answers (see knowledge_base/warm_faq.py) skip the RAG entirely.
+    with span("answer_store.lookup") as s:
+        cached = await asyncio.to_thread(answer_store().get, query.prompt)  # sqlite: off the event loop
+        s.set(hit=cached is not None)
+    if cached is not None:
+        return {"answer": cached.answer, "cached": True}
+
+    try:
+        result = await answer_with_sources(
+            query.prompt,
+            k=5,
+            expand=query.expand,
+            neighbors=query.neighbors,
+            deadline=deadline,
+            fast=query.mode == "fast",
+        )
+        response = {"answer": result.answer, "mode": result.mode, "timings_ms": result.timings_ms}
+        if result.route is not None:
+            response["model"] = result.route.to_dict()
+        return response
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat")
+async def chat_turn(request: ChatMessage):
+    """One turn of a multi-turn conversation; pass the returned session_id with the next message."""
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    deadline = Deadline.after(request.deadline_s or settings.request_deadline_s)
     try:
-        answer = await answer_question(query.prompt, k=5)
-        return {"answer": answer}
+        reply = await chat(request.message, request.session_id, deadline=deadline, fast=request.mode == "fast")
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    result = reply.result
+    return {
+        "session_id": reply.session_id,
+        "new_session": reply.new_session,
+        "turn": reply.turn,
+        "answer": result.answer,
+        "mode": result.mode,
+        "reused_context": reply.reused_context,
+        "prompt_tokens": result.prompt_tokens,
+        "timings_ms": result.timings_ms,
+    }
+
+@app.delete("/chat/{session_id}")
+async def end_chat(session_id: str):
+    if not session_store().delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown session id")
+    return {"deleted": session_id}
+
+@app.get("/metrics/chat")
+async def chat_stats():
+    """Sessions, retrievals avoided by reusing context, and prompt tokens per turn (this worker)."""
+    return session_store().metrics()
+
+@app.get("/metrics/models")
+async def model_stats():
+    """Generation latency and tokens per model, and how often each route was taken (this worker)."""
+    return model_metrics.snapshot()
+
+@app.get("/debug/memory")
+def memory_stats(top: int = 10):
+    """RSS, cache sizes and top tracemalloc allocations (settings.memory_diagnostics); runs in the threadpool."""
+    if not settings.memory_diagnostics:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return memory_report(top=max(0, min(top, 100)))
+
+@app.post("/ingest", status_code=202)
+async def ingest(request: IngestRequest):
+    """Queue transcripts for background chunking + embedding into the live table."""
+    if not settings.ingest_api_enabled:
+        raise HTTPException(status_code=409, detail="Ingestion is disabled on multi-worker servers; "
+                                                    "use a single worker or knowledge_base.ingestion")
+    if load_bundle() is not None:
+        # Bundles are read-only snapshots; new rows would not be searchable.
+        raise HTTPException(status_code=409, detail="Serving from an index bundle; rebuild the bundle instead")
+    try:
+        job = ingest_queue().submit([Transcript(**t.model_dump()) for t in request.transcripts])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {**job.to_dict(), "status_url": f"/ingest/{job.id}"}
+
+@app.get("/ingest/{job_id}")
+async def ingest_status(job_id: str):
+    job = ingest_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return {**job.to_dict(), "queued_jobs": ingest_queue().pending()}
@@ -0,0 +1,373 @@
+"""
+Read-only index bundles: one versioned, checksummed file per knowledge base.
+
+Layout (little endian, every section 64-byte aligned):
+
+    b"RAGBNDL1" | u32 header length | JSON header | pad
+    vectors      float32[n, dim]     (memory-mapped, zero-copy)
+    norms        float32[n]          (squared L2 norms, for fast L2 distance)
+    chunk_index  int32[n]
+    char_start   int32[n]            (optional: chunk offsets in the cleaned file text)
+    char_end     int32[n]
+    collection   uint8[n]            (codes into header["collections"])
+    source_file  uint32[n]           (codes into header["source_files"])
+    text_offsets uint64[n + 1]
+    texts        utf-8 blob          (decoded lazily, per hit)
+
+The header stores the sha256 of everything after it. Build with
+
+    uv run python -m knowledge_base.bundle build [--version v3]
+
+and switch versions (rollout / rollback) with `activate <version>`; the
+active version is recorded in bundles/current.json, replaced atomically.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.config import settings
+from knowledge_base.memory import mapped_rss_bytes, register_cache
+from knowledge_base.tables import write_json_atomic
+
+
+MAGIC = b"RAGBNDL1"
+ALIGN = 64
+FORMAT_VERSION = 1
+
+
+class BundleError(Exception):
+    pass
+
+
+def _pad(n: int) -> int:
+    return (-n) % ALIGN
+
+
+def write_bundle(
+    path: Path,
+    vectors: np.ndarray,
+    texts: List[str],
+    source_files: List[str],
+    chunk_indices: List[int],
+    collections: List[str],
+    meta: Optional[Dict[str, Any]] = None,
+    char_spans: Optional[List[Tuple[int, int]]] = None,
+) -> Dict[str, Any]:
+    """Serialize rows into a bundle file. Returns the header that was written."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+
+    coll_names = sorted(set(collections))
+    src_names = sorted(set(source_files))
+    coll_codes = {c: i for i, c in enumerate(coll_names)}
+    src_codes = {s: i for i, s in enumerate(src_names)}
+
+    encoded = [t.encode("utf-8") for t in texts]
+    offsets = np.zeros(n + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.uint64)
+
+    sections = [
+        ("vectors", vectors.tobytes()),
+        ("norms", np.einsum("ij,ij->i", vectors, vectors).astype(np.float32).tobytes()),
+        ("chunk_index", np.asarray(chunk_indices, dtype=np.int32).tobytes()),
+    ]
+    if char_spans is not None:
+        spans = np.asarray(char_spans, dtype=np.int32).reshape(n, 2)
+        sections += [
+            ("char_start", np.ascontiguousarray(spans[:, 0]).tobytes()),
+            ("char_end", np.ascontiguousarray(spans[:, 1]).tobytes()),
+        ]
+    sections += [
+        ("collection", np.asarray([coll_codes[c] for c in collections], dtype=np.uint8).tobytes()),
+        ("source_file", np.asarray([src_codes[s] for s in source_files], dtype=np.uint32).tobytes()),
+        ("text_offsets", offsets.tobytes()),
+        ("texts", b"".join(encoded)),
+    ]
+
+    payload = bytearray()
+    layout = {}
+    for name, data in sections:
+        layout[name] = [len(payload), len(data)]
+        payload += data + b"\0" * _pad(len(data))
+
+    header = {
+        "format": FORMAT_VERSION,
+        "count": n,
+        "dim": dim,
+        "collections": coll_names,
+        "source_files": src_names,
+        "sections": layout,
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        **(meta or {}),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix = MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes
+    prefix += b"\0" * _pad(len(prefix))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(prefix)
+        f.write(payload)
+    tmp.replace(path)
+    return header
+
+
+@dataclass
+class BundleHit:
+    row: int
+    distance: float
+
+
+class IndexBundle:
+    """Memory-mapped bundle. Vectors are numpy views on the mapping; texts decode on access."""
+
+    def __init__(self, path: Path, verify: bool = True) -> None:
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:8] != MAGIC:
+            raise BundleError(f"{self.path} is not an index bundle")
+        (hlen,) = struct.unpack("<I", self._mm[8:12])
+        self.header: Dict[str, Any] = json.loads(self._mm[12:12 + hlen])
+        if self.header.get("format") != FORMAT_VERSION:
+            raise BundleError(f"Unsupported bundle format {self.header.get('format')}")
+        self._base = 12 + hlen + _pad(12 + hlen)
+
+        if verify:
+            digest = hashlib.sha256(memoryview(self._mm)[self._base:]).hexdigest()
+            if digest != self.header["sha256"]:
+                raise BundleError(f"Checksum mismatch for {self.path}")
+
+        n, dim = self.header["count"], self.header["dim"]
+        self.vectors = self._array("vectors", np.float32).reshape(n, dim)
+        self.norms = self._array("norms", np.float32)
+        self.chunk_index = self._array("chunk_index", np.int32)
+        self.collection_codes = self._array("collection", np.uint8)
+        self.source_codes = self._array("source_file", np.uint32)
+        self.text_offsets = self._array("text_offsets", np.uint64)
+        has_spans = "char_start" in self.header["sections"]
+        self.char_start = self._array("char_start", np.int32) if has_spans else None
+        self.char_end = self._array("char_end", np.int32) if has_spans else None
+        # (source code << 32 | chunk_index) sorted, and the row of each key; built on first find_rows
+        self._row_index: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._texts_start = self._base + self.header["sections"]["texts"][0]
+
+    def _array(self, name: str, dtype) -> np.ndarray:
+        offset, length = self.header["sections"][name]
+        return np.frombuffer(self._mm, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                             offset=self._base + offset)
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    @property
+    def version(self) -> str:
+        return self.header.get("version", "")
+
+    def text(self, row: int) -> str:
+        start = self._texts_start + int(self.text_offsets[row])
+        end = self._texts_start + int(self.text_offsets[row + 1])
+        return self._mm[start:end].decode("utf-8")
+
+    def source_file(self, row: int) -> str:
+        return self.header["source_files"][int(self.source_codes[row])]
+
+    def collection(self, row: int) -> str:
+        return self.header["collections"][int(self.collection_codes[row])]
+
+    def find_rows(self, wanted: Dict[str, Iterable[int]]) -> List[int]:
+        """Rows for the given {source_file: chunk indices}; missing chunks are skipped."""
+        index = self._row_index  # read once: release() may drop it from another thread (memory budget)
+        if index is None:
+            keys = self._keys(self.source_codes, self.chunk_index)
+            order = np.argsort(keys, kind="stable")
+            index = self._row_index = (keys[order], order)
+        sorted_keys, order = index
+        codes = {s: i for i, s in enumerate(self.header["source_files"])}
+        lookup = [(codes[src], i) for src, indices in wanted.items() if src in codes for i in indices]
+        if not lookup:
+            return []
+        src_codes, chunk_indices = zip(*lookup)
+        wanted_keys = self._keys(np.asarray(src_codes), np.asarray(chunk_indices))
+        pos = np.minimum(np.searchsorted(sorted_keys, wanted_keys), len(sorted_keys) - 1)
+        found = sorted_keys[pos] == wanted_keys
+        return order[pos[found]].tolist()
+
+    @staticmethod
+    def _keys(source_codes: np.ndarray, chunk_index: np.ndarray) -> np.ndarray:
+        return (source_codes.astype(np.int64) << 32) | (chunk_index.astype(np.int64) & 0xFFFFFFFF)
+
+    def memory_stats(self) -> Dict[str, Any]:
+        index = self._row_index
+        index_bytes = sum(a.nbytes for a in index) if index is not None else 0
+        resident = mapped_rss_bytes(self.path) or 0  # pages of the mapping counted in RSS
+        return {"rows": len(self), "mapped_bytes": len(self._mm), "resident_bytes": resident,
+                "row_index_bytes": index_bytes, "bytes": index_bytes + resident}
+
+    def release(self) -> int:
+        """Drop the row index and the mapping's resident pages; both come back on the next use."""
+        freed = self.memory_stats()["bytes"]
+        self._row_index = None
+        if sys.platform == "linux":
+            self._mm.madvise(mmap.MADV_DONTNEED)
+        return freed
+
+    def search(self, qvec, k: int = 5, collection: Optional[str] = None) -> List[BundleHit]:
+        """Exact top-k by squared L2 distance (LanceDB's default metric), optional prefilter."""
+        q = np.asarray(qvec, dtype=np.float32)
+        dist = self.norms - 2.0 * (self.vectors @ q) + float(q @ q)
+        if collection is not None:
+            names = self.header["collections"]
+            if collection not in names:
+                return []
+            dist = np.where(self.collection_codes == names.index(collection), dist, np.inf)
+        k = min(k, len(dist))
+        if k <= 0:
+            return []
+        top = np.argpartition(dist, k - 1)[:k]
+        top = top[np.argsort(dist[top])]
+        return [BundleHit(int(r), float(dist[r])) for r in top if np.isfinite(dist[r])]
+
+    def row_dict(self, row: int) -> Dict[str, Any]:
+        d = {
+            "source_file": self.source_file(row),
+            "chunk_index": int(self.chunk_index[row]),
+            "collection": self.collection(row),
+            "text": self.text(row),
+        }
+        if self.char_start is not None:
+            d["char_start"] = int(self.char_start[row])
+            d["char_end"] = int(self.char_end[row])
+        return d
+
+    def to_rows(self, hits: List[BundleHit]) -> List[Dict[str, Any]]:
+        """Hits as dicts shaped like LanceDB search results."""
+        return [{**self.row_dict(h.row), "_distance": h.distance} for h in hits]
+
+    def close(self) -> None:
+        # Drop numpy views first: mmap.close() fails while buffers are exported.
+        for name in ("vectors", "norms", "chunk_index", "char_start", "char_end",
+                     "collection_codes", "source_codes", "text_offsets"):
+            self.__dict__.pop(name, None)
+        self._mm.close()
+        self._file.close()
+
+
+# --- versions / activation -------------------------------------------------
+
+
+def bundle_dir() -> Path:
+    return Path(settings.bundle_dir)
+
+
+def bundle_path(version: str) -> Path:
+    return bundle_dir() / f"{settings.lancedb_table}-{version}.bundle"
+
+
+def current_pointer() -> Path:
+    return bundle_dir() / "current.json"
+
+
+def activate(version: str) -> None:
+    path = bundle_path(version)
+    if not path.exists():
+        raise BundleError(f"No bundle for version {version!r} at {path}")
+    write_json_atomic(current_pointer(), {"version": version, "file": path.name})
+
+
+def active_bundle_path() -> Optional[Path]:
+    pointer = current_pointer()
+    if not pointer.exists():
+        return None
+    return bundle_dir() / json.loads(pointer.read_text(encoding="utf-8"))["file"]
+
+
+_bundle: Optional[IndexBundle] = None
+
+
+def load_bundle() -> Optional[IndexBundle]:
+    """The active bundle (opened once per process), or None when not using bundles."""
+    global _bundle
+    if _bundle is None and settings.use_bundle:
+        path = active_bundle_path()
+        if path is not None:
+            _bundle = IndexBundle(path, verify=settings.bundle_verify)
+            register_cache("bundle", _bundle.memory_stats, _bundle.release)
+    return _bundle
+
+
+def build_from_table(version: str) -> Path:
+    import lancedb
+
+    from knowledge_base.retriever import table_embedder
+    from knowledge_base.shards import open_table
+    from knowledge_base.tables import active_table_name
+
+    db = lancedb.connect(str(settings.lancedb_dir))
+    table_name = active_table_name()
+    table = open_table(db, table_name)
+    # Tables without embedder metadata predate it and were all embedded with Gemini.
+    embed_model = table_embedder(table)[0] or settings.embed_model
+    data = table.to_arrow()
+    keep = [i for i, ci in enumerate(data.column("chunk_index").to_pylist()) if ci >= 0]  # no seed row
+    data = data.take(keep)
+
+    path = bundle_path(version)
+    header = write_bundle(
+        path,
+        vectors=np.asarray(data.column("embedding").to_pylist(), dtype=np.float32),
+        texts=data.column("text").to_pylist(),
+        source_files=data.column("source_file").to_pylist(),
+        chunk_indices=data.column("chunk_index").to_pylist(),
+        collections=data.column("collection").to_pylist(),
+        meta={"version": version, "table": table_name, "embed_model": embed_model},
+        char_spans=(
+            list(zip(data.column("char_start").to_pylist(), data.column("char_end").to_pylist()))
+            if "char_start" in data.column_names else None
+        ),
+    )
+    print(f"Wrote {path} ({header['count']} rows, dim={header['dim']}, sha256={header['sha256'][:12]}...)")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and activate read-only index bundles.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    build = sub.add_parser("build", help="export the live LanceDB table to a bundle")
+    build.add_argument("--version", default=time.strftime("%Y%m%d%H%M%S"))
+    build.add_argument("--no-activate", action="store_true")
+    sub.add_parser("activate", help="switch the active bundle").add_argument("version")
+    sub.add_parser("list", help="list bundles")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        build_from_table(args.version)
+        if not args.no_activate:
+            activate(args.version)
+            print("Active:", args.version)
+    elif args.cmd == "activate":
+        activate(args.version)
+        print("Active:", args.version)
+    else:
+        active = active_bundle_path()
+        for p in sorted(bundle_dir().glob("*.bundle")):
+            print(("* " if active and p.name == active.name else "  ") + p.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import re
+from dataclasses import replace
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from knowledge_base.retriever import RetrievedChunk
+
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def split_sentences(text: str, min_chars: int = 30, max_chars: int = 300) -> List[str]:
+    """
+    Split a chunk into sentence-like units.
+
+    Spoken transcripts often lack punctuation, so overlong "sentences" are cut
+    into word windows of ~max_chars, and fragments shorter than min_chars are
+    merged into their predecessor.
+    """
+    units: List[str] = []
+    for part in _SENTENCE_END.split(text):
+        part = " ".join(part.split())
+        if not part:
+            continue
+        while len(part) > max_chars:
+            cut = part.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            units.append(part[:cut])
+            part = part[cut:].lstrip()
+        if part:
+            units.append(part)
+
+    merged: List[str] = []
+    for u in units:
+        if merged and len(u) < min_chars:
+            merged[-1] = f"{merged[-1]} {u}"
+        else:
+            merged.append(u)
+    return merged
+
+
+def cosine_scores(vectors: np.ndarray, qvec: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(qvec)
+    return (vectors @ qvec) / np.maximum(norms, 1e-12)
+
+
+def compress_chunks(
+    chunks: Sequence[RetrievedChunk],
+    qvec: Sequence[float],
+    embed: Optional[EmbedFn] = None,
+    max_chars: int = 2500,
+    min_sentence_chars: int = 30,
+) -> List[RetrievedChunk]:
+    """
+    Query-focused extractive compression.
+
+    All sentences of all chunks are embedded in one batched call and scored
+    against the query embedding in a single matrix product. The best sentences
+    are kept (greedily, until `max_chars`) and re-assembled per chunk in their
+    original order, so source tags and citations stay valid. Chunks that keep
+    no sentence are dropped.
+    """
+    if embed is None:
+        from knowledge_base.embedders import get_embedder
+
+        embed = get_embedder()
+
+    units = [
+        (ci, si, sent)
+        for ci, c in enumerate(chunks)
+        for si, sent in enumerate(split_sentences(c.text, min_chars=min_sentence_chars))
+    ]
+    if not units:
+        return list(chunks)
+
+    vectors = np.asarray(embed([u[2] for u in units]), dtype=np.float32)
+    scores = cosine_scores(vectors, np.asarray(qvec, dtype=np.float32))
+
+    kept = set()
+    used = 0
+    for idx in np.argsort(-scores, kind="stable"):
+        length = len(units[idx][2]) + 1
+        if used + length > max_chars and kept:
+            continue
+        kept.add(int(idx))
+        used += length
+
+    compressed: List[RetrievedChunk] = []
+    for ci, chunk in enumerate(chunks):
+        parts: List[str] = []
+        prev_si = None
+        for i, (uci, si, sent) in enumerate(units):
+            if uci != ci or i not in kept:
+                continue
+            if prev_si is not None and si != prev_si + 1:
+                parts.append("…")
+            parts.append(sent)
+            prev_si = si
+        if parts:
+            compressed.append(replace(chunk, text=" ".join(parts)))
+    return compressed
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """An absolute time budget (time.monotonic()) shared by every stage of one request."""
+
+    expires_at: float
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def run(self, aw: Awaitable[T], stage: str) -> T:
+        """Await `aw` within the remaining budget, else raise DeadlineExceeded naming `stage`."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            if asyncio.iscoroutine(aw):
+                aw.close()  # never started: avoid "coroutine was never awaited"
+            raise DeadlineExceeded(f"deadline exceeded before {stage}")
+        try:
+            return await asyncio.wait_for(aw, timeout=remaining)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"deadline exceeded during {stage}") from None
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class Duplicate:
+    level: str            # "file" or "chunk"
+    item: str             # e.g. "API trafiklab (1).md" or "a.md#3"
+    duplicate_of: str
+    reason: str           # "exact" or "near"
+    similarity: float
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def shingle_hashes(text: str, size: int = 5) -> np.ndarray:
+    """crc32 of every `size`-word shingle (deterministic across processes)."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.int64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures via (a*x + b) mod p, vectorized over all shingles at once."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        x = (hashes % _MERSENNE_PRIME)[:, None]  # < 2**31, so a*x fits in int64
+        return ((x * self.a + self.b) % _MERSENNE_PRIME).min(axis=0)
+
+
+Fingerprint = Tuple[str, np.ndarray]  # (sha1 of normalized text, MinHash signature)
+
+
+def fingerprint(text: str, hasher: MinHasher, shingle_size: int = 5) -> Fingerprint:
+    """
+    Everything `Deduplicator.check` needs from a text. Pure and deterministic
+    (fixed seed), so it can be computed in worker processes.
+    """
+    norm = normalize(text)
+    digest = hashlib.sha1(norm.encode("utf-8")).hexdigest()
+    return digest, hasher.signature(shingle_hashes(norm, shingle_size))
+
+
+class Deduplicator:
+    """
+    Incremental exact + near-duplicate detector (first occurrence wins).
+
+    Exact duplicates are found by hashing normalized text; near duplicates by
+    MinHash + LSH banding, so each `check` costs O(len(text)) plus the handful
+    of candidates sharing a band bucket, i.e. linear in corpus size overall.
+    """
+
+    def __init__(
+        self,
+        level: str,
+        threshold: float = 0.85,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 5,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.level = level
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self.exact: Dict[str, str] = {}
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.buckets: List[Dict[bytes, List[str]]] = [defaultdict(list) for _ in range(bands)]
+
+    def fingerprint(self, text: str) -> Fingerprint:
+        return fingerprint(text, self.hasher, self.shingle_size)
+
+    def check(
+        self, item: str, text: Optional[str] = None, fp: Optional[Fingerprint] = None
+    ) -> Optional[Duplicate]:
+        """
+        Return why `item` duplicates an earlier item, or register it and return None.
+        Pass a precomputed `fp` (see `fingerprint`) instead of `text` to skip hashing.
+        """
+        digest, sig = fp if fp is not None else self.fingerprint(text or "")
+        if digest in self.exact:
+            return Duplicate(self.level, item, self.exact[digest], "exact", 1.0)
+
+        keys = [sig[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+        best, best_sim = None, 0.0
+        seen = set()
+        for band, key in enumerate(keys):
+            for other in self.buckets[band].get(key, ()):
+                if other in seen:
+                    continue
+                seen.add(other)
+                sim = float(np.mean(self.signatures[other] == sig))
+                if sim > best_sim:
+                    best, best_sim = other, sim
+        if best is not None and best_sim >= self.threshold:
+            return Duplicate(self.level, item, best, "near", round(best_sim, 3))
+
+        self.exact[digest] = item
+        self.signatures[item] = sig
+        for band, key in enumerate(keys):
+            self.buckets[band][key].append(item)
+        return None
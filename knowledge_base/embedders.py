@@ -0,0 +1,185 @@
+"""
+Embedding backends behind one interface, used by ingestion, retrieval, query
+expansion and context compression. settings.embedder selects the backend:
+
+  - "gemini": settings.embed_model through the Gemini API (rate-limited, retried)
+  - "hash":   hashed word and character n-gram features computed locally with
+              numpy; no network, well under a millisecond per query. Lexical
+              matching only, but good enough for keyword-heavy questions and
+              for running the whole stack offline.
+
+Tables and bundles record the embedder's name and dimension when they are
+built; searching an index built with another embedder raises EmbedderMismatch
+instead of returning meaningless neighbours.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from google import genai
+
+from backend.config import settings
+from knowledge_base.memory import MB, ByteBudgetCache, register_cache
+from knowledge_base.rate_limit import embed_with_retry
+from knowledge_base.tracing import span
+
+
+class EmbedderMismatch(RuntimeError):
+    """The index was built with a different embedding model or dimension."""
+
+
+class Embedder:
+    """Turns texts into vectors; instances are also plain `texts -> vectors` callables."""
+
+    name: str
+    dim: int
+    # Squared-L2 cutoff for retrieval hits (vectors are unit length: d = 2 - 2*cos)
+    distance_gate: float = 1.05
+
+    def embed(self, texts: Sequence[str], deadline: Optional[float] = None) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_batched(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed any number of texts in settings.embed_batch_size requests."""
+        size = settings.embed_batch_size
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), size):
+            vectors.extend(self.embed(texts[start:start + size]))
+        return vectors
+
+    def __call__(self, texts: Sequence[str]) -> List[List[float]]:
+        return self.embed_batched(texts)
+
+
+@lru_cache(maxsize=1)
+def get_client() -> genai.Client:
+    return genai.Client(api_key=settings.gemini_api_key)
+
+
+# The client's connection pool must not be shared with a forked parent (knowledge_base/serve.py).
+os.register_at_fork(after_in_child=get_client.cache_clear)
+
+
+class GeminiEmbedder(Embedder):
+    def __init__(self, model: str, dim: int) -> None:
+        self.name = model
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str], deadline: Optional[float] = None) -> List[List[float]]:
+        vectors = embed_with_retry(get_client(), texts, deadline=deadline)
+        if vectors and len(vectors[0]) != self.dim:
+            raise EmbedderMismatch(f"{self.name} returned {len(vectors[0])} dims; set EMBED_DIM={len(vectors[0])}")
+        return vectors
+
+
+_WORD = re.compile(r"\w+")
+
+
+class HashEmbedder(Embedder):
+    """
+    Signed feature hashing (fastText-style) of each word and its character
+    3-5-grams, so "deploy" and "deployment" share features. A word's n-grams
+    together weigh half as much as the word itself, term frequency is damped with 1 + log(tf),
+    stopwords are dropped and vectors are L2-normalised. The random sign per
+    feature makes bucket collisions cancel out instead of adding up. Per-word
+    features are cached up to settings.hash_cache_mb.
+    """
+
+    version = "hash-ngram-v1"
+    # Unrelated texts sit near orthogonal (d ~ 2.0); related passages score
+    # cos ~0.05-0.4 on lexical overlap alone, so only the orthogonal tail is dropped.
+    distance_gate = 1.95
+
+    def __init__(self, dim: int) -> None:
+        from knowledge_base.expansion import STOPWORDS
+
+        self.name = self.version
+        self.dim = dim
+        self._stopwords = STOPWORDS
+        self._cache = ByteBudgetCache(int(settings.hash_cache_mb * MB))
+        register_cache("hash_word_features", self._cache.stats, self._cache.trim)
+
+    def _word_features(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        features = self._cache.get(word)
+        if features is None:
+            features = self._features_of_word(word)
+            # array data + ~500 bytes of array headers, key, tuples and LRU entry (measured with tracemalloc)
+            self._cache.put(word, features, features[0].nbytes + features[1].nbytes + 500 + len(word))
+        return features
+
+    def _features_of_word(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        padded = f"<{word}>"
+        grams = [padded[i:i + n] for n in (3, 4, 5) for i in range(len(padded) - n + 1)]
+        features = ["w:" + word] + ["c:" + g for g in grams]
+        weights = [1.0] + [0.5 / len(grams)] * len(grams)
+        hashes = [zlib.crc32(f.encode("utf-8")) for f in features]
+        signs = [1.0 if h & 0x80000000 else -1.0 for h in hashes]
+        return np.array([h % self.dim for h in hashes], dtype=np.int64), np.array(weights) * signs
+
+    def vector(self, text: str) -> np.ndarray:
+        counts = Counter(w for w in _WORD.findall(text.lower()) if w not in self._stopwords)
+        if not counts:
+            return np.zeros(self.dim, dtype=np.float32)
+        buckets, weights = [], []
+        for word, tf in counts.items():
+            b, w = self._word_features(word)
+            buckets.append(b)
+            weights.append(w * (1.0 + math.log(tf)))
+        v = np.bincount(np.concatenate(buckets), np.concatenate(weights), minlength=self.dim)
+        norm = np.linalg.norm(v)
+        return (v / norm if norm > 0 else v).astype(np.float32)
+
+    def embed(self, texts: Sequence[str], deadline: Optional[float] = None) -> List[List[float]]:
+        with span("embed", texts=len(texts), model=self.name):
+            return [self.vector(t).tolist() for t in texts]
+
+    def embed_batched(self, texts: Sequence[str]) -> List[List[float]]:
+        return self.embed(texts)  # no request size limits locally
+
+
+@lru_cache(maxsize=8)
+def _create(kind: str, model: str, dim: int, hash_dim: int) -> Embedder:
+    if kind == "gemini":
+        return GeminiEmbedder(model, dim)
+    if kind == "hash":
+        return HashEmbedder(hash_dim)
+    raise ValueError(f"Unknown embedder {kind!r} (expected 'gemini' or 'hash')")
+
+
+_override: Optional[Embedder] = None
+
+
+def get_embedder() -> Embedder:
+    """The configured embedder (settings.embedder), unless overridden with set_embedder."""
+    if _override is not None:
+        return _override
+    return _create(settings.embedder, settings.embed_model, settings.embed_dim, settings.hash_embed_dim)
+
+
+def set_embedder(embedder: Optional[Embedder]) -> None:
+    """Use `embedder` everywhere instead of the configured one (benchmarks, tests); None restores it."""
+    global _override
+    _override = embedder
+
+
+def index_metadata(embedder: Embedder) -> Dict[str, str]:
+    """What a table or bundle records about the embedder it was built with."""
+    return {"embed_model": embedder.name, "embed_dim": str(embedder.dim)}
+
+
+def check_compatible(model: Optional[str], dim: int, index: str) -> None:
+    """Raise EmbedderMismatch unless (model, dim) of `index` match the current embedder. `model` may be unknown."""
+    embedder = get_embedder()
+    if dim != embedder.dim or (model is not None and model != embedder.name):
+        raise EmbedderMismatch(
+            f"{index} was built with {model or 'an unknown model'} ({dim} dims) but the configured "
+            f"embedder is {embedder.name} ({embedder.dim} dims). Re-ingest, or set EMBEDDER/EMBED_MODEL to match."
+        )
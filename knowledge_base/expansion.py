@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pydantic_ai import Agent
+
+from backend.config import settings
+from knowledge_base.embedders import get_embedder
+from knowledge_base.retriever import RetrievedChunk, filter_results, search_rows
+from knowledge_base.tracing import span
+
+
+log = logging.getLogger(__name__)
+
+
+# Acronyms that embed poorly on their own in short student questions.
+ACRONYMS = {
+    "asgi": "asynchronous server gateway interface",
+    "wsgi": "web server gateway interface",
+    "rag": "retrieval augmented generation",
+    "llm": "large language model",
+    "api": "application programming interface",
+    "crud": "create read update delete",
+    "sql": "structured query language",
+    "etl": "extract transform load",
+    "elt": "extract load transform",
+    "dlt": "data load tool",
+    "oop": "object oriented programming",
+    "ci/cd": "continuous integration continuous deployment",
+    "bi": "business intelligence",
+}
+
+_QUESTION_PREFIX = re.compile(
+    r"^(how (do|does|can|should|would) (i|you|we)?|how (do|does|is|are)|what (is|are|does)|"
+    r"why (do|does|is|are)|when (do|does|should)|can (i|you)|explain|tell me about)\s+",
+    re.I,
+)
+STOPWORDS = set(
+    "a an the is are was were be to of in on for with and or how what why when do does did "
+    "i you we it this that can should would could me my your about work works working use using".split()
+)
+
+RRF_K = 60
+
+
+@dataclass
+class ExpandedRetrieval:
+    chunks: List[RetrievedChunk]
+    variants: List[str]
+    qvec: List[float]  # embedding of the original question
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    variant_source: str = "rules"  # "llm", "rules", or "rules_fallback" when the LLM rewrite failed
+
+
+def rule_based_variants(query: str, n: int = 3) -> List[str]:
+    """Cheap local rewrites: core topic, keyword form, acronym expansion, 'X explained'."""
+    q = query.strip().rstrip("?!. ")
+    core = _QUESTION_PREFIX.sub("", q).strip()
+    core = re.sub(r"\s+(work|works|mean|means)$", "", core, flags=re.I)
+    keywords = " ".join(w for w in re.findall(r"[\w/+-]+", q.lower()) if w not in STOPWORDS)
+    expanded = " ".join(ACRONYMS.get(w.lower(), w) for w in core.split())
+
+    candidates = [
+        expanded if expanded.lower() != core.lower() else "",
+        f"{core} explained" if core else "",
+        keywords,
+        f"what is {core}" if core and not q.lower().startswith("what is") else "",
+    ]
+    seen = {query.strip().lower()}
+    variants = []
+    for c in candidates:
+        c = c.strip()
+        if c and c.lower() not in seen:
+            seen.add(c.lower())
+            variants.append(c)
+    return variants[:n]
+
+
+# The model is passed per run (rag_agent imports this module, so it cannot be imported here).
+variants_agent = Agent(
+    output_type=List[str],
+    system_prompt=(
+        "Rewrite the user's question into the requested number of short, diverse search queries "
+        "for a transcript search engine. Expand acronyms and name the underlying topic."
+    ),
+)
+
+
+async def llm_variants(query: str, n: int = 3) -> List[str]:
+    from knowledge_base.rag_agent import get_model
+
+    result = await variants_agent.run(f"{n} search queries for: {query}", model=get_model(settings.chat_model))
+    return [v.strip() for v in result.output if v.strip()][:n]
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[Dict]], k: int) -> List[Dict]:
+    """
+    Fuse ranked row lists by RRF (sum of 1 / (RRF_K + rank)). Each fused row
+    keeps its best (lowest) distance so the usual gate still applies.
+    """
+    scores: Dict[Tuple[str, int], float] = {}
+    best: Dict[Tuple[str, int], Dict] = {}
+    for rows in result_lists:
+        for rank, row in enumerate(rows):
+            key = (row.get("source_file"), int(row.get("chunk_index", -1)))
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            prev = best.get(key)
+            if prev is None or (row.get("_distance") or 0) < (prev.get("_distance") or 0):
+                best[key] = row
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [best[key] for key in ranked[:k]]
+
+
+async def retrieve_expanded(
+    query: str, k: int = 5, method: str = "rules", n: int = 3, deadline: Optional[float] = None
+) -> ExpandedRetrieval:
+    """
+    Multi-query retrieval: generate variants, embed original + variants in one
+    batched call, search all of them concurrently and fuse the rankings.
+    `deadline` (time.monotonic()) bounds the embedding call's retries. The LLM
+    rewrite is optional: if it fails (quota, malformed output) the rule-based
+    variants are used instead.
+    """
+    timings: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    source = "rules"
+    with span("expand.variants", method=method) as s:
+        if method == "llm":
+            try:
+                extra, source = await llm_variants(query, n), "llm"
+            except Exception as e:
+                log.warning("LLM query rewrite failed, using rule-based variants: %s", e)
+                extra, source = rule_based_variants(query, n), "rules_fallback"
+                s.set(error=type(e).__name__)
+        else:
+            extra = rule_based_variants(query, n)
+        s.set(source=source, variants=len(extra))
+    variants = [query] + extra
+    timings["variants_ms"] = 1000 * (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    vectors = await asyncio.to_thread(get_embedder().embed, variants, deadline)
+    timings["embed_ms"] = 1000 * (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    result_lists = await asyncio.gather(*(asyncio.to_thread(search_rows, v, k) for v in vectors))
+    timings["search_ms"] = 1000 * (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    chunks = filter_results(reciprocal_rank_fusion(result_lists, k))
+    timings["fuse_ms"] = 1000 * (time.perf_counter() - start)
+
+    timings = {name: round(ms, 2) for name, ms in timings.items()}
+    return ExpandedRetrieval(chunks, variants, vectors[0], timings, source)
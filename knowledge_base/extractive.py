@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import re
+from typing import List, Sequence, Set, Tuple
+
+from knowledge_base.compression import split_sentences
+from knowledge_base.expansion import STOPWORDS
+from knowledge_base.retriever import RetrievedChunk
+
+
+_WORD = re.compile(r"\w+")
+
+EXTRACTIVE_HEADER = "Most relevant passages from the transcripts (extracted, not generated):"
+
+
+def content_terms(text: str) -> Set[str]:
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 1 and w not in STOPWORDS}
+
+
+def top_sentences(
+    question: str, chunks: Sequence[RetrievedChunk], max_sentences: int = 3
+) -> List[Tuple[str, RetrievedChunk]]:
+    """
+    Rank sentences by the share of question terms they contain, breaking ties
+    by retrieval rank. Purely lexical: no embedding or LLM call.
+    """
+    q_terms = content_terms(question)
+    scored = []
+    for rank, chunk in enumerate(chunks):
+        for pos, sentence in enumerate(split_sentences(chunk.text)):
+            overlap = len(q_terms & content_terms(sentence)) / len(q_terms) if q_terms else 0.0
+            scored.append((-overlap, rank, pos, sentence, chunk))
+    scored.sort(key=lambda s: s[:3])
+    return [(sentence, chunk) for _, _, _, sentence, chunk in scored[:max_sentences]]
+
+
+def extractive_answer(question: str, chunks: Sequence[RetrievedChunk], max_sentences: int = 3) -> str:
+    """Answer built from the top retrieved sentences, cited like the LLM answers."""
+    picked = top_sentences(question, chunks, max_sentences)
+    lines = [EXTRACTIVE_HEADER, ""]
+    lines += [f'- "{sentence}" ({chunk.source_file}, chunk {chunk.chunk_label})' for sentence, chunk in picked]
+
+    sources = []
+    for _, chunk in picked:
+        ref = f"- ({chunk.source_file}, chunk {chunk.chunk_label})"
+        if ref not in sources:
+            sources.append(ref)
+    return "\n".join(lines + ["", "Sources", *sources])
@@ -0,0 +1,193 @@
+"""
+Background ingestion for the API: POST /ingest enqueues transcripts, one
+worker task chunks, embeds (batched, shared rate limiter) and appends them
+to the live LanceDB table. Writes commit per job, so queries in this process
+see the new rows without a rebuild (other processes within
+settings.lance_read_consistency_s); blocking work runs in threads, so queries
+keep being served meanwhile. The queue is per process, so only a
+single-worker server accepts jobs (knowledge_base/serve.py turns
+settings.ingest_api_enabled off otherwise).
+
+Re-ingesting a file name replaces its rows in one commit (merge on
+source_file + chunk_index), so a query never sees the file missing. With settings.ingest_api_save_sources
+the upload is also written to data/, so the next full `ingestion.py` rebuild
+keeps it; on a read-only deployment that copy is skipped with a warning.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from backend.config import settings
+from backend.constants import DATA_PATH
+from knowledge_base.answer_store import invalidate_from_table
+from knowledge_base.embedders import check_compatible
+from knowledge_base.ingestion import VECTOR_COLUMN, chunk_spans, embed_texts, infer_collection
+from knowledge_base.mds_to_text import markdown_to_text
+from knowledge_base.retriever import get_table, table_embedder
+from knowledge_base.shards import replace_rows
+from knowledge_base.tables import active_table_name, sql_quote
+
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Transcript:
+    name: str  # file name, e.g. "FastAPI background tasks.md"
+    text: str
+    collection: Optional[str] = None  # default: inferred from the name, as in ingestion.py
+
+
+@dataclass
+class IngestJob:
+    id: str
+    transcripts: List[Transcript]
+    status: str = "queued"  # queued -> running -> done | failed
+    chunks: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "files": [t.name for t in self.transcripts],
+            "chunks": self.chunks,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class QueueFull(Exception):
+    pass
+
+
+def validate_name(name: str) -> str:
+    name = name.strip()
+    if not name or Path(name).name != name or name.startswith("."):
+        raise ValueError(f"Invalid file name: {name!r}")
+    if Path(name).suffix.lower() not in (".md", ".txt"):
+        raise ValueError(f"Only .md and .txt transcripts are supported: {name!r}")
+    return name
+
+
+def transcript_rows(doc: Transcript, embed) -> List[Dict[str, Any]]:
+    """Chunk and embed one transcript into rows shaped like ingestion.py's."""
+    text = markdown_to_text(doc.text) if doc.name.lower().endswith(".md") else doc.text
+    spans = chunk_spans(text, settings.chunk_size, settings.chunk_overlap)
+    vectors = embed([chunk for _, _, chunk in spans]) if spans else []
+    collection = doc.collection or infer_collection(Path(doc.name))
+    return [
+        {
+            "collection": collection,
+            "source_file": doc.name,
+            "chunk_index": i,
+            "char_start": start,
+            "char_end": end,
+            "text": chunk,
+            VECTOR_COLUMN: vec,
+        }
+        for i, ((start, end, chunk), vec) in enumerate(zip(spans, vectors))
+    ]
+
+
+def run_job(job: IngestJob, table, embed) -> int:
+    """Blocking part of a job (runs in a thread). Returns the number of chunks written."""
+    rows: List[Dict[str, Any]] = []
+    for doc in job.transcripts:
+        rows.extend(transcript_rows(doc, embed))
+
+    names = ", ".join(sql_quote(doc.name) for doc in job.transcripts)
+    replace_rows(table, f"source_file IN ({names})", rows, ["source_file", "chunk_index"])
+    invalidate_from_table(table)
+
+    # The rows are live now; failing to keep a copy must not fail the job.
+    if settings.ingest_api_save_sources:
+        for doc in job.transcripts:
+            try:
+                (DATA_PATH / doc.name).write_text(doc.text, encoding="utf-8")
+            except OSError as e:
+                log.warning("ingest job %s: could not save %s to %s: %s", job.id, doc.name, DATA_PATH, e)
+    return len(rows)
+
+
+class IngestQueue:
+    """Bounded job queue with a single writer task, so jobs of this process never race (one process per table)."""
+
+    def __init__(self, maxsize: int, history: int) -> None:
+        self.maxsize = maxsize
+        self.history = history
+        self.jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the worker once per process; must be called from the event loop."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._worker = loop.create_task(self._run())
+
+    def submit(self, transcripts: List[Transcript]) -> IngestJob:
+        self.start()
+        for t in transcripts:
+            t.name = validate_name(t.name)
+        job = IngestJob(uuid.uuid4().hex, transcripts)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"Ingestion queue is full ({self.maxsize} jobs)") from None
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.history:
+            self.jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def join(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status, job.started_at = "running", time.time()
+            try:
+                table = get_table(active_table_name())
+                # Appending vectors from another embedder would silently corrupt the table.
+                check_compatible(*table_embedder(table), f"table {table.name}")
+                job.chunks = await asyncio.to_thread(run_job, job, table, embed_texts)
+                job.status = "done"
+            except Exception as e:
+                job.status, job.error = "failed", str(e)
+                log.exception("ingest job %s failed", job.id)
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+
+_queue: Optional[IngestQueue] = None
+
+
+def ingest_queue() -> IngestQueue:
+    global _queue
+    if _queue is None:
+        _queue = IngestQueue(settings.ingest_api_queue_size, settings.ingest_api_job_history)
+    return _queue
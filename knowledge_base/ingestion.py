@@ -1,18 +1,46 @@
 from __future__ import annotations
 
-from collections import Counter
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, List
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import lancedb
-from google import genai
+import pyarrow as pa
 
 from backend.config import settings
 from backend.constants import DATA_PATH
-
+from knowledge_base.answer_store import invalidate_from_table
+from knowledge_base.dedup import Deduplicator, Duplicate, Fingerprint, MinHasher, fingerprint
+from knowledge_base.embedders import get_embedder, index_metadata
+from knowledge_base.mds_to_text import markdown_to_text
+from knowledge_base.shards import ShardedTable, open_table, table_exists
+from knowledge_base.tables import (
+    cleanup_versions,
+    publish_table,
+    sql_quote,
+    version_prefix,
+    write_json_atomic,
+)
+
+
+log = logging.getLogger(__name__)
 
 VECTOR_COLUMN = "embedding"
-EMBED_DIM = 768  # text-embedding-004
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
 
 
 def iter_text_files(root: Path) -> Iterable[Path]:
@@ -20,6 +48,40 @@ def iter_text_files(root: Path) -> Iterable[Path]:
     yield from root.glob("**/*.txt")
 
 
+def iter_source_files(root: Path) -> Iterable[Path]:
+    """
+    Yield the files to ingest. With settings.ingest_markdown, .md files are read
+    directly (no .txt export step needed) and a .txt is only used when it has
+    no .md sibling.
+    """
+    if not settings.ingest_markdown:
+        yield from sorted(iter_text_files(root), key=originals_first)
+        return
+    md_files = sorted(root.glob("**/*.md"), key=originals_first)
+    yield from md_files
+    md_stems = {p.with_suffix("") for p in md_files}
+    yield from (
+        p for p in sorted(iter_text_files(root), key=originals_first)
+        if p.with_suffix("") not in md_stems
+    )
+
+
+_COPY_SUFFIX = re.compile(r" \(\d+\)$")
+
+
+def originals_first(path: Path):
+    """Sort key placing "name (1).md" right after "name.md", so originals win dedup."""
+    stem = _COPY_SUFFIX.sub("", path.stem)
+    return (str(path.parent), stem, stem != path.stem, path.name)
+
+
+def load_text(path: Path) -> str:
+    text = path.read_text(encoding="utf-8", errors="ignore")
+    if path.suffix.lower() == ".md":
+        return markdown_to_text(text)
+    return text
+
+
 def infer_collection(path: Path) -> str:
     name = path.name.lower()
 
@@ -61,108 +123,456 @@ def infer_collection(path: Path) -> str:
     return "misc"
 
 
-def chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> List[str]:
-    """Simple sliding-window chunking with overlap."""
+def chunk_spans(text: str, chunk_size: int = 1200, overlap: int = 200) -> List[Tuple[int, int, str]]:
+    """
+    Sliding-window chunking with overlap. Returns (char_start, char_end, chunk)
+    with chunk == text.strip()[char_start:char_end], so neighbouring chunks can
+    later be stitched back together without repeating the overlap.
+    """
     text = text.strip()
     if not text:
         return []
 
-    chunks: List[str] = []
+    spans: List[Tuple[int, int, str]] = []
     start = 0
     n = len(text)
 
     while start < n:
         end = min(start + chunk_size, n)
-        chunk = text[start:end].strip()
+        window = text[start:end]
+        chunk = window.strip()
         if chunk:
-            chunks.append(chunk)
+            lead = len(window) - len(window.lstrip())
+            spans.append((start + lead, start + lead + len(chunk), chunk))
 
         # Move forward with overlap (and avoid infinite loops)
         next_start = end - overlap
         start = next_start if next_start > start else end
 
-    return chunks
+    return spans
 
 
-def embed_texts(client: genai.Client, texts: List[str]) -> List[List[float]]:
-    """Embed texts using the same model as retrieval."""
-    res = client.models.embed_content(
-        model=settings.embed_model,
-        contents=texts,
+def chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> List[str]:
+    """Simple sliding-window chunking with overlap."""
+    return [chunk for _, _, chunk in chunk_spans(text, chunk_size, overlap)]
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed texts with the same embedder as retrieval (batched; rate-limited and retried for Gemini)."""
+    return get_embedder().embed_batched(texts)
+
+
+def table_schema(dim: int) -> pa.Schema:
+    """Row schema of a segments table, tagged with the embedder that fills it."""
+    return pa.schema(
+        [
+            ("collection", pa.string()),
+            ("source_file", pa.string()),
+            ("chunk_index", pa.int64()),
+            ("char_start", pa.int64()),
+            ("char_end", pa.int64()),
+            ("text", pa.string()),
+            (VECTOR_COLUMN, pa.list_(pa.float32(), dim)),
+        ],
+        metadata=index_metadata(get_embedder()),
     )
-    return [e.values for e in res.embeddings]
 
 
-def main() -> None:
-    files = list(iter_text_files(DATA_PATH))
-    print(f"DATA_PATH = {DATA_PATH}")
-    print(f"Found {len(files)} .txt files")
+def file_digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
 
-    if not files:
-        print("No .txt files to ingest.")
-        return
 
-    counts = Counter(infer_collection(p) for p in files)
-    print("Collection file counts:", dict(counts))
+@dataclass
+class Checkpoint:
+    """
+    Progress of one ingestion run, persisted next to the LanceDB directory.
 
-    db = lancedb.connect(str(settings.lancedb_dir))
+    `files` maps source_file -> {"sha1": ..., "chunks": n} for every file whose
+    rows are fully written to the staging table.
+    """
 
-    # Drop table (dev mode)
-    try:
-        existing = set(db.list_tables())  # newer lancedb
-    except Exception:
-        existing = set(db.table_names())  # older lancedb
+    run_id: str
+    table: str
+    embed_model: str
+    files: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @staticmethod
+    def path() -> Path:
+        return Path(settings.lancedb_dir) / f"{settings.lancedb_table}.checkpoint.json"
+
+    @classmethod
+    def load(cls) -> Optional["Checkpoint"]:
+        path = cls.path()
+        if not path.exists():
+            return None
+        return cls(**json.loads(path.read_text(encoding="utf-8")))
+
+    def save(self) -> None:
+        write_json_atomic(self.path(), asdict(self))
+
+    def is_done(self, name: str, digest: str) -> bool:
+        entry = self.files.get(name)
+        return entry is not None and entry.get("sha1") == digest
+
+    def mark_done(self, name: str, digest: str, chunks: int, min_interval: float = 0.0) -> None:
+        """Record a finished file; saves at most every `min_interval` seconds."""
+        self.files[name] = {"sha1": digest, "chunks": chunks}
+        now = time.monotonic()
+        if now - getattr(self, "_last_save", 0.0) >= min_interval:
+            self.save()
+            self._last_save = now
 
-    if settings.lancedb_table in existing:
-        db.drop_table(settings.lancedb_table)
+    @classmethod
+    def clear(cls) -> None:
+        cls.path().unlink(missing_ok=True)
 
-    # Build client BEFORE creating table (we need a seed embedding for schema)
-    client = genai.Client(api_key=settings.gemini_api_key)
 
+def create_staging_table(db, embed: EmbedFn, name: str):
     # Create table with a non-zero seed row (avoid zero-vector "schema magnet")
     seed_text = "__schema_seed_row_do_not_retrieve__"
-    seed_vec = embed_texts(client, [seed_text])[0]
+    seed_vec = embed([seed_text])[0]
 
     seed_row = {
         "collection": "seed",
         "source_file": "__seed__",
         "chunk_index": -1,
+        "char_start": 0,
+        "char_end": 0,
         "text": seed_text,
         VECTOR_COLUMN: seed_vec,
     }
 
-    table = db.create_table(settings.lancedb_table, data=[seed_row])
+    if settings.shard_by != "none":
+        # Shards are created from the schema alone; no seed row needed.
+        return ShardedTable.create(db, name, table_schema(len(seed_vec)), settings.shard_by, settings.shard_count)
+    return db.create_table(name, data=[seed_row], schema=table_schema(len(seed_vec)), mode="overwrite")
+
+
+def start_or_resume(db, embed: EmbedFn, fresh: bool = False):
+    """Return (checkpoint, staging table), resuming an interrupted run when possible."""
+    cp = None if fresh else Checkpoint.load()
+    embedder = get_embedder()
+    prefix = version_prefix(embedder.name, embedder.dim)
+
+    if cp is not None and cp.embed_model != embedder.name:
+        print(f"Checkpoint was built with {cp.embed_model}; starting a fresh run.")
+        cp = None
+    if cp is not None and not cp.table.startswith(prefix + "_"):
+        print(f"Checkpoint table {cp.table} has other chunking settings; starting a fresh run.")
+        cp = None
+
+    if cp is not None and table_exists(db, cp.table):
+        table = open_table(db, cp.table)
+        if "char_start" not in table.schema.names:
+            print(f"Staging table {cp.table} has no chunk offsets; starting a fresh run.")
+            return start_or_resume(db, embed, fresh=True)
+        print(f"Resuming run {cp.run_id}: {len(cp.files)} files already written to {cp.table}")
+        # Checkpoints are saved periodically, so rows of files written after the
+        # last save may exist; drop them so those files are redone cleanly.
+        done = ", ".join(sql_quote(n) for n in cp.files)
+        where = "source_file != '__seed__'" + (f" AND source_file NOT IN ({done})" if done else "")
+        table.delete(where)
+        return cp, table
+
+    # Unique even for runs started within the same second, so a new staging
+    # table can never overwrite the table that is currently serving.
+    run_id = f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    cp = Checkpoint(
+        run_id=run_id,
+        table=f"{prefix}_{run_id}",
+        embed_model=embedder.name,
+    )
+    table = create_staging_table(db, embed, cp.table)
+    cp.save()
+    print(f"Started run {run_id} into staging table {cp.table}")
+    return cp, table
+
+
+def make_dedupers():
+    kwargs = dict(
+        threshold=settings.dedup_threshold,
+        num_perm=settings.dedup_num_perm,
+        bands=settings.dedup_bands,
+        shingle_size=settings.dedup_shingle_size,
+    )
+    return Deduplicator("file", **kwargs), Deduplicator("chunk", **kwargs)
+
+
+def write_dedup_report(skipped: List[Duplicate]) -> Path:
+    path = Path(settings.lancedb_dir) / f"{settings.lancedb_table}.dedup_report.json"
+    write_json_atomic(path, {"skipped": [d.to_dict() for d in skipped]})
+    by_kind = Counter(f"{d.level}/{d.reason}" for d in skipped)
+    print(f"Dedup skipped {len(skipped)} items: {dict(by_kind)} (report: {path})")
+    return path
+
+
+@dataclass
+class PreparedFile:
+    """CPU-side result for one file, produced in a worker process."""
+
+    name: str
+    collection: str
+    text_sha1: str
+    chunks: List[Tuple[int, str]]
+    spans: List[Tuple[int, int]] = field(default_factory=list)  # (char_start, char_end) per chunk_index
+    file_fp: Optional[Fingerprint] = None
+    chunk_fps: List[Fingerprint] = field(default_factory=list)
+
+
+@lru_cache(maxsize=4)
+def _worker_hasher(num_perm: int) -> MinHasher:
+    return MinHasher(num_perm)
+
+
+def prepare_file(
+    path: Path, dedup: Optional[Tuple[int, int]] = None, chunking: Tuple[int, int] = (1200, 200)
+) -> PreparedFile:
+    """
+    Read, clean, chunk and fingerprint one file. Runs in a process pool, so it
+    only takes picklable arguments: `dedup` is (num_perm, shingle_size) or None,
+    `chunking` is (chunk_size, overlap).
+    """
+    text = load_text(path)
+    spans = chunk_spans(text, *chunking)
+    chunks = [(i, chunk) for i, (_, _, chunk) in enumerate(spans)]
+    prepared = PreparedFile(
+        path.name, infer_collection(path), file_digest(text), chunks, [(a, b) for a, b, _ in spans]
+    )
+    if dedup is not None:
+        hasher = _worker_hasher(dedup[0])
+        prepared.file_fp = fingerprint(text, hasher, dedup[1])
+        prepared.chunk_fps = [fingerprint(c, hasher, dedup[1]) for _, c in chunks]
+    return prepared
+
+
+@dataclass
+class EmbedJob:
+    prepared: PreparedFile
+    digest: str
+    chunks: List[Tuple[int, str]]
+
+
+@dataclass
+class PipelineStats:
+    files: int = 0
+    resumed: int = 0
+    chunks: int = 0
+    duplicates: List[Duplicate] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def raise_first(eg: BaseExceptionGroup) -> None:
+    """
+    Raise the first failure of a pipeline stage (quota, bad file...) as itself,
+    chained to the group, after logging the others. Groups holding anything but
+    Exceptions (KeyboardInterrupt, SystemExit) are re-raised whole.
+    """
+    if not all(isinstance(e, Exception) for e in eg.exceptions):
+        raise eg
+    for e in eg.exceptions[1:]:
+        log.error("ingestion stage also failed: %r", e, exc_info=e)
+    raise eg.exceptions[0] from eg
+
+
+async def run_pipeline(
+    files: List[Path],
+    cp: Checkpoint,
+    table,
+    embed: EmbedFn,
+    workers: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> PipelineStats:
+    """
+    Three stages connected by bounded queues:
+
+      1. process pool: read + clean + chunk + fingerprint (CPU, all cores)
+      2. `concurrency` embedding tasks (network, via threads + shared rate limiter)
+      3. one writer batching rows into table.add and recording checkpoints
+
+    Dedup and checkpoint decisions happen in file order in this process, so
+    results are identical to a serial run.
+    """
+    workers = workers or settings.ingest_workers or os.cpu_count() or 1
+    concurrency = concurrency or settings.ingest_embed_concurrency
+    stats = PipelineStats()
+    start = time.perf_counter()
+
+    file_dedup, chunk_dedup = make_dedupers()
+    dedup_args = (settings.dedup_num_perm, settings.dedup_shingle_size) if settings.dedup_enabled else None
+    chunking = (settings.chunk_size, settings.chunk_overlap)
+
+    embed_q: asyncio.Queue = asyncio.Queue(maxsize=settings.ingest_queue_size)
+    write_q: asyncio.Queue = asyncio.Queue(maxsize=settings.ingest_queue_size)
+
+    def select(prep: PreparedFile) -> Optional[EmbedJob]:
+        chunks = prep.chunks
+        if dedup_args is not None:
+            dup = file_dedup.check(prep.name, fp=prep.file_fp)
+            if dup is not None:
+                stats.duplicates.append(dup)
+                chunks = []
+            kept = []
+            for (i, chunk), fp in zip(chunks, prep.chunk_fps):
+                dup = chunk_dedup.check(f"{prep.name}#{i}", fp=fp)
+                if dup is not None:
+                    stats.duplicates.append(dup)
+                else:
+                    kept.append((i, chunk))
+            chunks = kept
+
+        digest = file_digest(prep.text_sha1 + "".join(f"|{i}" for i, _ in chunks))
+        if cp.is_done(prep.name, digest):
+            stats.resumed += 1
+            return None
+        if prep.name in cp.files:
+            # Content changed since it was written in this run: redo it.
+            table.delete(f"source_file = {sql_quote(prep.name)}")
+        if not chunks:
+            cp.mark_done(prep.name, digest, 0, min_interval=2.0)
+            return None
+        return EmbedJob(prep, digest, chunks)
+
+    async def produce() -> None:
+        loop = asyncio.get_running_loop()
+        paths = iter(files)
+        pending: deque = deque()
+        # spawn, not fork: forking a process that holds LanceDB's async runtime can deadlock
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+
+            def submit_next() -> None:
+                path = next(paths, None)
+                if path is not None:
+                    pending.append(loop.run_in_executor(pool, prepare_file, path, dedup_args, chunking))
+
+            for _ in range(workers * 4):  # bounded look-ahead
+                submit_next()
+            while pending:
+                prep = await pending.popleft()
+                submit_next()
+                stats.files += 1
+                job = select(prep)
+                if job is not None:
+                    await embed_q.put(job)
+        for _ in range(concurrency):
+            await embed_q.put(None)
+
+    async def embed_worker() -> None:
+        while (job := await embed_q.get()) is not None:
+            vectors = await asyncio.to_thread(embed, [c for _, c in job.chunks])
+            await write_q.put((job, vectors))
+        await write_q.put(None)
+
+    async def writer() -> None:
+        rows: List[Dict[str, Any]] = []
+        jobs: List[EmbedJob] = []
+
+        async def flush() -> None:
+            if rows:
+                await asyncio.to_thread(table.add, list(rows))
+            for job in jobs:
+                cp.mark_done(job.prepared.name, job.digest, len(job.chunks), min_interval=2.0)
+                print(f"[OK] {job.prepared.name}: {len(job.chunks)} chunks ({job.prepared.collection})")
+            stats.chunks += len(rows)
+            rows.clear()
+            jobs.clear()
+
+        finished = 0
+        while finished < concurrency:
+            item = await write_q.get()
+            if item is None:
+                finished += 1
+                continue
+            job, vectors = item
+            # chunk_index keeps the position in the file, even when chunks were skipped
+            rows.extend(
+                {
+                    "collection": job.prepared.collection,
+                    "source_file": job.prepared.name,
+                    "chunk_index": i,
+                    "char_start": job.prepared.spans[i][0],
+                    "char_end": job.prepared.spans[i][1],
+                    "text": chunk,
+                    VECTOR_COLUMN: vec,
+                }
+                for (i, chunk), vec in zip(job.chunks, vectors)
+            )
+            jobs.append(job)
+            if len(rows) >= settings.ingest_write_batch_rows:
+                await flush()
+        await flush()
 
-    total_chunks = 0
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(produce())
+            for _ in range(concurrency):
+                tg.create_task(embed_worker())
+            tg.create_task(writer())
+    except BaseExceptionGroup as eg:
+        raise_first(eg)
+    finally:
+        cp.save()
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main(fresh: bool = False) -> None:
+    files = list(iter_source_files(DATA_PATH))
+    print(f"DATA_PATH = {DATA_PATH}")
+    print(f"Found {len(files)} source files")
 
-    for path in files:
-        text = path.read_text(encoding="utf-8", errors="ignore")
-        chunks = chunk_text(text)
-        if not chunks:
-            continue
-
-        vectors = embed_texts(client, chunks)
-        collection = infer_collection(path)
-
-        rows = [
-            {
-                "collection": collection,
-                "source_file": path.name,
-                "chunk_index": i,
-                "text": chunk,
-                VECTOR_COLUMN: vec,
-            }
-            for i, (chunk, vec) in enumerate(zip(chunks, vectors))
-        ]
-
-        table.add(rows)
-        total_chunks += len(rows)
-        print(f"[OK] {path.name}: {len(rows)} chunks ({collection})")
-
-    print(f"Done. Total chunks added: {total_chunks}")
-    print("Table:", settings.lancedb_table)
+    if not files:
+        print("No files to ingest.")
+        return
+
+    counts = Counter(infer_collection(p) for p in files)
+    print("Collection file counts:", dict(counts))
+
+    db = lancedb.connect(str(settings.lancedb_dir))
+    embed = embed_texts
+    print(f"Embedder: {get_embedder().name} ({get_embedder().dim} dims)")
+
+    # Build into a staging table; the live table keeps serving until publish.
+    cp, table = start_or_resume(db, embed, fresh=fresh)
+
+    stats = asyncio.run(run_pipeline(files, cp, table, embed))
+
+    # Files removed from data/ since the run started must not survive into the build.
+    current = {p.name for p in files}
+    for name in [n for n in cp.files if n not in current]:
+        table.delete(f"source_file = {sql_quote(name)}")
+        del cp.files[name]
+    cp.save()
+
+    # Drop precomputed answers whose sources differ in the new table before it
+    # goes live, so none is served against changed chunks (an answer dropped a
+    # moment early is just recomputed).
+    dropped = invalidate_from_table(table)
+    if dropped:
+        print(f"Invalidated {dropped} precomputed answers with changed sources")
+
+    # Success: atomically switch readers to the new table. The previous version
+    # is kept for rollback (and for requests still reading it); older ones go.
+    previous = publish_table(cp.table)
+    Checkpoint.clear()
+    for name in cleanup_versions(db):
+        print("Dropped old table version", name)
+
+    if settings.dedup_enabled:
+        write_dedup_report(stats.duplicates)
+
+    print(
+        f"Done. Total chunks added: {stats.chunks} (resumed past {stats.resumed} files) "
+        f"in {stats.seconds:.1f}s"
+    )
+    print("Table:", cp.table, "->", settings.lancedb_table)
+    if previous and table_exists(db, previous):
+        print(f"Roll back with: python -m knowledge_base.tables activate {previous}")
     print('Tip: In retrieval, filter with where("collection = \'transcripts\'").')
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Embed data/ transcripts into LanceDB.")
+    parser.add_argument("--fresh", action="store_true", help="ignore any checkpoint and rebuild")
+    main(fresh=parser.parse_args().fresh)
@@ -1,24 +1,95 @@
+from __future__ import annotations
+
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import List, Tuple
+
 from backend.constants import DATA_PATH
 
 
+# Order matters: struck-out words and timestamps go before emphasis/link handling.
+_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"<!--.*?-->", re.S), " "),                              # HTML comments
+    (re.compile(r"^```[^\n]*$", re.M), ""),                               # code fences (keep code)
+    (re.compile(r"~~.*?~~", re.S), " "),                                  # struck-out (corrected) words
+    (re.compile(r"\[\d{1,2}:\d{2}(?::\d{2})?\]"), " "),                  # transcript timestamps
+    (re.compile(r"^[ \t]*\*\*[^*\n]{1,60}:\*\*[ \t]*", re.M), ""),        # **Speaker:** labels
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),                      # images -> alt text
+    (re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),                       # links -> link text
+    (re.compile(r"^[ \t]*\[[^\]]+\]:[ \t]*\S+.*$", re.M), ""),            # reference link definitions
+    (re.compile(r"<https?://[^>]+>|https?://\S+"), " "),                 # bare URLs
+    (re.compile(r"</?[A-Za-z][^>]*>"), " "),                              # HTML tags
+    (re.compile(r"^[ \t]{0,3}#{1,6}[ \t]*", re.M), ""),                   # heading markers
+    (re.compile(r"^[ \t]{0,3}>[ \t]?", re.M), ""),                        # blockquotes
+    (re.compile(r"^[ \t]*(?:[-*+]|\d+[.)])[ \t]+", re.M), ""),            # list markers
+    (re.compile(r"^[ \t]*(?:[-*_][ \t]*){3,}$", re.M), ""),               # horizontal rules
+    (re.compile(r"^[ \t]*\|?(?:[ \t]*:?-{3,}:?[ \t]*\|)+[ \t]*:?-*:?[ \t]*\n?", re.M), ""),  # table rules
+    (re.compile(r"[ \t]*\|[ \t]*"), " "),                                 # table cell pipes
+    (re.compile(r"(\*\*|__)(.+?)\1"), r"\2"),                            # bold
+    (re.compile(r"(?<![\w*])[*_](?!\s)(.+?)(?<!\s)[*_](?![\w*])"), r"\1"),  # italics
+    (re.compile(r"`([^`]*)`"), r"\1"),                                    # inline code
+]
+
+
+def markdown_to_text(md: str) -> str:
+    """Strip markdown/transcript markup and normalize whitespace."""
+    text = md
+    for pattern, repl in _PATTERNS:
+        text = pattern.sub(repl, text)
+
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    text = "\n".join(lines)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip() + "\n"
+
+
 def extract_text_from_md(path: Path) -> str:
-    return path.read_text(encoding="utf-8")
+    return markdown_to_text(path.read_text(encoding="utf-8", errors="ignore"))
 
 
 def export_text_to_txt(text: str, export_path: Path) -> None:
     export_path.write_text(text, encoding="utf-8")
 
 
-if __name__ == "__main__":
-    md_files = list(DATA_PATH.glob("**/*.md"))
+def convert_file(md_path: Path, force: bool = False) -> str:
+    """
+    Convert one .md to its sibling .txt. Returns "skipped" when the .txt is
+    newer than the .md, "unchanged" when the converted text is identical to
+    what is already there, else "written".
+    """
+    out_path = md_path.with_suffix(".txt")  # same folder, same name, .txt
+    if not force and out_path.exists() and out_path.stat().st_mtime >= md_path.stat().st_mtime:
+        return "skipped"
 
-    print(f"DATA_PATH = {DATA_PATH}")
-    print(f"Found {len(md_files)} .md files")
+    text = extract_text_from_md(md_path)
+    if out_path.exists() and out_path.read_text(encoding="utf-8", errors="ignore") == text:
+        os.utime(out_path)  # mark as up to date for the mtime check next time
+        return "unchanged"
+
+    export_text_to_txt(text, out_path)
+    return "written"
+
+
+def convert_all(root: Path, workers: int | None = None, force: bool = False) -> dict:
+    md_files = sorted(root.glob("**/*.md"))
+    counts = {"written": 0, "unchanged": 0, "skipped": 0}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for md_path, status in zip(md_files, pool.map(convert_file, md_files, [force] * len(md_files))):
+            counts[status] += 1
+            if status == "written":
+                print("Converted:", md_path.relative_to(root))
+    return counts
 
-    for md_path in md_files:
-        out_path = md_path.with_suffix(".txt")  # same folder, same name, .txt
-        print("Converting:", md_path.relative_to(DATA_PATH))
-        export_text_to_txt(extract_text_from_md(md_path), out_path)
 
-    print("Done.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert data/**/*.md to plain .txt.")
+    parser.add_argument("--workers", type=int, default=None, help="process count (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="reconvert even if .txt is up to date")
+    args = parser.parse_args()
+
+    print(f"DATA_PATH = {DATA_PATH}")
+    print(f"Found {len(list(DATA_PATH.glob('**/*.md')))} .md files")
+    print("Done:", convert_all(DATA_PATH, workers=args.workers, force=args.force))
@@ -0,0 +1,342 @@
+"""
+Memory diagnostics and budgets for the serving process.
+
+    uv run python -m knowledge_base.memory [--trace] [--top 15]   # a freshly loaded API process
+    uv run python -m knowledge_base.memory --url http://127.0.0.1:8000   # a running server
+
+GET /debug/memory (MEMORY_DIAGNOSTICS=true) reports RSS and peak RSS, the
+number of imported modules, the size of every registered cache and, when
+tracemalloc runs (MEMORY_TRACEMALLOC=true or --trace), the top allocating
+source lines.
+
+Caches that grow with traffic or corpus size register here (register_cache)
+with a function reporting their size and one that releases memory:
+
+  - hash_word_features: HashEmbedder per-word features (HASH_CACHE_MB)
+  - chat_sessions:      session store (CHAT_SESSIONS_MB)
+  - lancedb:            LanceDB index/metadata caches (LANCE_CACHE_MB)
+  - bundle:             the mapped index bundle and its row lookup index
+
+Each enforces its own byte budget on insert. MEMORY_BUDGET_MB additionally caps
+the process RSS: when it is exceeded (checked after requests, at most every
+MEMORY_CHECK_INTERVAL_S, in a worker thread so the event loop keeps serving)
+caches are trimmed largest first, the bundle's mapped pages are released
+(they fault back in from the page cache on the next search) and freed heap is
+handed back to the OS, until RSS is under budget.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import ctypes
+import gc
+import json
+import logging
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from backend.config import settings
+
+
+log = logging.getLogger(__name__)
+
+MB = 2 ** 20
+
+
+def _proc_status_kb(field: str) -> Optional[int]:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux); the peak elsewhere."""
+    kb = _proc_status_kb("VmRSS")
+    return kb * 1024 if kb is not None else peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    kb = _proc_status_kb("VmHWM")
+    if kb is not None:
+        return kb * 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB on Linux
+
+
+_SMAPS_HEADER = re.compile(r"^[0-9a-f]+-[0-9a-f]+ ")
+
+
+def mapped_rss_bytes(path: Path) -> Optional[int]:
+    """Resident bytes of this process's mappings of file `path` (Linux /proc/self/smaps), else None."""
+    target = str(Path(path).resolve())
+    total, current = 0, False
+    try:
+        with open("/proc/self/smaps", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if _SMAPS_HEADER.match(line):
+                    fields = line.split(maxsplit=5)
+                    current = len(fields) == 6 and fields[5].rstrip("\n") == target
+                elif current and line.startswith("Rss:"):
+                    total += int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return total
+
+
+class ByteBudgetCache:
+    """LRU mapping bounded by the estimated size of its values; thread-safe."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._items[key] = (value, nbytes)
+            self.bytes += nbytes
+            self._trim(self.max_bytes)
+
+    def _trim(self, max_bytes: int) -> int:
+        freed = 0
+        while self._items and self.bytes > max_bytes:
+            _, (_, nbytes) = self._items.popitem(last=False)
+            self.bytes -= nbytes
+            freed += nbytes
+            self.evictions += 1
+        return freed
+
+    def trim(self, max_bytes: int = 0) -> int:
+        """Evict least recently used entries down to `max_bytes`; returns the bytes released."""
+        with self._lock:
+            return self._trim(max_bytes)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+@dataclass
+class RegisteredCache:
+    stats: Callable[[], Dict[str, Any]]  # must include "bytes"
+    release: Callable[[], int]  # frees what it can under memory pressure; returns bytes released (estimate)
+
+
+_caches: Dict[str, RegisteredCache] = {}
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]], release: Callable[[], int]) -> None:
+    """Report the cache in diagnostics and let the process budget trim it. Re-registering replaces."""
+    _caches[name] = RegisteredCache(stats, release)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    out = {}
+    for name, cache in list(_caches.items()):
+        try:
+            out[name] = cache.stats()
+        except Exception as e:  # a diagnostics endpoint must not fail because of one cache
+            out[name] = {"bytes": 0, "error": repr(e)}
+    return out
+
+
+def release_heap() -> None:
+    """Collect garbage and return free heap pages to the OS (glibc only)."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+_budget_lock = threading.Lock()
+_last_check = 0.0
+budget_state: Dict[str, Any] = {"checks": 0, "enforcements": 0, "last": None}
+
+
+def enforce_budget(budget_bytes: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    If RSS exceeds the budget (default: settings.memory_budget_mb), release
+    caches largest first until it does not. Returns what was done, or None when
+    under budget or no budget is set.
+    """
+    if budget_bytes is None:
+        budget_bytes = int(settings.memory_budget_mb * MB)
+    if budget_bytes <= 0:
+        return None
+    with _budget_lock:
+        budget_state["checks"] += 1
+        before = rss_bytes()
+        if before <= budget_bytes:
+            return None
+        released: List[str] = []
+        sizes = cache_stats()
+        for name in sorted(_caches, key=lambda n: sizes.get(n, {}).get("bytes", 0), reverse=True):
+            _caches[name].release()
+            release_heap()
+            released.append(name)
+            if rss_bytes() <= budget_bytes:
+                break
+        action = {
+            "at": time.time(), "budget_mb": round(budget_bytes / MB, 1), "rss_before_mb": round(before / MB, 1),
+            "rss_after_mb": round(rss_bytes() / MB, 1), "released": released,
+        }
+        budget_state["enforcements"] += 1
+        budget_state["last"] = action
+        if action["rss_after_mb"] > action["budget_mb"]:
+            log.warning("RSS %.1f MB still above the %.1f MB budget after releasing all caches",
+                        action["rss_after_mb"], action["budget_mb"])
+        return action
+
+
+def budget_check_due() -> bool:
+    """True at most once per settings.memory_check_interval_s."""
+    global _last_check
+    now = time.monotonic()
+    if now - _last_check < settings.memory_check_interval_s:
+        return False
+    _last_check = now
+    return True
+
+
+def maybe_enforce_budget() -> Optional[Dict[str, Any]]:
+    """enforce_budget, at most once per settings.memory_check_interval_s."""
+    return enforce_budget() if budget_check_due() else None
+
+
+class MemoryBudgetMiddleware:
+    """
+    ASGI middleware checking the RSS budget after each (throttled) request.
+    Enforcement (gc, malloc_trim, madvise) runs in a thread, off the event loop.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if scope["type"] == "http" and budget_check_due():
+                await asyncio.to_thread(enforce_budget)
+
+
+def install_memory_budget(app) -> bool:
+    """Start tracemalloc and add MemoryBudgetMiddleware if enabled in settings. Returns whether a budget is set."""
+    if settings.memory_tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start(settings.memory_tracemalloc_frames)
+    if settings.memory_budget_mb <= 0:
+        return False
+    app.add_middleware(MemoryBudgetMiddleware)
+    return True
+
+
+def top_allocations(limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+    """Largest live allocations by source line, or None when tracemalloc is not running."""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ])
+    return [
+        {"where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "kb": round(s.size / 1024, 1),
+         "blocks": s.count}
+        for s in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+def report(top: int = 10) -> Dict[str, Any]:
+    caches = cache_stats()
+    traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+    return {
+        "rss_mb": round(rss_bytes() / MB, 1),
+        "peak_rss_mb": round(peak_rss_bytes() / MB, 1),
+        "budget_mb": settings.memory_budget_mb or None,
+        "modules": len(sys.modules),
+        "gc_objects": len(gc.get_objects()),
+        "caches_mb": round(sum(c.get("bytes", 0) for c in caches.values()) / MB, 1),
+        "caches": caches,
+        "tracemalloc": None if traced is None else {
+            "current_mb": round(traced[0] / MB, 1), "peak_mb": round(traced[1] / MB, 1),
+            "top": top_allocations(top),
+        },
+        "budget": budget_state,
+    }
+
+
+def print_report(data: Dict[str, Any]) -> None:
+    budget = f"{data['budget_mb']} MB" if data["budget_mb"] else "off"
+    print(f"RSS {data['rss_mb']} MB (peak {data['peak_rss_mb']} MB), budget {budget}")
+    print(f"{data['modules']} modules imported, {data['gc_objects']} gc-tracked objects")
+    print(f"\ncaches ({data['caches_mb']} MB):")
+    for name, stats in data["caches"].items():
+        extra = ", ".join(f"{k}={v}" for k, v in stats.items() if k != "bytes")
+        print(f"  {name:<20} {stats.get('bytes', 0) / MB:>8.1f} MB  {extra}")
+    traced = data["tracemalloc"]
+    if traced is None:
+        print("\ntracemalloc off (MEMORY_TRACEMALLOC=true, or --trace here)")
+    else:
+        print(f"\ntracemalloc: {traced['current_mb']} MB live, peak {traced['peak_mb']} MB; top lines:")
+        for row in traced["top"]:
+            print(f"  {row['kb']:>10.1f} KB {row['blocks']:>8} blocks  {row['where']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the API process's memory use and cache sizes.")
+    parser.add_argument("--url", help="query GET /debug/memory of a running server instead")
+    parser.add_argument("--top", type=int, default=15, help="tracemalloc lines to show")
+    parser.add_argument("--trace", action="store_true", help="run tracemalloc while loading (local only)")
+    args = parser.parse_args()
+
+    if args.url:
+        from urllib.request import urlopen
+
+        with urlopen(f"{args.url.rstrip('/')}/debug/memory?top={args.top}", timeout=30) as resp:
+            print_report(json.load(resp))
+        return
+
+    if args.trace:
+        tracemalloc.start(settings.memory_tracemalloc_frames)
+    from knowledge_base import api  # noqa: F401  (everything the server imports)
+    from knowledge_base.serve import preload
+    # Run as __main__, this file is a second copy of the module: the caches registered with the imported one.
+    from knowledge_base.memory import report as loaded_report
+
+    print(f"Loaded API; {preload() or 'no bundle'}\n")
+    print_report(loaded_report(args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+from knowledge_base.bundle import load_bundle
+from knowledge_base.retriever import RetrievedChunk, get_table
+from knowledge_base.tables import active_table_name, sql_quote
+
+
+ChunkKey = Tuple[str, int]
+
+
+def neighbor_ranges(chunks: Sequence[RetrievedChunk], n: int) -> Dict[str, List[Tuple[int, int]]]:
+    """{source_file: [(lo, hi), ...]} covering chunk_index ± n of every hit."""
+    ranges: Dict[str, List[Tuple[int, int]]] = {}
+    for c in chunks:
+        ranges.setdefault(c.source_file, []).append((max(0, c.chunk_index - n), c.chunk_index + n))
+    return ranges
+
+
+def fetch_chunks(ranges: Dict[str, List[Tuple[int, int]]]) -> Dict[ChunkKey, Dict[str, Any]]:
+    """All rows inside `ranges`, in one lookup against the active bundle or table."""
+    if not ranges:
+        return {}
+
+    bundle = load_bundle()
+    if bundle is not None:
+        wanted = {src: {i for lo, hi in spans for i in range(lo, hi + 1)} for src, spans in ranges.items()}
+        rows = [bundle.row_dict(r) for r in bundle.find_rows(wanted)]
+    else:
+        # One filtered scan for all hits instead of a query per neighbour.
+        where = " OR ".join(
+            f"(source_file = {sql_quote(src)} AND chunk_index BETWEEN {lo} AND {hi})"
+            for src, spans in ranges.items()
+            for lo, hi in spans
+        )
+        table = get_table(active_table_name())
+        columns = [c for c in ("source_file", "chunk_index", "char_start", "char_end", "text")
+                   if c in table.schema.names]
+        limit = sum(hi - lo + 1 for spans in ranges.values() for lo, hi in spans)
+        rows = table.search().where(where).select(columns).limit(limit).to_list()
+
+    return {(r["source_file"], int(r["chunk_index"])): r for r in rows}
+
+
+def stitch(rows: List[Dict[str, Any]]) -> str:
+    """
+    Join consecutive chunks of one file. With stored offsets the overlap
+    between sliding windows is dropped; without them chunks are joined as-is.
+    """
+    text = rows[0]["text"]
+    end = rows[0].get("char_end")
+    for row in rows[1:]:
+        start = row.get("char_start")
+        if end is not None and start is not None and start < end:
+            text += row["text"][end - start:]
+        else:
+            text += "\n" + row["text"]
+        end = row.get("char_end")
+    return text
+
+
+def merge_passages(
+    chunks: Sequence[RetrievedChunk], rows: Dict[ChunkKey, Dict[str, Any]], n: int
+) -> List[RetrievedChunk]:
+    """
+    Grow every hit by its ±n neighbours and merge overlapping or adjacent
+    windows of the same file into one passage. Passages keep the rank of
+    their best hit and the best hit's score; a window stops at a missing row.
+    """
+    rows = dict(rows)
+    for c in chunks:  # hits are always available, even if the lookup missed them
+        rows.setdefault((c.source_file, c.chunk_index), {
+            "source_file": c.source_file, "chunk_index": c.chunk_index, "text": c.text,
+            "char_start": c.char_start, "char_end": c.char_end,
+        })
+
+    wanted: Dict[str, Set[int]] = {}
+    for c in chunks:
+        indices = wanted.setdefault(c.source_file, set())
+        for i in range(max(0, c.chunk_index - n), c.chunk_index + n + 1):
+            if (c.source_file, i) in rows:
+                indices.add(i)
+
+    passages: List[Tuple[int, RetrievedChunk]] = []
+    for src, indices in wanted.items():
+        ordered = sorted(indices)
+        runs: List[List[int]] = [[ordered[0]]]
+        for i in ordered[1:]:
+            if i == runs[-1][-1] + 1:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+
+        for run in runs:
+            members = [(rank, c) for rank, c in enumerate(chunks)
+                       if c.source_file == src and run[0] <= c.chunk_index <= run[-1]]
+            if not members:  # neighbours cut off from their hit by a missing row
+                continue
+            rank, best = members[0]
+            run_rows = [rows[(src, i)] for i in run]
+            passages.append((rank, RetrievedChunk(
+                source_file=src,
+                chunk_index=run[0],
+                text=stitch(run_rows),
+                score=best.score,
+                char_start=run_rows[0].get("char_start"),
+                char_end=run_rows[-1].get("char_end"),
+                end_chunk_index=run[-1],
+            )))
+
+    passages.sort(key=lambda p: p[0])
+    return [p for _, p in passages]
+
+
+def expand_neighbors(chunks: Sequence[RetrievedChunk], n: int = 1) -> List[RetrievedChunk]:
+    """Replace hits by contiguous passages including chunk_index ± n (one batched lookup)."""
+    if n <= 0 or not chunks:
+        return list(chunks)
+    return merge_passages(chunks, fetch_chunks(neighbor_ranges(chunks, n)), n)
@@ -0,0 +1,186 @@
+"""
+Opt-in per-request profiling for the API.
+
+Enable with PROFILE_SAMPLE_RATE (share of requests) and/or PROFILE_HEADER
+(profile requests sent with "X-Profile: 1"). Profiles are written to
+settings.profile_dir, one file per request, named in the X-Profile-File
+response header:
+
+  - speedscope (default): a sampling profiler reads every thread's stack each
+    profile_interval_ms, so time spent in asyncio.to_thread workers (embedding,
+    search) shows up too. Open the .speedscope.json at https://www.speedscope.app
+  - pstats: cProfile of the event-loop thread, for `python -m pstats <file>`
+
+With both switches off the middleware is not installed, so requests pay nothing.
+Only one request is profiled at a time; others run normally meanwhile, but
+their work can appear in the profile since the process is shared.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+from backend.config import settings
+
+
+Frame = Tuple[str, str, int]  # (function, file, line)
+
+_active = threading.Lock()
+
+
+def _is_idle(stack: List[Frame]) -> bool:
+    """A pool worker blocked waiting for work (not useful in a profile)."""
+    leaf_file = stack[-1][1]
+    return leaf_file.endswith(("threading.py", "queue.py")) and any(
+        fn == "_worker" and file.endswith("thread.py") for fn, file, _ in stack
+    )
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads from a background thread."""
+
+    def __init__(self, interval_s: float = 0.001) -> None:
+        self.interval_s = interval_s
+        self.frames: Dict[Frame, int] = {}
+        self.samples: Dict[int, List[Tuple[List[int], float]]] = {}  # thread id -> [(stack, weight ms)]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _stack(self, frame: Optional[FrameType]) -> List[Frame]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, frame.f_lineno))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval_s):
+            now = time.perf_counter()
+            weight = 1000 * (now - last)
+            last = now
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = self._stack(frame)
+                if not stack or _is_idle(stack):
+                    continue
+                ids = [self.frames.setdefault(f, len(self.frames)) for f in stack]
+                self.samples.setdefault(tid, []).append((ids, weight))
+
+    def to_speedscope(self, name: str) -> Dict:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        profiles = []
+        for tid, samples in sorted(self.samples.items(), key=lambda kv: -len(kv[1])):
+            total = sum(w for _, w in samples)
+            profiles.append({
+                "type": "sampled",
+                "name": names.get(tid, f"thread {tid}"),
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": [s for s, _ in samples],
+                "weights": [w for _, w in samples],
+            })
+        frames = sorted(self.frames, key=self.frames.get)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "knowledge_base.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": fn, "file": file, "line": line} for fn, file, line in frames]},
+            "profiles": profiles,
+        }
+
+
+def should_profile(path: str, headers: Dict[bytes, bytes]) -> bool:
+    if not path.startswith(settings.profile_paths):
+        return False
+    if settings.profile_header and headers.get(b"x-profile") == b"1":
+        return True
+    return settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate
+
+
+def profile_path(method: str, path: str, elapsed_ms: float, suffix: str) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    name = f"{stamp}_{method.lower()}_{slug}_{elapsed_ms:.0f}ms_{random.getrandbits(24):06x}{suffix}"
+    return Path(settings.profile_dir) / name
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling selected requests from the first byte in to the last byte out."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not should_profile(scope["path"], dict(scope["headers"])):
+            return await self.app(scope, receive, send)
+        if not _active.acquire(blocking=False):
+            return await self.app(scope, receive, send)  # another request is being profiled
+
+        sampler = cprofile = None
+        suffix = ".prof" if settings.profile_format == "pstats" else ".speedscope.json"
+        out = {}
+        try:
+            if settings.profile_format == "pstats":
+                cprofile = cProfile.Profile()
+                cprofile.enable()
+            else:
+                sampler = SamplingProfiler(settings.profile_interval_ms / 1000)
+                sampler.start()
+            start = time.perf_counter()
+
+            async def send_with_header(message):
+                if message["type"] == "http.response.start":
+                    # Name the file now; it is written once the response is complete.
+                    elapsed = 1000 * (time.perf_counter() - start)
+                    out["path"] = profile_path(scope["method"], scope["path"], elapsed, suffix)
+                    headers = list(message.get("headers", [])) + [(b"x-profile-file", out["path"].name.encode())]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_header)
+        finally:
+            try:
+                if cprofile is not None:
+                    cprofile.disable()
+                if sampler is not None:
+                    sampler.stop()
+                path = out.get("path") or profile_path(scope["method"], scope["path"], 0, suffix)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                if cprofile is not None:
+                    cprofile.dump_stats(str(path))
+                else:
+                    name = f"{scope['method']} {scope['path']}"
+                    path.write_text(json.dumps(sampler.to_speedscope(name)), encoding="utf-8")
+            finally:
+                _active.release()
+
+
+def install_profiling(app) -> bool:
+    """Add ProfilingMiddleware to `app` if profiling is enabled in settings. Returns whether it was."""
+    if settings.profile_sample_rate <= 0 and not settings.profile_header:
+        return False
+    app.add_middleware(ProfilingMiddleware)
+    return True
@@ -1,13 +1,31 @@
 from __future__ import annotations
 
-from typing import List
+import asyncio
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 from pydantic_ai import Agent
 from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.providers.google_gla import GoogleGLAProvider
 
 from backend.config import settings
-from knowledge_base.retriever import retrieve, format_context, RetrievedChunk
+from backend.routing import Route, choose_route, model_metrics
+from knowledge_base.compression import compress_chunks
+from knowledge_base.deadline import Deadline, DeadlineExceeded
+from knowledge_base.expansion import retrieve_expanded
+from knowledge_base.extractive import extractive_answer
+from knowledge_base.embedders import get_embedder
+from knowledge_base.neighbors import expand_neighbors
+from knowledge_base.rate_limit import estimate_tokens, is_retryable
+from knowledge_base.retriever import (
+    RetrievedChunk,
+    embed_query,
+    format_context,
+    retrieve,
+)
+from knowledge_base.tracing import span
 
 
 SYSTEM_PROMPT = """
@@ -19,38 +37,53 @@ Always cite sources in the format: (source_file, chunk_index).
 """.strip()
 
 
+@lru_cache(maxsize=8)
+def get_model(name: str) -> GeminiModel:
+    """One Gemini model (and connection pool) per model name, shared by all requests."""
+    return GeminiModel(name, provider=GoogleGLAProvider(api_key=settings.gemini_api_key))
+
+
 # ✅ Correct Gemini setup
-model = GeminiModel(
-    settings.chat_model,
-    provider=GoogleGLAProvider(api_key=settings.gemini_api_key),
-)
+model = get_model(settings.chat_model)
 
+# The model is picked per question (backend/routing.py) and passed to agent.run.
 agent = Agent(
     model=model,
     system_prompt=SYSTEM_PROMPT,
 )
 
 
+NO_ANSWER = "I don't know based on the transcripts."
+
+
+@dataclass
+class RagAnswer:
+    answer: str
+    chunks: List[RetrievedChunk] = field(default_factory=list)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    mode: str = "llm"  # "llm", or "extractive" when generation was skipped or ran out of time
+    prompt_tokens: int = 0  # estimated, when the LLM was called
+    route: Optional[Route] = None  # generation model and output cap, when the LLM was called
+
+
 async def answer_question(question: str, k: int = 5) -> str:
-    # 1) Retrieve chunks
-    chunks: List[RetrievedChunk] = retrieve(question, k=k)
+    return (await answer_with_sources(question, k=k)).answer
 
-    # 1.5) Safety gate: if retrieval fails, don't hallucinate
-    if not chunks:
-        return "I don't know based on the transcripts."
 
+def build_prompt(question: str, chunks: List[RetrievedChunk], history: str = "") -> str:
     # 2) Build context
     context = format_context(chunks)
 
     # 3) Sources
     sources_text = "\n".join(
-        f"- ({c.source_file}, chunk {c.chunk_index})"
+        f"- ({c.source_file}, chunk {c.chunk_label})"
         for c in chunks
     )
 
     # 4) Prompt
-    prompt = f"""
-TRANSCRIPT CONTEXT:
+    conversation = f"CONVERSATION SO FAR:\n{history}\n\n" if history else ""
+    return f"""
+{conversation}TRANSCRIPT CONTEXT:
 {context}
 
 USER QUESTION:
@@ -62,6 +95,164 @@ At the end of your answer, include a section called "Sources" and list:
 {sources_text}
 """.strip()
 
-    # 5) Run agent
-    result = await agent.run(prompt)
-    return result.output
+
+async def retrieve_context(
+    query: str, k: int, expand: str, neighbors: int, deadline: Deadline
+) -> Tuple[Optional[List[float]], List[RetrievedChunk], Dict[str, float]]:
+    """Retrieval stages of answer_with_sources: search (optionally expanded), then neighbour passages."""
+    # 1) Retrieve chunks (query embedded once, reused by compression)
+    with span("retrieve", k=k, expand=expand, question_chars=len(query)) as s:
+        if expand != "off":
+            expanded = await deadline.run(
+                retrieve_expanded(
+                    query, k=k, method=expand, n=settings.query_expansion_variants, deadline=deadline.expires_at
+                ),
+                "retrieval",
+            )
+            qvec, chunks = expanded.qvec, expanded.chunks
+            timings = dict(expanded.timings_ms)
+            s.set(variants=len(expanded.variants), variant_source=expanded.variant_source)
+        else:
+            start = time.perf_counter()
+            qvec = await deadline.run(
+                asyncio.to_thread(embed_query, query, deadline.expires_at), "embedding"
+            )
+            chunks = await deadline.run(asyncio.to_thread(retrieve, query, k, qvec), "search")
+            timings = {"retrieve_ms": round(1000 * (time.perf_counter() - start), 2)}
+        s.set(chunks=len(chunks))
+
+    if not chunks:
+        return qvec, chunks, timings
+
+    if neighbors > 0:
+        start = time.perf_counter()
+        with span("neighbors", n=neighbors, hits=len(chunks)) as s:
+            try:
+                chunks = await deadline.run(asyncio.to_thread(expand_neighbors, chunks, neighbors), "neighbors")
+            except DeadlineExceeded:
+                s.set(skipped="deadline")  # keep the plain hits
+            s.set(passages=len(chunks))
+        timings["neighbors_ms"] = round(1000 * (time.perf_counter() - start), 2)
+    return qvec, chunks, timings
+
+
+async def answer_with_sources(
+    question: str,
+    k: int = 5,
+    compress: bool | None = None,
+    expand: Optional[str] = None,
+    neighbors: Optional[int] = None,
+    deadline: Optional[Deadline] = None,
+    fast: bool = False,
+    history: str = "",
+    chunks: Optional[List[RetrievedChunk]] = None,
+    search_query: Optional[str] = None,
+) -> RagAnswer:
+    """
+    Like answer_question, but also returns the chunks the answer was built from.
+    `compress` (default: settings.compress_context) shrinks the context to the
+    sentences most similar to the question before generation.
+    `expand` (default: settings.query_expansion) is "off", "rules" or "llm":
+    multi-query retrieval with rank fusion (see knowledge_base/expansion.py).
+    `neighbors` (default: settings.neighbor_window) adds chunk_index ± n around
+    every hit, merged into contiguous passages.
+
+    For chat turns (knowledge_base/sessions.py), `history` is a summary of the
+    conversation placed before the context, `chunks` reuses an earlier turn's
+    context instead of retrieving, and `search_query` (default: `question`)
+    is what is searched for.
+
+    Every stage runs within `deadline` (default: settings.request_deadline_s
+    from now). Retrieval past the deadline raises DeadlineExceeded; optional
+    stages are skipped; if generation cannot finish in time (or `fast` is set)
+    an extractive answer built from the top retrieved sentences is returned.
+    """
+    if compress is None:
+        compress = settings.compress_context
+    if expand is None:
+        expand = settings.query_expansion
+    if neighbors is None:
+        neighbors = settings.neighbor_window
+    if deadline is None:
+        deadline = Deadline.after(settings.request_deadline_s)
+
+    if chunks is not None:
+        # Context carried over from an earlier chat turn (knowledge_base/sessions.py): no retrieval
+        qvec, timings = None, {}
+    else:
+        qvec, chunks, timings = await retrieve_context(search_query or question, k, expand, neighbors, deadline)
+        # 1.5) Safety gate: if retrieval fails, don't hallucinate
+        if not chunks:
+            return RagAnswer(NO_ANSWER, timings_ms=timings)
+
+    if fast or deadline.remaining() < settings.generation_min_s:
+        return extractive_result(question, chunks, timings)
+
+    context_chunks = chunks
+    if compress:
+        start = time.perf_counter()
+        with span("compress", chars_in=sum(len(c.text) for c in chunks)) as s:
+            try:
+                if qvec is None:  # reused context: the question itself was never embedded
+                    qvec = await deadline.run(
+                        asyncio.to_thread(embed_query, question, deadline.expires_at), "embedding"
+                    )
+                context_chunks = await deadline.run(
+                    asyncio.to_thread(
+                        compress_chunks,
+                        chunks,
+                        qvec,
+                        lambda texts: get_embedder().embed(texts, deadline=deadline.expires_at),
+                        settings.compress_max_chars,
+                        settings.compress_min_sentence_chars,
+                    ),
+                    "compression",
+                )
+            except DeadlineExceeded:
+                s.set(skipped="deadline")  # generate from the uncompressed context
+            s.set(chars_out=sum(len(c.text) for c in context_chunks))
+        timings["compress_ms"] = round(1000 * (time.perf_counter() - start), 2)
+
+    with span("context.build", chunks=len(context_chunks)) as s:
+        prompt = build_prompt(question, context_chunks, history)
+        s.set(prompt_chars=len(prompt))
+
+    # 5) Route: model and output cap by question type, context size and time left
+    route = choose_route(question, sum(len(c.text) for c in context_chunks) + len(history), deadline.remaining())
+    if route.hint:
+        prompt = f"{prompt}\n{route.hint}"
+
+    # 6) Run agent
+    start = time.perf_counter()
+    try:
+        with span("llm.generate", model=route.model, tier=route.tier, route=route.reason,
+                  prompt_chars=len(prompt), budget_s=round(deadline.remaining(), 3)) as s:
+            result = await deadline.run(
+                agent.run(prompt, model=get_model(route.model), model_settings={"max_tokens": route.max_tokens}),
+                "generation",
+            )
+            usage = result.usage()
+            s.set(output_chars=len(result.output), input_tokens=usage.input_tokens,
+                  output_tokens=usage.output_tokens)
+    except Exception as e:
+        # A timeout still tells how slow the model is (at least the budget); a quota error does not.
+        model_metrics.record(route, time.perf_counter() - start if isinstance(e, DeadlineExceeded) else None,
+                             ok=False)
+        # Out of time or out of quota: degrade to an extractive answer instead of failing.
+        if not (isinstance(e, DeadlineExceeded) or is_retryable(e)):
+            raise
+        timings["generate_ms"] = round(1000 * (time.perf_counter() - start), 2)
+        return extractive_result(question, chunks, timings)
+    elapsed = time.perf_counter() - start
+    model_metrics.record(route, elapsed, usage.input_tokens, usage.output_tokens)
+    timings["generate_ms"] = round(1000 * elapsed, 2)
+    return RagAnswer(result.output, chunks, timings, route=route, prompt_tokens=estimate_tokens([prompt]))
+
+
+def extractive_result(question: str, chunks: List[RetrievedChunk], timings: Dict[str, float]) -> RagAnswer:
+    start = time.perf_counter()
+    with span("extractive", chunks=len(chunks)) as s:
+        answer = extractive_answer(question, chunks, settings.extractive_sentences)
+        s.set(answer_chars=len(answer))
+    timings["extractive_ms"] = round(1000 * (time.perf_counter() - start), 2)
+    return RagAnswer(answer, chunks, timings, mode="extractive")
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import os
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, List, Optional, Sequence, TypeVar
+
+import httpx
+import requests
+
+
+T = TypeVar("T")
+
+# Status codes worth retrying: quota (429) and transient server errors.
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Status codes whose Retry-After (or Gemini RetryInfo) says when to come back.
+RETRY_AFTER_STATUS = {429, 503}
+# Network failures without a status: connect/read timeouts, resets, protocol errors.
+# google-genai raises httpx errors, the frontend and OTLP exporter requests errors.
+TRANSIENT_ERRORS = (
+    TimeoutError,
+    ConnectionError,
+    httpx.TransportError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
+class TokenBucket:
+    """Continuously refilling bucket: `capacity` units per `period` seconds."""
+
+    def __init__(self, capacity: float, period: float = 60.0) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be > 0")
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` units and return how long the caller must wait first."""
+        self._refill(now)
+        # A single request larger than the bucket may never fit; let it through
+        # once the bucket is full instead of blocking forever.
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Client-side limiter for requests/min and tokens/min quotas.
+
+    Both buckets are reserved under one lock, so concurrent callers
+    (threads in ingestion, requests in the API) share the same quota.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request of `tokens` tokens fits the quota. Returns seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None and tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+def estimate_tokens(texts: Sequence[str]) -> int:
+    """Rough token count (~4 characters per token) used for the tokens/min bucket."""
+    return sum(len(t) // 4 + 1 for t in texts)
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    """Best-effort HTTP status from google-genai, httpx, requests or urllib errors."""
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, TRANSIENT_ERRORS):
+        return True
+    return status_code_of(exc) in RETRYABLE_STATUS
+
+
+def _parse_retry_after(value: Any) -> Optional[float]:
+    """Seconds from a Retry-After header: delta-seconds or an HTTP date."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_s(exc: BaseException) -> Optional[float]:
+    """
+    Server-requested wait for a 429/503: the Retry-After header (httpx,
+    requests, urllib errors) or the RetryInfo detail of a Gemini error body.
+    """
+    if status_code_of(exc) not in RETRY_AFTER_STATUS:
+        return None
+    headers = getattr(getattr(exc, "response", None), "headers", None) or getattr(exc, "headers", None)
+    if headers is not None:
+        delay = _parse_retry_after(headers.get("Retry-After"))
+        if delay is not None:
+            return delay
+    details = getattr(exc, "details", None)  # google-genai APIError: the JSON error body
+    error = details.get("error", details) if isinstance(details, dict) else {}
+    for detail in error.get("details", []) if isinstance(error, dict) else []:
+        m = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", ""))) if isinstance(detail, dict) else None
+        if m:
+            return float(m.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    *,
+    limiter: Optional[RateLimiter] = None,
+    tokens: int = 0,
+    max_retries: int = 6,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    sleep: Callable[[float], None] = time.sleep,
+    deadline: Optional[float] = None,
+) -> T:
+    """
+    Call `fn` under `limiter`, retrying quota/transient errors with jittered backoff
+    (at least as long as a 429/503's Retry-After asks). Non-retryable errors
+    (bad request, auth) are raised immediately, and so is the last error when
+    the next backoff would pass `deadline` (time.monotonic()).
+    """
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire(tokens)
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = max(backoff_delay(attempt, base_delay, max_delay), retry_after_s(e) or 0.0)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            sleep(delay)
+            attempt += 1
+
+
+_embed_limiter: Optional[RateLimiter] = None
+_embed_limiter_lock = threading.Lock()
+
+
+def _reset_limiter_after_fork() -> None:
+    global _embed_limiter, _embed_limiter_lock
+    _embed_limiter = None  # each worker process gets its own buckets
+    _embed_limiter_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_limiter_after_fork)
+
+
+def embed_limiter() -> RateLimiter:
+    """Process-wide limiter shared by ingestion and retrieval embedding calls."""
+    global _embed_limiter
+    if _embed_limiter is None:
+        with _embed_limiter_lock:
+            if _embed_limiter is None:
+                from backend.config import settings
+
+                _embed_limiter = RateLimiter(
+                    requests_per_minute=settings.embed_requests_per_minute,
+                    tokens_per_minute=settings.embed_tokens_per_minute,
+                )
+    return _embed_limiter
+
+
+def embed_with_retry(client, texts: Sequence[str], deadline: Optional[float] = None) -> List[List[float]]:
+    """
+    Rate-limited, retried `embed_content` call returning one vector per text.
+    With a `deadline` (time.monotonic()), each HTTP attempt is capped by the
+    remaining time and no retry is started that could not finish before it.
+    """
+    from backend.config import settings
+    from google.genai import types
+
+    from knowledge_base.tracing import span
+
+    attempts = 0
+
+    def call():
+        nonlocal attempts
+        attempts += 1
+        config = None
+        if deadline is not None:
+            remaining_ms = max(1, int(1000 * (deadline - time.monotonic())))
+            config = types.EmbedContentConfig(http_options=types.HttpOptions(timeout=remaining_ms))
+        return client.models.embed_content(model=settings.embed_model, contents=list(texts), config=config)
+
+    tokens = estimate_tokens(texts)
+    with span("embed", texts=len(texts), est_tokens=tokens, model=settings.embed_model) as s:
+        try:
+            res = call_with_retry(
+                call,
+                limiter=embed_limiter(),
+                tokens=tokens,
+                max_retries=settings.embed_max_retries,
+                deadline=deadline,
+            )
+        finally:
+            s.set(attempts=attempts)
+    return [e.values for e in res.embeddings]
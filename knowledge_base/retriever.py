@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from datetime import timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 import lancedb
-from google import genai
 
 from backend.config import settings
+from knowledge_base.bundle import load_bundle
+from knowledge_base.embedders import check_compatible, get_embedder
+from knowledge_base.memory import MB, register_cache
+from knowledge_base.shards import open_table
+from knowledge_base.tables import active_table_name
+from knowledge_base.tracing import span
 
 
 @dataclass
@@ -15,32 +23,88 @@ class RetrievedChunk:
     chunk_index: int
     text: str
     score: float | None = None
+    char_start: int | None = None
+    char_end: int | None = None
+    # Set when neighbouring chunks were merged in: the passage spans chunk_index..end_chunk_index
+    end_chunk_index: int | None = None
+
+    @property
+    def chunk_label(self) -> str:
+        if self.end_chunk_index is None or self.end_chunk_index == self.chunk_index:
+            return str(self.chunk_index)
+        return f"{self.chunk_index}-{self.end_chunk_index}"
 
 
 VECTOR_COLUMN = "embedding"
 
 
-def embed_query(client: genai.Client, query: str) -> List[float]:
-    res = client.models.embed_content(
-        model=settings.embed_model,
-        contents=[query],
-    )
-    return res.embeddings[0].values
+def embed_query(query: str, deadline: Optional[float] = None) -> List[float]:
+    return get_embedder().embed([query], deadline=deadline)[0]
 
 
-def retrieve(query: str, k: int = 5) -> List[RetrievedChunk]:
-    """
-    Retrieve top-k chunks from LanceDB for a given query.
-    Applies:
-      - optional collection filter (if 'collection' column exists)
-      - drops 'schema' rows
-      - basic distance gate to reduce irrelevant matches
-    """
-    db = lancedb.connect(str(settings.lancedb_dir))
-    table = db.open_table(settings.lancedb_table)
+@lru_cache(maxsize=1)
+def lance_session() -> lancedb.Session:
+    """Index and metadata caches shared by every table the API opens, capped by settings.lance_cache_mb."""
+    size = int(settings.lance_cache_mb * MB)
+    return lancedb.Session(index_cache_size_bytes=size, metadata_cache_size_bytes=size // 4)
+
+
+@lru_cache(maxsize=4)
+def get_table(name: str):
+    # Cached per table version, so a published rebuild is picked up by name; rows appended
+    # by another process (POST /ingest) are seen within settings.lance_read_consistency_s.
+    db = lancedb.connect(str(settings.lancedb_dir), session=lance_session(),
+                         read_consistency_interval=timedelta(seconds=settings.lance_read_consistency_s))
+    return open_table(db, name)
+
+
+def release_tables() -> int:
+    """Close cached tables and drop LanceDB's caches; tables reopen lazily."""
+    freed = lance_session().size_bytes if lance_session.cache_info().currsize else 0
+    get_table.cache_clear()
+    lance_session.cache_clear()
+    return freed
+
+
+def lance_cache_stats() -> Dict[str, Any]:
+    if not lance_session.cache_info().currsize:
+        return {"entries": 0, "bytes": 0, "tables": 0}
+    session = lance_session()
+    return {"entries": session.approx_num_items, "bytes": session.size_bytes,
+            "max_bytes": int(settings.lance_cache_mb * MB * 1.25), "tables": get_table.cache_info().currsize}
+
+
+register_cache("lancedb", lance_cache_stats, release_tables)
+
+# LanceDB's runtime must not be shared with a forked parent (knowledge_base/serve.py); reopen lazily.
+os.register_at_fork(after_in_child=get_table.cache_clear)
+os.register_at_fork(after_in_child=lance_session.cache_clear)
+
 
-    client = genai.Client(api_key=settings.gemini_api_key)
-    qvec = embed_query(client, query)
+def table_embedder(table) -> Tuple[Optional[str], int]:
+    """(embed_model, dim) a table was built with; the model is None for tables predating the metadata."""
+    model = (table.schema.metadata or {}).get(b"embed_model")
+    return (model.decode() if model else None), table.schema.field(VECTOR_COLUMN).type.list_size
+
+
+@lru_cache(maxsize=4)
+def _table_embedder(name: str) -> Tuple[Optional[str], int]:
+    return table_embedder(get_table(name))
+
+
+def check_table(name: str) -> None:
+    """Raise EmbedderMismatch if table `name` was built with another embedder than the configured one."""
+    model, dim = _table_embedder(name)
+    check_compatible(model, dim, f"table {name}")
+
+
+def check_bundle(bundle) -> None:
+    """Raise EmbedderMismatch if `bundle` was built with another embedder than the configured one."""
+    check_compatible(bundle.header.get("embed_model"), bundle.header["dim"], f"bundle {bundle.version}")
+
+
+def search_table(qvec: List[float], k: int) -> List[Dict[str, Any]]:
+    table = get_table(active_table_name())
 
     # --- LanceDB search ---
     # NOTE: Some editors show yellow warnings here because LanceDB typing is incomplete.
@@ -48,42 +112,86 @@ def retrieve(query: str, k: int = 5) -> List[RetrievedChunk]:
 
     # If your table has a 'collection' column (after re-ingest), keep only transcripts.
     # If not, this will raise at runtime; comment it out until you re-ingest with collection.
-    
     search = search.where("collection = 'transcripts'")
 
-    results: List[Dict[str, Any]] = search.limit(k).to_list()
-
-    chunks: List[RetrievedChunk] = []
-    for r in results:
-        src = (r.get("source_file") or "").strip()
+    return search.limit(k).to_list()
 
-        # 1) Drop schema (highly generic / dominates retrieval)
-        if src.lower() == "schema":
-            continue
 
-        dist = r.get("_distance")
-        score = dist if dist is not None else r.get("_score")
-
-        # 2) Basic distance gate (tune later using logs)
-        # With your logs, 1.05 is a reasonable first safety cutoff.
-        if dist is not None and dist >= 1.05:
-            continue
-
-        chunks.append(
-            RetrievedChunk(
-                source_file=src or "unknown",
-                chunk_index=int(r.get("chunk_index", -1)),
-                text=r.get("text", "") or "",
-                score=score,
+def retrieve(query: str, k: int = 5, qvec: Optional[List[float]] = None) -> List[RetrievedChunk]:
+    """
+    Retrieve top-k chunks from the active bundle (if any) or LanceDB.
+    Applies:
+      - optional collection filter (if 'collection' column exists)
+      - drops 'schema' rows
+      - basic distance gate to reduce irrelevant matches
+    Pass `qvec` to reuse an already computed query embedding.
+    """
+    if qvec is None:
+        qvec = embed_query(query)
+
+    return filter_results(search_rows(qvec, k))
+
+
+def search_rows(qvec: List[float], k: int) -> List[Dict[str, Any]]:
+    """Raw top-k rows for one query vector, from the bundle if active else LanceDB."""
+    bundle = load_bundle()
+    if bundle is not None:
+        # Prebuilt read-only bundle (see knowledge_base/bundle.py): exact search
+        # over memory-mapped vectors, same result shape as LanceDB.
+        check_bundle(bundle)
+        with span("search", backend="bundle", k=k, rows_scanned=len(bundle)) as s:
+            rows = bundle.to_rows(bundle.search(qvec, k=k, collection="transcripts"))
+            s.set(rows_returned=len(rows))
+        return rows
+    check_table(active_table_name())
+    with span("search", backend="lancedb", k=k) as s:
+        rows = search_table(qvec, k)
+        if s.recording:
+            table = get_table(active_table_name())
+            s.set(rows_returned=len(rows), table_rows=table.count_rows(), shards=len(getattr(table, "shards", [1])))
+    return rows
+
+
+def filter_results(results: List[Dict[str, Any]]) -> List[RetrievedChunk]:
+    gate = get_embedder().distance_gate
+    with span("filter", rows_in=len(results), gate=gate) as s:
+        chunks: List[RetrievedChunk] = []
+        dropped_schema = dropped_gate = 0
+        for r in results:
+            src = (r.get("source_file") or "").strip()
+
+            # 1) Drop schema (highly generic / dominates retrieval)
+            if src.lower() == "schema":
+                dropped_schema += 1
+                continue
+
+            dist = r.get("_distance")
+            score = dist if dist is not None else r.get("_score")
+
+            # 2) Basic distance gate (tune later using logs)
+            # With your logs, 1.05 is a reasonable first safety cutoff for Gemini embeddings.
+            if dist is not None and dist >= gate:
+                dropped_gate += 1
+                continue
+
+            chunks.append(
+                RetrievedChunk(
+                    source_file=src or "unknown",
+                    chunk_index=int(r.get("chunk_index", -1)),
+                    text=r.get("text", "") or "",
+                    score=score,
+                    char_start=r.get("char_start"),
+                    char_end=r.get("char_end"),
+                )
             )
-        )
 
+        s.set(dropped_schema=dropped_schema, dropped_gate=dropped_gate, kept=len(chunks))
     return chunks
 
 
 def format_context(chunks: List[RetrievedChunk]) -> str:
     blocks: List[str] = []
     for c in chunks:
-        header = f"[SOURCE: {c.source_file} | chunk={c.chunk_index}]"
+        header = f"[SOURCE: {c.source_file} | chunk={c.chunk_label}]"
         blocks.append(header + "\n" + c.text.strip())
     return "\n\n---\n\n".join(blocks)
@@ -0,0 +1,150 @@
+"""
+Standalone multi-worker server (outside Azure Functions).
+
+    uv run python -m knowledge_base.serve --workers 4 --port 8000
+
+Pre-fork model: the master binds the listening socket, imports the app and
+maps the active index bundle read-only, touching every page, then forks the
+workers. The bundle's pages live in the page cache and are shared by all
+workers, so N workers cost roughly one copy of the index plus N interpreters
+(compare RSS and PSS with benchmarks/bench_workers.py).
+
+The master opens no network clients: the Gemini client, LanceDB connection
+and embedding rate limiter are created lazily in each worker (their module
+singletons are reset by os.register_at_fork hooks; the answer store opens
+its sqlite connection per call). Since the
+embedding rate limiter is per process, each worker gets 1/N of
+embed_requests_per_minute and embed_tokens_per_minute.
+
+Without a bundle (USE_BUNDLE off or nothing activated) each worker opens the
+LanceDB table itself and nothing is shared beyond the imported code.
+POST /ingest is disabled with more than one worker: each worker would run
+its own job queue, so several processes would write the live table at once.
+Add transcripts with a single-worker server or ingestion.py instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+import warnings
+from typing import Dict, Optional
+
+import numpy as np
+
+from backend.config import settings
+from knowledge_base.bundle import load_bundle
+
+
+log = logging.getLogger(__name__)
+
+
+def preload() -> Optional[str]:
+    """Map the active bundle and fault in its pages. Returns a description, or None without a bundle."""
+    bundle = load_bundle()
+    if bundle is None:
+        return None
+    float(np.asarray(bundle.vectors).sum())
+    float(np.asarray(bundle.norms).sum())
+    return f"bundle {bundle.version} ({len(bundle)} rows)"
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, workers: int, log_level: str) -> None:
+    """Body of a forked worker: split the embedding quota, then serve on the shared socket."""
+    import uvicorn
+
+    settings.embed_requests_per_minute = settings.embed_requests_per_minute / workers
+    settings.embed_tokens_per_minute = settings.embed_tokens_per_minute / workers
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    uvicorn.Server(uvicorn.Config(app, log_level=log_level)).run(sockets=[sock])
+
+
+def _spawn(app, sock: socket.socket, workers: int, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, workers, log_level)
+        except BaseException:
+            log.exception("worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(app, host: str = "127.0.0.1", port: int = 8000, workers: int = 1, log_level: str = "warning") -> None:
+    """Preload, fork `workers` uvicorn workers on one socket, and restart any that die until SIGTERM/SIGINT."""
+    sock = bind_socket(host, port)
+    loaded = preload()
+    if workers > 1 and settings.ingest_api_enabled:
+        settings.ingest_api_enabled = False  # inherited by the forked workers
+        print("POST /ingest disabled: it needs a single worker")
+    # lancedb is imported here but never connected: its runtime has no state to corrupt.
+    warnings.filterwarnings("ignore", message="lancedb fork support", category=RuntimeWarning)
+    print(f"Preloaded {loaded}" if loaded else "No active bundle; workers open the LanceDB table themselves")
+
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        children[_spawn(app, sock, workers, log_level)] = time.monotonic()
+    print(f"Serving on http://{host}:{port} with {workers} worker(s), master pid {os.getpid()}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        log.warning("worker %d exited with status %d; restarting", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started < 1:
+            time.sleep(1)  # don't spin on a worker that dies at startup
+        children[_spawn(app, sock, workers, log_level)] = time.monotonic()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the RAG API with pre-forked uvicorn workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    from knowledge_base.api import app
+
+    serve(app, args.host, args.port, args.workers, args.log_level)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
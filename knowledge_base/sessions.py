@@ -0,0 +1,290 @@
+"""
+Multi-turn chat sessions (POST /chat).
+
+A session keeps, in the memory of one worker process:
+
+  - the last settings.chat_history_turns turns verbatim (answers clipped to
+    settings.chat_answer_chars)
+  - a summary of older turns, one line each (question + first sentence of the
+    answer), capped at settings.chat_summary_chars by dropping the oldest lines
+  - the context chunks of its last retrieval and their vocabulary
+
+so the conversation part of the prompt stays bounded however long the chat runs.
+
+A follow-up that stays on the topic ("and how do I deploy that?") reuses the
+previous turn's chunks instead of retrieving again: it has to refer back (a
+pronoun, an "and/also/what about" opener, or no content words of its own) and
+at least settings.chat_reuse_min_coverage of its content words must already
+occur in the previous context. Other follow-ups that refer back are searched
+together with the previous question, so "it" still finds the right passages.
+
+The store holds at most settings.chat_max_sessions sessions and about
+settings.chat_sessions_mb of them, evicting the least recently used, and drops
+sessions idle for settings.chat_session_ttl_s.
+With several workers (knowledge_base/serve.py) a session only lives in the
+worker that created it; a turn that lands elsewhere starts a new session.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from backend.config import settings
+from knowledge_base.deadline import Deadline
+from knowledge_base.expansion import STOPWORDS
+from knowledge_base.memory import MB, register_cache
+from knowledge_base.rag_agent import RagAnswer, answer_with_sources
+from knowledge_base.retriever import RetrievedChunk
+from knowledge_base.tracing import span
+
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_SOURCES = re.compile(r"\n\s*[#*]*\s*Sources\b.*", re.IGNORECASE | re.DOTALL)
+REFERS_BACK = {"it", "its", "this", "that", "these", "those", "they", "them", "their", "there", "one"}
+FOLLOW_UP_START = re.compile(r"^\s*(and|also|so|then|but|what about|how about)\b", re.IGNORECASE)
+
+
+def content_terms(text: str) -> Set[str]:
+    """Lower-cased content words cut to 6 letters, so "deploy" matches "deployment"."""
+    words = _WORD.findall(text.lower())
+    return {w[:6] for w in words if len(w) > 1 and w not in STOPWORDS and w not in REFERS_BACK}
+
+
+def refers_back(question: str) -> bool:
+    words = set(_WORD.findall(question.lower()))
+    return bool(words & REFERS_BACK) or bool(FOLLOW_UP_START.match(question)) or not content_terms(question)
+
+
+def clip(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 3].rstrip() + "..."
+
+
+def summarize_turn(question: str, answer: str) -> str:
+    """One line per turn: the question and the first sentence of the answer (without its Sources list)."""
+    first = _SENTENCE_END.split(_SOURCES.sub("", answer).strip(), maxsplit=1)[0]
+    return f"- Q: {clip(question, 150)} A: {clip(first, 200)}"
+
+
+@dataclass
+class ChatTurn:
+    question: str
+    answer: str
+    reused_context: bool
+    prompt_tokens: int
+
+
+@dataclass
+class ChatSession:
+    id: str
+    last_used: float
+    turns: List[ChatTurn] = field(default_factory=list)  # most recent, verbatim
+    summary: List[str] = field(default_factory=list)  # one line per older turn
+    chunks: List[RetrievedChunk] = field(default_factory=list)  # context of the last retrieval
+    topic_terms: Set[str] = field(default_factory=set)
+    turn_count: int = 0
+    nbytes: int = 0  # estimate, updated after every turn
+
+    def size_bytes(self) -> int:
+        texts = [t.question for t in self.turns] + [t.answer for t in self.turns] + self.summary
+        texts += [c.text for c in self.chunks]
+        # ~50 bytes of str header per text plus the objects holding them
+        return sum(len(t) + 50 for t in texts) + 60 * len(self.topic_terms) + 200 * len(self.chunks) + 1000
+
+    def history(self) -> str:
+        lines: List[str] = []
+        if self.summary:
+            lines += ["Earlier in this conversation:", *self.summary]
+        for turn in self.turns:
+            lines += [f"User: {turn.question}",
+                      f"Assistant: {clip(_SOURCES.sub('', turn.answer), settings.chat_answer_chars)}"]
+        return "\n".join(lines)
+
+    def can_reuse(self, question: str) -> bool:
+        """Whether `question` is a follow-up answerable from the previous context."""
+        if not self.chunks or not refers_back(question):
+            return False
+        terms = content_terms(question)
+        return not terms or len(terms & self.topic_terms) / len(terms) >= settings.chat_reuse_min_coverage
+
+    def search_query(self, question: str) -> str:
+        """What to retrieve for: a follow-up that refers back is searched with the previous question."""
+        if self.turns and refers_back(question):
+            return f"{self.turns[-1].question} {question}"
+        return question
+
+    def add_turn(self, question: str, result: RagAnswer, reused: bool, search_query: str) -> None:
+        if not reused:
+            self.chunks = result.chunks
+            self.topic_terms = content_terms(" ".join([search_query, *(c.text for c in result.chunks)]))
+        self.turns.append(ChatTurn(question, result.answer, reused, result.prompt_tokens))
+        self.turn_count += 1
+        while len(self.turns) > settings.chat_history_turns:
+            old = self.turns.pop(0)
+            self.summary.append(summarize_turn(old.question, old.answer))
+        while self.summary and sum(len(line) + 1 for line in self.summary) > settings.chat_summary_chars:
+            self.summary.pop(0)
+
+
+@dataclass
+class ChatReply:
+    session_id: str
+    new_session: bool
+    turn: int
+    reused_context: bool
+    result: RagAnswer
+
+
+class SessionStore:
+    """Bounded in-memory session store: LRU eviction by count and size plus an idle TTL; thread-safe."""
+
+    def __init__(self, max_sessions: int, ttl_s: float, max_bytes: int = 0, clock=time.monotonic) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes  # 0 = no size limit
+        self.bytes = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()  # least recently used first
+        self._counters: Dict[str, int] = {
+            "sessions_created": 0, "sessions_evicted": 0, "sessions_expired": 0,
+            "turns": 0, "retrievals": 0, "retrievals_avoided": 0,
+        }
+        self._prompt_tokens: Deque[Tuple[int, int]] = deque(maxlen=1000)  # (turn number, tokens)
+
+    def _expire(self, now: float) -> None:
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl_s:
+                break
+            self._pop_oldest("sessions_expired")
+
+    def _pop_oldest(self, counter: str) -> None:
+        _, session = self._sessions.popitem(last=False)
+        self.bytes -= session.nbytes
+        self._counters[counter] += 1
+
+    def _evict(self, max_bytes: int) -> None:
+        """Drop least recently used sessions until within max_sessions and `max_bytes` (never the newest)."""
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or (max_bytes and self.bytes > max_bytes)
+        ):
+            self._pop_oldest("sessions_evicted")
+
+    def get_or_create(self, session_id: Optional[str] = None) -> Tuple[ChatSession, bool]:
+        """The live session `session_id`, or a new one (unknown, evicted or expired id)."""
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session.id)
+                return session, False
+            session = ChatSession(uuid.uuid4().hex, now)
+            self._sessions[session.id] = session
+            self._counters["sessions_created"] += 1
+            self._evict(self.max_bytes)
+            return session, True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self.bytes -= session.nbytes
+            return session is not None
+
+    def release(self) -> int:
+        """Under memory pressure: evict least recently used sessions down to half the current size."""
+        with self._lock:
+            before = self.bytes
+            self._evict(before // 2 or 1)
+            return before - self.bytes
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._sessions), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "evictions": self._counters["sessions_evicted"]}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def record_turn(self, session: ChatSession, reused: bool, prompt_tokens: int) -> None:
+        with self._lock:
+            if session.id in self._sessions:  # not evicted while the turn ran
+                size = session.size_bytes()
+                self.bytes += size - session.nbytes
+                session.nbytes = size
+                self._evict(self.max_bytes)
+            self._counters["turns"] += 1
+            self._counters["retrievals_avoided" if reused else "retrievals"] += 1
+            if prompt_tokens:
+                self._prompt_tokens.append((session.turn_count, prompt_tokens))
+
+    def metrics(self) -> Dict[str, object]:
+        with self._lock:
+            by_turn: Dict[int, List[int]] = {}
+            for turn, tokens in self._prompt_tokens:
+                by_turn.setdefault(min(turn, 10), []).append(tokens)
+            tokens = [t for _, t in self._prompt_tokens]
+            return {
+                **self._counters,
+                "sessions": len(self._sessions),
+                "sessions_mb": round(self.bytes / MB, 2),
+                "prompt_tokens_mean": round(sum(tokens) / len(tokens), 1) if tokens else None,
+                "prompt_tokens_max": max(tokens) if tokens else None,
+                # Should level off after chat_history_turns instead of growing with the conversation
+                "prompt_tokens_by_turn": {
+                    (str(turn) if turn < 10 else "10+"): round(sum(v) / len(v), 1)
+                    for turn, v in sorted(by_turn.items())
+                },
+            }
+
+
+_store: Optional[SessionStore] = None
+
+
+def session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        _store = SessionStore(settings.chat_max_sessions, settings.chat_session_ttl_s,
+                              int(settings.chat_sessions_mb * MB))
+        register_cache("chat_sessions", _store.stats, _store.release)
+    return _store
+
+
+async def chat(
+    message: str,
+    session_id: Optional[str] = None,
+    k: int = 5,
+    deadline: Optional[Deadline] = None,
+    fast: bool = False,
+    store: Optional[SessionStore] = None,
+) -> ChatReply:
+    """Answer one chat turn in the context of session `session_id` (a new session if it is unknown)."""
+    if store is None:
+        store = session_store()
+    session, new = store.get_or_create(session_id)
+    reused = session.can_reuse(message)
+    query = session.search_query(message)
+    with span("chat.turn", turn=session.turn_count + 1, reused_context=reused) as s:
+        result = await answer_with_sources(
+            message,
+            k=k,
+            deadline=deadline,
+            fast=fast,
+            history=session.history(),
+            chunks=session.chunks if reused else None,
+            search_query=query,
+        )
+        s.set(prompt_tokens=result.prompt_tokens)
+    session.add_turn(message, result, reused, query)
+    store.record_turn(session, reused, result.prompt_tokens)
+    return ChatReply(session.id, new, session.turn_count, reused, result)
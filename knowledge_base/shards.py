@@ -0,0 +1,212 @@
+"""
+Sharded table layout and scatter-gather search.
+
+With settings.shard_by set, an ingestion run writes its table version as
+several LanceDB tables <version>__<shard> instead of one:
+
+  - "collection": one shard per collection; a `collection = '...'` filter
+    (as used by retrieval) only touches that collection's shard
+  - "hash":       settings.shard_count shards by crc32(source_file), so all
+    chunks of a file, and therefore its neighbours, live in one shard
+
+ShardedTable behaves like a LanceDB table for the rest of the code (add,
+delete, search, count_rows, to_arrow, schema); replace_rows works on both. A vector search goes to all
+shards concurrently; each returns its own top-k sorted by distance and the
+lists are merged with a heap into the global top-k. Filters are pushed down
+to every shard, while the distance gate and schema-row filtering run on the
+merged list (retriever.filter_results), so results match a single table.
+
+The layout is recorded in the shards' schema metadata, so appends keep
+routing the same way even if the settings change later. Shards created after
+a process opened the table (a new collection via POST /ingest) are seen by
+other processes once they reopen it.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pyarrow as pa
+
+from backend.config import settings
+from knowledge_base.tables import SHARD_SEP, table_names
+
+
+_COLLECTION_FILTER = re.compile(r"\s*collection\s*=\s*'([^']*)'\s*")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.shard_search_threads, thread_name_prefix="shard")
+    return _executor
+
+
+def _reset_pool_after_fork() -> None:
+    global _executor
+    _executor = None  # the parent's threads do not exist in the child
+
+
+os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def shard_key(row: Dict[str, Any], shard_by: str, count: int) -> str:
+    if shard_by == "collection":
+        return re.sub(r"[^a-z0-9-]+", "-", str(row.get("collection") or "none").lower()).strip("-") or "none"
+    return f"s{zlib.crc32(str(row['source_file']).encode('utf-8')) % count:02d}"
+
+
+def shard_metadata(shard_by: str, count: int) -> Dict[str, str]:
+    return {"shard_by": shard_by, "shard_count": str(count)}
+
+
+class ShardedQuery:
+    """Mirrors LanceDB's query builder (where/select/limit/to_list) over all shards."""
+
+    def __init__(self, table: "ShardedTable", qvec: Optional[Sequence[float]]) -> None:
+        self._table = table
+        self._qvec = qvec
+        self._where: Optional[str] = None
+        self._columns: Optional[List[str]] = None
+        self._limit: Optional[int] = 10  # LanceDB's default
+
+    def where(self, expr: str) -> "ShardedQuery":
+        self._where = expr
+        return self
+
+    def select(self, columns: List[str]) -> "ShardedQuery":
+        self._columns = columns
+        return self
+
+    def limit(self, n: Optional[int]) -> "ShardedQuery":
+        self._limit = n
+        return self
+
+    def _run(self, shard) -> List[Dict[str, Any]]:
+        q = shard.search(self._qvec) if self._qvec is not None else shard.search()
+        if self._where:
+            q = q.where(self._where)
+        if self._columns:
+            q = q.select(self._columns)
+        return q.limit(self._limit).to_list()
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        results = self._table.scatter(self._run, self._table.route(self._where))
+        if self._qvec is None:
+            rows = [r for shard_rows in results for r in shard_rows]
+            return rows if self._limit is None else rows[:self._limit]
+        # Each shard's list is already sorted by distance: k-way heap merge of the heads.
+        merged = heapq.merge(*results, key=lambda r: r["_distance"])
+        return list(itertools.islice(merged, self._limit))
+
+
+class ShardedTable:
+    """One logical table version stored as LanceDB tables <name>__<shard>."""
+
+    def __init__(self, db, name: str, shards: Dict[str, Any], schema: Optional[pa.Schema] = None) -> None:
+        self.db = db
+        self.name = name
+        self.shards = dict(sorted(shards.items()))
+        self.schema: pa.Schema = schema if schema is not None else next(iter(self.shards.values())).schema
+        meta = self.schema.metadata or {}
+        self.shard_by = meta.get(b"shard_by", b"hash").decode()
+        self.shard_count = int(meta.get(b"shard_count", str(len(self.shards)).encode()))
+
+    @classmethod
+    def create(cls, db, name: str, schema: pa.Schema, shard_by: str, count: int) -> "ShardedTable":
+        """New empty sharded table; hash shards are created up front, collection shards on first write."""
+        schema = schema.with_metadata({**(schema.metadata or {}), **{
+            k.encode(): v.encode() for k, v in shard_metadata(shard_by, count).items()
+        }})
+        table = cls(db, name, {}, schema)
+        if shard_by == "hash":
+            for i in range(count):
+                table._shard(f"s{i:02d}")
+        return table
+
+    def _shard(self, key: str):
+        if key not in self.shards:
+            self.shards[key] = self.db.create_table(f"{self.name}{SHARD_SEP}{key}", schema=self.schema)
+        return self.shards[key]
+
+    def route(self, where: Optional[str]) -> List[Any]:
+        """Shards that can contain rows matching `where` (pruned for collection filters)."""
+        if self.shard_by == "collection" and where:
+            m = _COLLECTION_FILTER.fullmatch(where)
+            if m:
+                key = shard_key({"collection": m.group(1)}, "collection", 0)
+                return [self.shards[key]] if key in self.shards else []
+        return list(self.shards.values())
+
+    def scatter(self, fn: Callable[[Any], List[Dict[str, Any]]], shards: List[Any]) -> List[List[Dict[str, Any]]]:
+        if len(shards) <= 1:
+            return [fn(s) for s in shards]
+        return list(_pool().map(fn, shards))
+
+    def search(self, qvec: Optional[Sequence[float]] = None) -> ShardedQuery:
+        return ShardedQuery(self, qvec)
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(shard_key(row, self.shard_by, self.shard_count), []).append(row)
+        for key, group in groups.items():
+            self._shard(key).add(group)
+
+    def delete(self, where: str) -> None:
+        for shard in self.shards.values():
+            shard.delete(where)
+
+    def replace(self, where: str, rows: List[Dict[str, Any]], on: List[str]) -> None:
+        """replace_rows per shard: one commit in each shard that gets rows, then deletes in the others."""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(shard_key(row, self.shard_by, self.shard_count), []).append(row)
+        for key, group in groups.items():
+            replace_rows(self._shard(key), where, group, on)
+        for key, shard in self.shards.items():
+            if key not in groups:
+                shard.delete(where)
+
+    def count_rows(self) -> int:
+        return sum(shard.count_rows() for shard in self.shards.values())
+
+    def to_arrow(self) -> pa.Table:
+        return pa.concat_tables([shard.to_arrow() for shard in self.shards.values()])
+
+
+def replace_rows(table, where: str, rows: List[Dict[str, Any]], on: List[str]) -> None:
+    """
+    Replace the rows matching `where` by `rows` (matched on the `on` columns)
+    in one commit, so readers see either the old rows or the new ones.
+    """
+    if isinstance(table, ShardedTable):
+        table.replace(where, rows, on)
+    elif not rows:
+        table.delete(where)
+    else:
+        (table.merge_insert(on).when_matched_update_all().when_not_matched_insert_all()
+         .when_not_matched_by_source_delete(where).execute(rows))
+
+
+def table_exists(db, name: str) -> bool:
+    return any(n == name or n.startswith(name + SHARD_SEP) for n in table_names(db))
+
+
+def open_table(db, name: str):
+    """A plain LanceDB table, or a ShardedTable when `name` is stored as shards."""
+    names = table_names(db)
+    if name in names:
+        return db.open_table(name)
+    shards = {n[len(name) + len(SHARD_SEP):]: db.open_table(n) for n in names if n.startswith(name + SHARD_SEP)}
+    if not shards:
+        return db.open_table(name)  # raises LanceDB's "table not found"
+    return ShardedTable(db, name, shards)
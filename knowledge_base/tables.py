@@ -0,0 +1,202 @@
+"""
+Physical LanceDB tables behind the logical table settings.lancedb_table.
+
+Every ingestion run builds a new version named after what determines its
+vectors, e.g. segments_models-text-embedding-004_3f9c1a7e_20261019060300_5c2be4
+(embedder, hash of embedder + chunking config, run id), while the live
+version keeps serving. Publishing atomically rewrites the pointer file
+<lancedb_dir>/<base>.active.json, which also lists the previously published
+versions; settings.active_table pins a version instead. After a publish the
+last settings.table_versions_keep previously published versions are kept as
+rollback targets; older ones and builds that were never published
+(abandoned staging tables) are dropped. A sharded version
+(knowledge_base/shards.py) is stored as tables <version>__<shard>.
+
+    python -m knowledge_base.tables list
+    python -m knowledge_base.tables activate <table>    # roll back / forward
+    python -m knowledge_base.tables cleanup [--keep N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from backend.config import settings
+
+
+def table_names(db) -> List[str]:
+    """Table names across LanceDB versions (list_tables() vs. table_names())."""
+    try:
+        res = db.list_tables()  # newer lancedb
+        names = getattr(res, "tables", res)
+    except Exception:
+        names = db.table_names()  # older lancedb
+    return list(names)
+
+
+def sql_quote(value: str) -> str:
+    """Quote a string literal for a LanceDB filter expression."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def write_json_atomic(path: Path, data: Dict[str, Any]) -> None:
+    """Write JSON via a temp file + os.replace so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def pointer_path(base: Optional[str] = None) -> Path:
+    return Path(settings.lancedb_dir) / f"{base or settings.lancedb_table}.active.json"
+
+
+def read_pointer(base: Optional[str] = None) -> Dict[str, Any]:
+    """The pointer file of `base`: {"table": active, "history": [published before, oldest first]}, or {}."""
+    path = pointer_path(base)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def active_table_name(base: Optional[str] = None) -> str:
+    """
+    Physical table currently serving `base` (default: settings.lancedb_table).
+    Falls back to `base` itself when no build has been published yet.
+    """
+    if settings.active_table and base in (None, settings.lancedb_table):
+        return settings.active_table
+    base = base or settings.lancedb_table
+    return read_pointer(base).get("table", base)
+
+
+PUBLISHED_HISTORY = 20
+
+
+def publish_table(name: str, base: Optional[str] = None) -> Optional[str]:
+    """Atomically point `base` at table `name`. Returns the previously active table."""
+    base = base or settings.lancedb_table
+    previous = active_table_name(base)
+    pointer = read_pointer(base)
+    replaced = pointer.get("table")
+    history = [n for n in pointer.get("history", []) if n not in (name, replaced)]
+    if replaced and replaced != name:
+        history.append(replaced)
+    write_json_atomic(pointer_path(base), {"table": name, "history": history[-PUBLISHED_HISTORY:]})
+    return previous if previous != name else None
+
+
+# --- versions --------------------------------------------------------------
+
+_RUN_ID = re.compile(r"_(\d{14}_[0-9a-f]{6})$")
+SHARD_SEP = "__"
+
+
+def config_hash(embed_model: str, embed_dim: int, chunk_size: int, chunk_overlap: int, layout: str = "none") -> str:
+    """Short hash of everything that changes the stored vectors, chunk boundaries or shard layout."""
+    key = [embed_model, embed_dim, chunk_size, chunk_overlap] + ([layout] if layout != "none" else [])
+    return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()[:8]
+
+
+def shard_layout() -> str:
+    if settings.shard_by == "hash":
+        return f"hash/{settings.shard_count}"
+    return settings.shard_by
+
+
+def version_prefix(embed_model: str, embed_dim: int, base: Optional[str] = None) -> str:
+    """Name prefix shared by all builds with the current chunking settings and this embedder."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", embed_model).strip("-").lower()
+    digest = config_hash(embed_model, embed_dim, settings.chunk_size, settings.chunk_overlap, shard_layout())
+    return f"{base or settings.lancedb_table}_{slug}_{digest}"
+
+
+def table_versions(db, base: Optional[str] = None) -> List[str]:
+    """Built versions of `base` (tables named <base>_..._<run id>, or its shards), oldest first."""
+    base = base or settings.lancedb_table
+    names = {n.split(SHARD_SEP)[0] for n in table_names(db)}
+    versions = [n for n in names if n.startswith(base + "_") and _RUN_ID.search(n)]
+    return sorted(versions, key=lambda n: _RUN_ID.search(n).group(1))
+
+
+def drop_version(db, name: str) -> None:
+    """Drop table `name`, or all shards of a sharded version."""
+    for physical in table_names(db):
+        if physical == name or physical.startswith(name + SHARD_SEP):
+            db.drop_table(physical)
+
+
+def cleanup_versions(db, keep: Optional[int] = None, protect: tuple = (), base: Optional[str] = None) -> List[str]:
+    """
+    Drop every version except the active one (the pointer target and, if set,
+    the table pinned in settings.active_table) and the `keep` most recently
+    published before the pointer target. Versions that were never published (staging tables
+    of abandoned runs) are dropped too, unless listed in `protect` (e.g. a
+    staging table still being built). Returns the dropped names.
+    """
+    keep = settings.table_versions_keep if keep is None else keep
+    pointer = read_pointer(base)
+    history = pointer.get("history", [])
+    rollback = history[len(history) - keep:] if keep > 0 else []
+    kept = {active_table_name(base), pointer.get("table"), *rollback, *protect}
+    dropped = [n for n in table_versions(db, base) if n not in kept]
+    for name in dropped:
+        drop_version(db, name)
+    return dropped
+
+
+def _describe(table) -> str:
+    meta = table.schema.metadata or {}
+    model = meta.get(b"embed_model", b"?").decode()
+    dim = table.schema.field("embedding").type.list_size
+    shards = f", {len(table.shards)} shards" if hasattr(table, "shards") else ""
+    return f"{model} ({dim} dims), {table.count_rows()} rows{shards}"
+
+
+def main():
+    import lancedb
+
+    from knowledge_base.embedders import check_compatible
+    from knowledge_base.retriever import table_embedder
+    from knowledge_base.shards import open_table, table_exists
+
+    parser = argparse.ArgumentParser(description="List, activate and clean up table versions.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="list versions (* = active)")
+    activate = sub.add_parser("activate", help="point retrieval at a version")
+    activate.add_argument("table")
+    activate.add_argument("--force", action="store_true", help="even if built with another embedder")
+    cleanup = sub.add_parser("cleanup", help="drop old versions")
+    cleanup.add_argument("--keep", type=int, default=None)
+    args = parser.parse_args()
+
+    db = lancedb.connect(str(settings.lancedb_dir))
+    if args.cmd == "list":
+        active = active_table_name()
+        for name in table_versions(db) or [active]:
+            print(("* " if name == active else "  ") + f"{name}: {_describe(open_table(db, name))}")
+    elif args.cmd == "activate":
+        if not table_exists(db, args.table):
+            raise SystemExit(f"No table {args.table!r}")
+        if not args.force:
+            check_compatible(*table_embedder(open_table(db, args.table)), f"table {args.table}")
+        previous = publish_table(args.table)
+        print(f"Active: {args.table}" + (f" (was {previous})" if previous else ""))
+        if settings.active_table:
+            print(f"Note: ACTIVE_TABLE={settings.active_table} is set and overrides the pointer.")
+    else:
+        from knowledge_base.ingestion import Checkpoint
+
+        cp = Checkpoint.load()  # a run in progress (or to be resumed) keeps its staging table
+        for name in cleanup_versions(db, keep=args.keep, protect=(cp.table,) if cp else ()):
+            print("Dropped", name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Lightweight request tracing (stdlib only).
+
+TracingMiddleware gives every request a request ID and a trace ID (continuing
+an incoming W3C `traceparent` when present) and returns both in the
+X-Request-ID / X-Trace-ID response headers. Code inside the request opens
+child spans with
+
+    with span("search", k=k) as s:
+        ...
+        s.set(rows=len(rows))
+
+Spans follow the request into asyncio.to_thread workers (context variables
+are copied). Finished traces are exported by a background thread according
+to settings.trace_exporter:
+
+  - "jsonl": one JSON object per span appended to settings.trace_file
+  - "otlp":  OTLP/HTTP JSON to settings.otlp_endpoint (+ /v1/traces), e.g. a
+             local OpenTelemetry Collector or Jaeger
+  - "none":  IDs and headers only; spans are not recorded
+
+At most settings.trace_queue_size traces wait for export; beyond that, and
+while exports fail (backing off from 1 s up to
+settings.trace_export_backoff_max_s), traces are dropped and counted in
+exporter.stats(), so an unreachable collector cannot grow memory.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from backend.config import settings
+
+
+log = logging.getLogger(__name__)
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    kind: str = "internal"  # "server" for the request's root span
+
+    recording = True
+
+    def set(self, **attributes: Any) -> "Span":
+        self.attributes.update(attributes)
+        return self
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+            "kind": self.kind,
+        }
+
+
+class _NoopSpan:
+    recording = False  # check before computing expensive attributes
+
+    def set(self, **attributes: Any) -> "_NoopSpan":
+        return self
+
+
+_NOOP = _NoopSpan()
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    request_id: str
+    record: bool
+    spans: List[Span] = field(default_factory=list)
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Child span of the current one; a no-op outside a recorded trace."""
+    trace = _trace.get()
+    if trace is None or not trace.record:
+        yield _NOOP
+        return
+    parent = _span.get()
+    s = Span(name, trace.trace_id, secrets.token_hex(8), parent.span_id if parent else None, attributes=attributes)
+    token = _span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _span.reset(token)
+        trace.spans.append(s)
+
+
+# --- export ------------------------------------------------------------------
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span], service: str = "rag-youtuber-api") -> Dict[str, Any]:
+    """Spans in the OTLP/HTTP JSON encoding (ExportTraceServiceRequest)."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+            "scopeSpans": [{
+                "scope": {"name": "knowledge_base.tracing"},
+                "spans": [
+                    {
+                        "traceId": s.trace_id,
+                        "spanId": s.span_id,
+                        **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                        "name": s.name,
+                        "kind": 2 if s.kind == "server" else 1,  # SPAN_KIND_SERVER / SPAN_KIND_INTERNAL
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns),
+                        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+                    }
+                    for s in spans
+                ],
+            }],
+        }]
+    }
+
+
+def export_jsonl(spans: List[Span], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for s in spans:
+            f.write(json.dumps(s.to_dict(), default=str) + "\n")
+
+
+def export_otlp(spans: List[Span], endpoint: str) -> None:
+    import requests
+
+    res = requests.post(endpoint.rstrip("/") + "/v1/traces", json=otlp_payload(spans), timeout=5)
+    res.raise_for_status()
+
+
+class _Exporter:
+    """Exports finished traces from a daemon thread so requests never wait on I/O; bounded, drops when behind."""
+
+    def __init__(self, maxsize: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._failures = 0  # consecutive failed exports
+        self._retry_at = 0.0
+        self.dropped = 0
+        self.exported = 0
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _drop(self, spans: List[Span]) -> None:
+        with self._lock:
+            self.dropped += 1
+            dropped = self.dropped
+        if dropped == 1 or dropped % 1000 == 0:
+            log.warning("trace export is behind or failing: %d traces dropped so far", dropped)
+
+    def submit(self, spans: List[Span]) -> None:
+        self._start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self._drop(spans)
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Block until everything submitted so far was handled (tests, shutdown)."""
+        self._start()
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "exported": self.exported, "dropped": self.dropped,
+                "failures": self._failures}
+
+    def export(self, spans: List[Span]) -> None:
+        """Export one trace now, unless backing off after failures (then it is dropped)."""
+        if self._clock() < self._retry_at:
+            self._drop(spans)
+            return
+        try:
+            if settings.trace_exporter == "jsonl":
+                export_jsonl(spans, Path(settings.trace_file))
+            elif settings.trace_exporter == "otlp":
+                export_otlp(spans, settings.otlp_endpoint)
+        except Exception as e:
+            self._failures += 1
+            backoff = min(2.0 ** (self._failures - 1), settings.trace_export_backoff_max_s)
+            self._retry_at = self._clock() + backoff
+            self._drop(spans)
+            log.warning("trace export failed (%d in a row, pausing %.0f s): %s", self._failures, backoff, e)
+        else:
+            self._failures = 0
+            self.exported += 1
+
+    def _run(self) -> None:
+        while True:
+            spans = self._queue.get()
+            if isinstance(spans, threading.Event):
+                spans.set()
+            else:
+                self.export(spans)
+
+
+exporter = _Exporter(settings.trace_queue_size)
+
+
+# --- middleware ----------------------------------------------------------------
+
+
+class TracingMiddleware:
+    """ASGI middleware: request/trace IDs, root span, response headers, export."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        incoming = headers.get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming if _REQUEST_ID.match(incoming) else secrets.token_hex(8)
+        match = _TRACEPARENT.match(headers.get(b"traceparent", b"").decode("latin-1"))
+        trace_id = match.group(1) if match else secrets.token_hex(16)
+        parent_id = match.group(2) if match else None
+
+        trace = Trace(trace_id, request_id, record=settings.trace_exporter != "none")
+        trace_token = _trace.set(trace)
+        root = Span(
+            f"{scope['method']} {scope['path']}", trace_id, secrets.token_hex(8), parent_id,
+            attributes={"http.method": scope["method"], "http.target": scope["path"], "request_id": request_id},
+            kind="server",
+        )
+        span_token = _span.set(root)
+
+        async def send_with_ids(message):
+            if message["type"] == "http.response.start":
+                root.set(**{"http.status_code": message["status"]})
+                extra = [(b"x-request-id", request_id.encode()), (b"x-trace-id", trace_id.encode())]
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_ids)
+        except BaseException as e:
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            _span.reset(span_token)
+            _trace.reset(trace_token)
+            if trace.record:
+                exporter.submit(trace.spans + [root])
@@ -0,0 +1,72 @@
+"""
+Precompute answers for a list of known questions.
+
+    uv run python -m knowledge_base.warm_faq questions.txt [--concurrency 4] [--force]
+
+One question per line (blank lines and lines starting with # are ignored).
+Answers are stored in the answer store that /rag/query consults first, and are
+invalidated automatically when a re-ingestion changes their source chunks.
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from typing import List
+
+from backend.config import settings
+from knowledge_base.answer_store import answer_store
+from knowledge_base.rag_agent import NO_ANSWER, answer_with_sources
+
+
+def read_questions(path: Path) -> List[str]:
+    lines = path.read_text(encoding="utf-8").splitlines()
+    return [q.strip() for q in lines if q.strip() and not q.strip().startswith("#")]
+
+
+async def warm(questions: List[str], concurrency: int, k: int = 5, force: bool = False) -> None:
+    store = answer_store()
+    sem = asyncio.Semaphore(concurrency)
+    stats = {"stored": 0, "cached": 0, "no_answer": 0, "failed": 0}
+
+    async def one(question: str) -> None:
+        if not force and store.get(question) is not None:
+            stats["cached"] += 1
+            return
+        async with sem:
+            try:
+                result = await answer_with_sources(question, k=k)
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"[FAIL] {question!r}: {e}")
+                return
+        # Don't pin "I don't know" answers: new content may answer them later.
+        if result.answer == NO_ANSWER or not result.chunks or result.mode != "llm":
+            stats["no_answer"] += 1
+            return
+        store.put(question, result.answer, result.chunks)
+        stats["stored"] += 1
+        print(f"[OK] {question!r} ({len(result.chunks)} sources)")
+
+    await asyncio.gather(*(one(q) for q in questions))
+    print("Stats:", stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute answers for frequent questions.")
+    parser.add_argument("questions", type=Path, help="text file, one question per line")
+    parser.add_argument("--concurrency", type=int, default=settings.faq_concurrency)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--force", action="store_true", help="regenerate already stored answers")
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    print(f"Warming {len(questions)} questions (concurrency={args.concurrency})")
+
+    start = time.perf_counter()
+    asyncio.run(warm(questions, args.concurrency, k=args.k, force=args.force))
+    print(f"Done in {time.perf_counter() - start:.1f}s. Store now holds {len(answer_store())} answers.")
+
+
+if __name__ == "__main__":
+    main()
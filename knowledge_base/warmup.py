@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+from backend.config import settings
+from knowledge_base.answer_store import answer_store
+from knowledge_base.bundle import load_bundle
+from knowledge_base.embedders import get_client
+from knowledge_base.retriever import check_bundle, check_table, embed_query, get_table
+from knowledge_base.tables import active_table_name
+
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupState:
+    started: bool = False
+    ready: bool = False
+    error: Optional[str] = None
+    steps_ms: Dict[str, float] = field(default_factory=dict)
+    warnings: Dict[str, str] = field(default_factory=dict)
+    total_ms: float = 0.0
+    failures: int = 0  # consecutive failed attempts
+    failed_at: Optional[float] = None  # time.monotonic() of the last failure
+
+    def to_dict(self) -> Dict:
+        return {
+            "status": "ready" if self.ready else ("failed" if self.error else "warming"),
+            "error": self.error,
+            "failures": self.failures,
+            "steps_ms": self.steps_ms,
+            "warnings": self.warnings,
+            "total_ms": round(self.total_ms, 1),
+        }
+
+
+state = WarmupState()
+_task: Optional[asyncio.Task] = None
+
+
+def load_index() -> str:
+    """Open the index, check it matches the embedder, and pull its vectors into memory."""
+    bundle = load_bundle()
+    if bundle is not None:
+        check_bundle(bundle)
+        # Touch every page of the mapping so the first query doesn't fault them in.
+        float(np.asarray(bundle.vectors).sum())
+        float(np.asarray(bundle.norms).sum())
+        return f"bundle {bundle.version} ({len(bundle)} rows)"
+
+    check_table(active_table_name())
+    table = get_table(active_table_name())
+    dim = table.schema.field("embedding").type.list_size
+    # One real search loads the vector index / data files into the page cache.
+    table.search(np.ones(dim, dtype=np.float32)).limit(1).to_list()
+    return f"table {table.name} ({table.count_rows()} rows)"
+
+
+async def _step(name: str, fn: Callable[[], Awaitable], required: bool) -> None:
+    start = time.perf_counter()
+    try:
+        await fn()
+    except Exception as e:
+        if required:
+            raise
+        state.warnings[name] = str(e)
+        log.warning("warm-up step %s failed: %s", name, e)
+    finally:
+        state.steps_ms[name] = round(1000 * (time.perf_counter() - start), 1)
+
+
+async def warm_up() -> WarmupState:
+    """
+    Pay cold-start costs before traffic arrives: open/map the index, create
+    the embedding client, open the answer store, and optionally embed and
+    answer a synthetic query (warms TLS connections to Gemini). Only index
+    loading is required for readiness; network steps may fail (e.g. quota)
+    without taking the instance out of rotation.
+    """
+    from knowledge_base.rag_agent import answer_question
+
+    state.started = True
+    state.error = None
+    start = time.perf_counter()
+    try:
+        await _step("index", lambda: asyncio.to_thread(load_index), required=True)
+        await _step("clients", lambda: asyncio.to_thread(lambda: (get_client(), answer_store())), required=True)
+        if settings.warmup_embed:
+            await _step(
+                "embed",
+                lambda: asyncio.to_thread(embed_query, "warm-up"),
+                required=False,
+            )
+        if settings.warmup_query:
+            await _step("query", lambda: answer_question(settings.warmup_query, k=5), required=False)
+        state.ready = True
+        state.failures = 0
+    except Exception as e:
+        state.error = str(e)
+        state.failures += 1
+        state.failed_at = time.monotonic()
+        log.exception("warm-up failed (attempt %d)", state.failures)
+    finally:
+        state.total_ms = 1000 * (time.perf_counter() - start)
+    return state
+
+
+def retry_delay(failures: int) -> float:
+    """Seconds to wait after `failures` consecutive failures: doubling from warmup_retry_s up to warmup_retry_max_s."""
+    return min(settings.warmup_retry_s * 2 ** max(0, failures - 1), settings.warmup_retry_max_s)
+
+
+def start_warmup() -> asyncio.Task:
+    """
+    Start warm-up once per process (idempotent); must be called from the event
+    loop. After a failed attempt the next call (e.g. the next /ready probe)
+    starts another one once the backoff has passed.
+    """
+    global _task
+    retry = (
+        _task is not None and _task.done() and not state.ready and state.failed_at is not None
+        and time.monotonic() - state.failed_at >= retry_delay(state.failures)
+    )
+    if _task is None or retry:
+        _task = asyncio.get_running_loop().create_task(warm_up())
+    return _task
@@ -0,0 +1,74 @@
+import threading
+from dataclasses import dataclass
+
+from fastapi.testclient import TestClient
+
+from backend.config import settings
+from knowledge_base import api
+from knowledge_base.answer_store import AnswerStore, chunk_hash
+
+
+@dataclass
+class Chunk:
+    source_file: str
+    chunk_index: int
+    text: str
+
+
+def test_put_and_get_normalizes_question(tmp_path):
+    store = AnswerStore(tmp_path / "answers.sqlite")
+    store.put("What is LanceDB?", "A vector database.", [Chunk("lancedb.txt", 0, "intro")])
+
+    hit = store.get("  what is   lancedb ")
+    assert hit is not None
+    assert hit.answer == "A vector database."
+    assert hit.sources == [("lancedb.txt", 0)]
+    assert store.get("What is DuckDB?") is None
+
+
+def test_invalidate_drops_answers_with_changed_sources(tmp_path):
+    store = AnswerStore(tmp_path / "answers.sqlite")
+    store.put("q1", "a1", [Chunk("a.txt", 0, "alpha"), Chunk("b.txt", 1, "beta")])
+    store.put("q2", "a2", [Chunk("c.txt", 0, "gamma")])
+    store.put("q3", "a3", [Chunk("d.txt", 2, "delta")])
+
+    current = {
+        ("a.txt", 0): chunk_hash("alpha"),
+        ("b.txt", 1): chunk_hash("beta (edited)"),  # changed
+        ("c.txt", 0): chunk_hash("gamma"),
+        # d.txt chunk 2 disappeared
+    }
+    assert store.invalidate(current) == 2
+
+    assert store.get("q1") is None
+    assert store.get("q2") is not None
+    assert store.get("q3") is None
+    assert len(store) == 1
+    assert set(store.source_chunks()) == {("c.txt", 0)}
+
+
+def test_invalidate_compares_hash_per_answer(tmp_path):
+    store = AnswerStore(tmp_path / "answers.sqlite")
+    store.put("old", "a", [Chunk("a.txt", 0, "before")])
+    store.put("new", "b", [Chunk("a.txt", 0, "after")])
+
+    assert store.invalidate({("a.txt", 0): chunk_hash("after")}) == 1
+    assert store.get("old") is None
+    assert store.get("new") is not None
+
+
+def test_api_serves_stored_answers_without_blocking_the_event_loop(tmp_path, monkeypatch):
+    store = AnswerStore(tmp_path / "answers.sqlite")
+    store.put("What is LanceDB?", "A vector database.", [Chunk("lancedb.txt", 0, "intro")])
+    threads = []
+    get = store.get
+    monkeypatch.setattr(store, "get", lambda q: threads.append(threading.current_thread()) or get(q))
+    monkeypatch.setattr(api, "answer_store", lambda: store)
+    monkeypatch.setattr(settings, "warmup_enabled", False)
+
+    with TestClient(api.app) as client:
+        res = client.post("/rag/query", json={"prompt": "what is lancedb?"})
+        loop_thread = client.portal.call(threading.current_thread)
+
+    assert res.json() == {"answer": "A vector database.", "cached": True}
+    assert threads and threads[0] is not loop_thread
@@ -0,0 +1,132 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from frontend.api_client import AnswerCache, RagClient, describe_http_error, parse_stream_line
+
+
+class FakeResponse:
+    def __init__(self, content_type, lines=(), body=None, status=200):
+        self.headers = {"Content-Type": content_type}
+        self.lines = lines
+        self.body = body
+        self.status_code = status
+        self.ok = status < 400
+        self.content = (body or "").encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(response=self)
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def client_returning(monkeypatch, response):
+    client = RagClient("http://api/rag/query")
+    calls = []
+
+    def post(prompt, stream=False):
+        calls.append(prompt)
+        return response
+
+    monkeypatch.setattr(client, "post", post)
+    return client, calls
+
+
+def test_parse_stream_line_handles_sse_and_ndjson():
+    assert parse_stream_line('data: {"delta": "Hej"}') == "Hej"
+    assert parse_stream_line("data: plain text") == "plain text"
+    assert parse_stream_line("data: [DONE]") == ""
+    assert parse_stream_line('{"delta": " world"}') == " world"
+    assert parse_stream_line('{"answer": "whole"}') == "whole"
+    assert parse_stream_line('{"done": true}') == ""
+    assert parse_stream_line("") == "" and parse_stream_line(None) == ""
+
+
+def test_stream_yields_sse_pieces_and_caches_the_answer(monkeypatch):
+    lines = ['data: {"delta": "Lance"}', "", 'data: {"delta": "DB"}', "data: [DONE]"]
+    client, calls = client_returning(monkeypatch, FakeResponse("text/event-stream", lines))
+    cache = AnswerCache()
+
+    assert list(client.stream("What is LanceDB?", cache=cache)) == ["Lance", "DB"]
+    assert list(client.stream("  what is  lancedb? ", cache=cache)) == ["LanceDB"]  # normalized cache hit
+    assert calls == ["What is LanceDB?"]
+
+
+def test_stream_falls_back_to_json_and_skips_empty_answers(monkeypatch):
+    client, _ = client_returning(monkeypatch, FakeResponse("application/json", body='{"answer": "An answer."}'))
+    assert list(client.stream("q")) == ["An answer."]
+
+    client, _ = client_returning(monkeypatch, FakeResponse("application/json", body='{"answer": ""}'))
+    cache = AnswerCache()
+    assert list(client.stream("q", cache=cache)) == []
+    assert len(cache) == 0
+
+    client, _ = client_returning(monkeypatch, FakeResponse("application/json", body="{}", status=503))
+    with pytest.raises(requests.HTTPError):
+        list(client.stream("q"))
+
+
+def test_stream_does_not_cache_extractive_fallbacks(monkeypatch):
+    body = '{"answer": "Excerpts only.", "mode": "extractive"}'
+    client, calls = client_returning(monkeypatch, FakeResponse("application/json", body=body))
+    cache = AnswerCache()
+    assert list(client.stream("q", cache=cache)) == ["Excerpts only."]
+    assert len(cache) == 0
+    list(client.stream("q", cache=cache))
+    assert calls == ["q", "q"]  # asked again next time
+
+
+def test_answer_cache_is_lru_by_normalized_prompt():
+    cache = AnswerCache(maxsize=2)
+    cache.put("What is FastAPI?", "a")
+    cache.put("What is Docker?", "b")
+    assert cache.get("what is   fastapi?") == "a"  # now most recent
+    cache.put("What is Azure?", "c")
+    assert cache.get("What is Docker?") is None
+    assert cache.get("What is FastAPI?") == "a" and len(cache) == 2
+
+
+class FailingAPI(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = b'{"detail": "Gemini quota exhausted"}'
+        self.send_response(500)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Trace-ID", "abc123")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_stream_error_keeps_the_api_detail():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FailingAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = RagClient(f"http://127.0.0.1:{server.server_port}/rag/query")
+    try:
+        with pytest.raises(requests.HTTPError) as info:
+            list(client.stream("q"))
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    headline, detail = describe_http_error(info.value)
+    assert headline == "API error: 500 (trace abc123)"
+    assert detail == '{"detail": "Gemini quota exhausted"}'
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from knowledge_base.bundle import BundleError, IndexBundle, write_bundle
+
+
+def make_bundle(path, n=50, dim=8):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((n, dim), dtype=np.float32)
+    texts = [f"chunk {i} – åäö" for i in range(n)]
+    write_bundle(
+        path,
+        vectors=vectors,
+        texts=texts,
+        source_files=[f"video_{i % 5}.md" for i in range(n)],
+        chunk_indices=[i // 5 for i in range(n)],
+        collections=["transcripts" if i % 2 == 0 else "misc" for i in range(n)],
+        meta={"version": "v1"},
+    )
+    return vectors, texts
+
+
+def test_roundtrip_and_search_matches_brute_force(tmp_path):
+    path = tmp_path / "segments-v1.bundle"
+    vectors, texts = make_bundle(path)
+
+    bundle = IndexBundle(path)
+    assert len(bundle) == 50 and bundle.version == "v1"
+    assert bundle.text(7) == texts[7]
+    assert bundle.source_file(7) == "video_2.md"
+    np.testing.assert_array_equal(bundle.vectors, vectors)
+
+    q = vectors[10] + 0.01
+    expected = np.argsort(((vectors - q) ** 2).sum(axis=1))[:5]
+    hits = bundle.search(q, k=5)
+    assert [h.row for h in hits] == list(expected)
+    assert hits[0].distance == pytest.approx(float(((vectors[10] - q) ** 2).sum()), abs=1e-4)
+
+    rows = bundle.to_rows(bundle.search(q, k=3, collection="transcripts"))
+    assert len(rows) == 3
+    assert all(r["collection"] == "transcripts" for r in rows)
+    assert bundle.search(q, k=3, collection="nope") == []
+    bundle.close()
+
+
+def test_vectors_are_memory_mapped_not_copied(tmp_path):
+    path = tmp_path / "b.bundle"
+    make_bundle(path)
+    bundle = IndexBundle(path)
+    assert not bundle.vectors.flags.owndata
+    assert not bundle.vectors.flags.writeable
+    bundle.close()
+
+
+def test_corrupted_bundle_fails_checksum(tmp_path):
+    path = tmp_path / "b.bundle"
+    make_bundle(path)
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(BundleError, match="Checksum"):
+        IndexBundle(path)
+    IndexBundle(path, verify=False).close()
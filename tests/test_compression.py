@@ -0,0 +1,46 @@
+from knowledge_base.compression import compress_chunks, split_sentences
+from knowledge_base.retriever import RetrievedChunk
+
+
+VOCAB = ["lancedb", "vector", "database", "coffee", "weather", "um"]
+
+
+def bag_of_words(texts):
+    return [[t.lower().count(w) for w in VOCAB] for t in texts]
+
+
+def test_split_sentences_handles_unpunctuated_transcripts():
+    text = "so um " * 200
+    parts = split_sentences(text, min_chars=10, max_chars=100)
+    assert len(parts) > 5
+    assert all(len(p) <= 100 for p in parts)
+
+
+def test_split_sentences_merges_short_fragments():
+    parts = split_sentences("LanceDB is a vector database. Yes. It stores embeddings on disk.", min_chars=10)
+    assert parts == ["LanceDB is a vector database. Yes.", "It stores embeddings on disk."]
+
+
+def test_compress_keeps_relevant_sentences_and_sources():
+    chunks = [
+        RetrievedChunk("lancedb.txt", 3, "I had coffee today. LanceDB is a vector database. The weather is nice."),
+        RetrievedChunk("misc.txt", 0, "Um, um, coffee again. More coffee. Weather talk."),
+    ]
+    qvec = bag_of_words(["lancedb vector database"])[0]
+
+    out = compress_chunks(chunks, qvec, embed=bag_of_words, max_chars=40, min_sentence_chars=5)
+
+    assert [(c.source_file, c.chunk_index) for c in out] == [("lancedb.txt", 3)]
+    assert out[0].text == "LanceDB is a vector database."
+
+
+def test_compress_marks_gaps_and_preserves_order():
+    chunk = RetrievedChunk(
+        "a.txt", 0,
+        "LanceDB stores vectors. I like coffee a lot. The vector database is fast.",
+    )
+    qvec = bag_of_words(["lancedb vector database"])[0]
+
+    out = compress_chunks([chunk], qvec, embed=bag_of_words, max_chars=60, min_sentence_chars=5)
+
+    assert out[0].text == "LanceDB stores vectors. … The vector database is fast."
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+
+from knowledge_base import rag_agent
+from knowledge_base.deadline import Deadline, DeadlineExceeded
+from knowledge_base.extractive import EXTRACTIVE_HEADER, extractive_answer
+from knowledge_base.rate_limit import call_with_retry
+from knowledge_base.retriever import RetrievedChunk
+
+
+CHUNKS = [
+    RetrievedChunk("fastapi.md", 2, "Welcome back everyone. FastAPI runs on an ASGI server like uvicorn. "
+                   "Let's get started with the next part of the video.", score=0.4),
+    RetrievedChunk("azure.md", 0, "Azure Functions can host an ASGI app through the AsgiMiddleware adapter.",
+                   score=0.6),
+]
+
+
+def stub_retrieval(monkeypatch, search_s=0.0):
+    monkeypatch.setattr(rag_agent, "embed_query", lambda q, deadline=None: [0.0])
+
+    def retrieve(question, k, qvec):
+        time.sleep(search_s)
+        return list(CHUNKS)
+
+    monkeypatch.setattr(rag_agent, "retrieve", retrieve)
+
+
+def slow_model(seconds):
+    async def llm(messages, info):
+        await asyncio.sleep(seconds)
+        return ModelResponse(parts=[TextPart("generated answer")])
+
+    return FunctionModel(llm)
+
+
+def test_extractive_answer_cites_sentences_matching_the_question():
+    answer = extractive_answer("Which ASGI server does FastAPI use?", CHUNKS, max_sentences=1)
+    assert answer.startswith(EXTRACTIVE_HEADER)
+    assert '"FastAPI runs on an ASGI server like uvicorn." (fastapi.md, chunk 2)' in answer
+    assert answer.endswith("Sources\n- (fastapi.md, chunk 2)")
+
+
+def test_slow_generation_falls_back_to_extractive_within_deadline(monkeypatch):
+    stub_retrieval(monkeypatch)
+    start = time.perf_counter()
+    with rag_agent.agent.override(model=slow_model(5)):
+        result = asyncio.run(rag_agent.answer_with_sources(
+            "How does FastAPI use ASGI?", deadline=Deadline.after(1.5), compress=False, expand="off", neighbors=0,
+        ))
+    assert time.perf_counter() - start < 2.5
+    assert result.mode == "extractive"
+    assert "(fastapi.md, chunk 2)" in result.answer
+    assert {"retrieve_ms", "generate_ms", "extractive_ms"} <= set(result.timings_ms)
+
+
+def test_fast_mode_skips_the_llm(monkeypatch):
+    stub_retrieval(monkeypatch)
+
+    async def never(messages, info):
+        raise AssertionError("LLM must not be called in fast mode")
+
+    with rag_agent.agent.override(model=FunctionModel(never)):
+        result = asyncio.run(rag_agent.answer_with_sources("What hosts ASGI apps on Azure?", fast=True,
+                                                           expand="off", neighbors=0))
+    assert result.mode == "extractive"
+    assert "azure.md" in result.answer
+
+
+def test_generation_within_budget_uses_the_llm(monkeypatch):
+    stub_retrieval(monkeypatch)
+    with rag_agent.agent.override(model=slow_model(0)):
+        result = asyncio.run(rag_agent.answer_with_sources("q", deadline=Deadline.after(5), compress=False,
+                                                           expand="off", neighbors=0))
+    assert result.mode == "llm" and result.answer == "generated answer"
+
+
+def test_retrieval_past_the_deadline_raises(monkeypatch):
+    stub_retrieval(monkeypatch, search_s=0.5)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(rag_agent.answer_with_sources("q", deadline=Deadline.after(0.2), expand="off", neighbors=0))
+
+
+def test_retry_stops_when_backoff_would_pass_the_deadline():
+    calls = []
+
+    class Quota(Exception):
+        code = 429
+
+    def fn():
+        calls.append(1)
+        raise Quota()
+
+    with pytest.raises(Quota):
+        call_with_retry(fn, max_retries=10, base_delay=5, sleep=lambda s: None,
+                        deadline=time.monotonic())
+    assert len(calls) == 1
@@ -0,0 +1,42 @@
+import random
+
+from knowledge_base.dedup import Deduplicator
+
+
+def make_text(seed, n=400):
+    rng = random.Random(seed)
+    words = ["lancedb", "vector", "fastapi", "azure", "pydantic", "gemini", "chunk", "query",
+             "table", "embedding", "deploy", "function", "streamlit", "python", "data", "model"]
+    return " ".join(rng.choice(words) for _ in range(n))
+
+
+def test_exact_duplicate_ignores_case_and_whitespace():
+    d = Deduplicator("file")
+    text = make_text(1)
+    assert d.check("a.md", text) is None
+
+    dup = d.check("a (1).md", "  " + text.upper().replace(" ", "\n"))
+    assert dup.reason == "exact"
+    assert dup.duplicate_of == "a.md"
+
+
+def test_near_duplicate_detected_distinct_text_kept():
+    d = Deduplicator("chunk", threshold=0.8)
+    base = make_text(2).split()
+    edited = list(base)
+    edited[100] = "typo"  # one word changed
+
+    assert d.check("x#0", " ".join(base)) is None
+    dup = d.check("y#0", " ".join(edited))
+    assert dup is not None and dup.reason == "near"
+    assert dup.similarity >= 0.8
+
+    assert d.check("z#0", make_text(3)) is None
+
+
+def test_first_occurrence_wins_and_is_reported():
+    d = Deduplicator("file")
+    text = make_text(4)
+    assert d.check("orig.md", text) is None
+    assert d.check("copy1.md", text).duplicate_of == "orig.md"
+    assert d.check("copy2.md", text).duplicate_of == "orig.md"
@@ -0,0 +1,49 @@
+import lancedb
+import numpy as np
+import pytest
+
+from backend.config import settings
+from knowledge_base.embedders import EmbedderMismatch, HashEmbedder, check_compatible, get_embedder
+from knowledge_base.ingestion import create_staging_table, embed_texts
+from knowledge_base.retriever import table_embedder
+
+
+def cos(a, b):
+    return float(np.dot(a, b))
+
+
+def test_hash_embedder_is_deterministic_normalised_and_lexical():
+    e = HashEmbedder(1024)
+    query = e.vector("How do I deploy a FastAPI app?")
+    related = e.vector("In this video we deploy our FastAPI application to Azure Functions.")
+    unrelated = e.vector("Logistic regression predicts a probability with the sigmoid function.")
+
+    assert query.shape == (1024,) and np.isclose(np.linalg.norm(query), 1.0)
+    assert np.array_equal(query, HashEmbedder(1024).vector("How do I deploy a FastAPI app?"))
+    assert cos(query, related) > cos(query, unrelated) + 0.1
+    # shared character n-grams
+    assert cos(e.vector("deployment"), e.vector("deploy")) > abs(cos(e.vector("deployment"), e.vector("sigmoid")))
+    assert not e.vector("the and of").any()  # stopwords only
+
+
+def test_staging_table_records_embedder_and_mismatch_is_refused(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "embedder", "hash")
+    monkeypatch.setattr(settings, "hash_embed_dim", 64)
+    db = lancedb.connect(str(tmp_path))
+    table = create_staging_table(db, embed_texts, "segments_test")
+
+    assert table_embedder(table) == ("hash-ngram-v1", 64)
+    assert get_embedder().dim == 64
+    check_compatible(*table_embedder(table), "table segments_test")
+
+    monkeypatch.setattr(settings, "embedder", "gemini")
+    with pytest.raises(EmbedderMismatch, match="hash-ngram-v1"):
+        check_compatible(*table_embedder(table), "table segments_test")
+
+
+def test_tables_without_metadata_are_checked_by_dimension(monkeypatch):
+    monkeypatch.setattr(settings, "embedder", "gemini")
+    monkeypatch.setattr(settings, "embed_dim", 768)
+    check_compatible(None, 768, "legacy table")
+    with pytest.raises(EmbedderMismatch):
+        check_compatible(None, 3072, "legacy table")
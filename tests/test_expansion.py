@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+from pydantic_ai.models.function import FunctionModel
+
+from knowledge_base import expansion
+
+
+def test_rule_based_variants_expand_acronyms():
+    variants = expansion.rule_based_variants("How does ASGI work?", n=3)
+    assert len(variants) == 3
+    assert any("asynchronous server gateway interface" in v for v in variants)
+    assert "How does ASGI work?" not in variants
+
+
+def test_reciprocal_rank_fusion_rewards_agreement_and_keeps_best_distance():
+    a = {"source_file": "a.md", "chunk_index": 0, "_distance": 0.9}
+    b = {"source_file": "b.md", "chunk_index": 0, "_distance": 0.5}
+    c = {"source_file": "c.md", "chunk_index": 0, "_distance": 0.4}
+    a_closer = dict(a, _distance=0.3)
+
+    fused = expansion.reciprocal_rank_fusion([[b, a], [c, a_closer], [a, b]], k=2)
+
+    assert [r["source_file"] for r in fused] == ["a.md", "b.md"]
+    assert fused[0]["_distance"] == 0.3
+
+
+def test_retrieve_expanded_embeds_once_and_searches_each_variant(monkeypatch):
+    embed_calls, searched = [], []
+
+    def fake_embed(texts, deadline=None):
+        embed_calls.append(list(texts))
+        return [[float(i)] for i in range(len(texts))]
+
+    def fake_search(qvec, k):
+        searched.append(qvec[0])
+        return [{"source_file": f"{int(qvec[0])}.md", "chunk_index": 0, "text": "t", "_distance": 0.2}]
+
+    monkeypatch.setattr(expansion, "get_embedder", lambda: SimpleNamespace(embed=fake_embed))
+    monkeypatch.setattr(expansion, "search_rows", fake_search)
+
+    result = asyncio.run(expansion.retrieve_expanded("what is dlt?", k=3, n=2))
+
+    assert len(embed_calls) == 1
+    assert embed_calls[0][0] == "what is dlt?"
+    assert sorted(searched) == [0.0, 1.0, 2.0]
+    assert result.qvec == [0.0]
+    assert result.chunks[0].source_file == "0.md"
+    assert set(result.timings_ms) == {"variants_ms", "embed_ms", "search_ms", "fuse_ms"}
+
+
+def test_failed_llm_rewrite_falls_back_to_rule_based_variants(monkeypatch):
+    monkeypatch.setattr(expansion, "get_embedder",
+                        lambda: SimpleNamespace(embed=lambda texts, deadline=None: [[0.0]] * len(texts)))
+    monkeypatch.setattr(expansion, "search_rows", lambda qvec, k: [])
+
+    async def quota(messages, info):
+        raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+    with expansion.variants_agent.override(model=FunctionModel(quota)):
+        result = asyncio.run(expansion.retrieve_expanded("How does ASGI work?", k=3, method="llm", n=2))
+
+    assert result.variant_source == "rules_fallback"
+    assert result.variants == ["How does ASGI work?"] + expansion.rule_based_variants("How does ASGI work?", 2)
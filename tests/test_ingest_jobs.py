@@ -0,0 +1,86 @@
+import time
+
+import lancedb
+from fastapi.testclient import TestClient
+
+from backend.config import settings
+from knowledge_base import api, ingest_jobs
+
+
+def fake_embed_texts(texts):
+    return [[float(len(t)), 1.0] for t in texts]
+
+
+def setup(monkeypatch, tmp_path):
+    db = lancedb.connect(str(tmp_path / "db"))
+    seed = {"collection": "seed", "source_file": "__seed__", "chunk_index": -1,
+            "char_start": 0, "char_end": 0, "text": "seed", "embedding": [1.0, 1.0]}
+    table = db.create_table("t", data=[seed])
+
+    monkeypatch.setattr(settings, "warmup_enabled", False)
+    monkeypatch.setattr(ingest_jobs, "_queue", None)
+    monkeypatch.setattr(ingest_jobs, "get_table", lambda name: table)
+    monkeypatch.setattr(ingest_jobs, "active_table_name", lambda: "t")
+    monkeypatch.setattr(settings, "embed_dim", 2)
+    monkeypatch.setattr(ingest_jobs, "embed_texts", fake_embed_texts)
+    monkeypatch.setattr(ingest_jobs, "invalidate_from_table", lambda table: 0)
+    monkeypatch.setattr(ingest_jobs, "DATA_PATH", tmp_path)
+    monkeypatch.setattr(api, "load_bundle", lambda: None)
+    return table
+
+
+def wait_for(client, job_id):
+    for _ in range(100):
+        status = client.get(f"/ingest/{job_id}").json()
+        if status["status"] in ("done", "failed"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def test_ingest_job_appends_and_replaces_rows(monkeypatch, tmp_path):
+    table = setup(monkeypatch, tmp_path)
+    text = "# FastAPI intro\n\n" + "**Speaker:** FastAPI is an ASGI framework. " * 80
+
+    with TestClient(api.app) as client:
+        res = client.post("/ingest", json={"transcripts": [{"name": "FastAPI intro.md", "text": text}]})
+        assert res.status_code == 202
+        status = wait_for(client, res.json()["job_id"])
+        assert status["status"] == "done" and status["chunks"] > 1
+
+        rows = table.search().where("source_file = 'FastAPI intro.md'").limit(None).to_list()
+        assert len(rows) == status["chunks"]
+        assert {r["collection"] for r in rows} == {"transcripts"}
+        assert "**" not in rows[0]["text"]
+        assert (tmp_path / "FastAPI intro.md").read_text(encoding="utf-8") == text
+
+        # Re-ingesting the same name replaces its rows instead of duplicating them
+        res = client.post("/ingest", json={"transcripts": [{"name": "FastAPI intro.md", "text": "short"}]})
+        assert wait_for(client, res.json()["job_id"])["chunks"] == 1
+        assert table.count_rows("source_file = 'FastAPI intro.md'") == 1
+
+
+def test_ingest_rejects_bad_names_and_unknown_jobs(monkeypatch, tmp_path):
+    setup(monkeypatch, tmp_path)
+    with TestClient(api.app) as client:
+        res = client.post("/ingest", json={"transcripts": [{"name": "../x.md", "text": "t"}]})
+        assert res.status_code == 400
+        res = client.post("/ingest", json={"transcripts": [{"name": "x.pdf", "text": "t"}]})
+        assert res.status_code == 400
+        assert client.get("/ingest/nope").status_code == 404
+
+
+def test_failed_source_copy_does_not_fail_the_job(monkeypatch, tmp_path):
+    table = setup(monkeypatch, tmp_path)
+    invalidated = []
+    monkeypatch.setattr(ingest_jobs, "invalidate_from_table", lambda table: invalidated.append(table))
+    monkeypatch.setattr(ingest_jobs, "DATA_PATH", tmp_path / "read-only")  # missing dir: the write fails
+
+    with TestClient(api.app) as client:
+        res = client.post("/ingest", json={"transcripts": [{"name": "notes.txt", "text": "LanceDB notes"}]})
+        assert wait_for(client, res.json()["job_id"])["status"] == "done"
+        assert table.count_rows("source_file = 'notes.txt'") == 1 and invalidated == [table]
+
+        monkeypatch.setattr(settings, "ingest_api_enabled", False)  # multi-worker server
+        res = client.post("/ingest", json={"transcripts": [{"name": "notes.txt", "text": "t"}]})
+        assert res.status_code == 409
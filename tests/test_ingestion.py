@@ -0,0 +1,19 @@
+import logging
+
+import pytest
+
+from knowledge_base.ingestion import raise_first
+
+
+def test_raise_first_reports_every_stage_failure(caplog):
+    quota, write = RuntimeError("429 RESOURCE_EXHAUSTED"), OSError("disk full")
+    group = ExceptionGroup("stages", [quota, write])
+    with caplog.at_level(logging.ERROR), pytest.raises(RuntimeError) as info:
+        raise_first(group)
+    assert info.value is quota and info.value.__cause__ is group
+    assert "disk full" in caplog.text
+
+    interrupted = BaseExceptionGroup("stages", [quota, KeyboardInterrupt()])
+    with pytest.raises(BaseExceptionGroup) as info:
+        raise_first(interrupted)
+    assert info.value is interrupted
@@ -0,0 +1,42 @@
+from collections import Counter
+
+from fastapi.testclient import TestClient
+
+from backend.config import settings
+from benchmarks.load_test import install_stand_ins, regressions, summarize
+from knowledge_base import answer_store, bundle, embedders, memory, rag_agent
+
+
+def test_summarize_reports_percentiles_and_errors():
+    report = summarize([float(i) for i in range(1, 101)], Counter({200: 100, 504: 5, "timeout": 5}), 10.0)
+    assert report["requests"] == 110 and report["ok"] == 100
+    assert report["throughput_rps"] == 10.0
+    assert report["error_rate"] == round(10 / 110, 4)
+    assert report["p50_ms"] == 50.5 and report["p99_ms"] == 99.0
+
+
+def test_regressions_flags_tail_latency_and_throughput():
+    base = {"p50_ms": 100, "p95_ms": 200, "p99_ms": 300, "throughput_rps": 50, "error_rate": 0.0}
+    assert regressions(dict(base, p99_ms=350), base, tolerance=0.2) == []
+
+    problems = regressions(dict(base, p99_ms=400, throughput_rps=30, error_rate=0.05), base, tolerance=0.2)
+    assert [p.split()[0] for p in problems] == ["p99_ms", "throughput_rps", "error_rate"]
+
+
+def test_stand_ins_serve_a_query(tmp_path, monkeypatch):
+    for name in ("bundle_dir", "use_bundle", "answer_store_path", "warmup_query", "warmup_enabled"):
+        monkeypatch.setattr(settings, name, getattr(settings, name))
+    monkeypatch.setattr(settings, "warmup_enabled", False)
+    monkeypatch.setattr(bundle, "_bundle", None)
+    monkeypatch.setattr(answer_store, "_store", None)
+    monkeypatch.setattr(embedders, "_override", None)
+    monkeypatch.setattr(memory, "_caches", {})
+    monkeypatch.setattr(rag_agent, "agent", rag_agent.agent)
+    monkeypatch.setattr(rag_agent, "get_model", rag_agent.get_model)
+    install_stand_ins(tmp_path, rows=100, embed_ms=0, llm_ms=0, jitter=0)
+    from knowledge_base.api import app
+
+    resp = TestClient(app).post("/rag/query", json={"prompt": "How do I deploy with azure?"})
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["answer"].startswith("Stub answer.")
+    bundle._bundle.close()
@@ -0,0 +1,36 @@
+import os
+
+from knowledge_base.mds_to_text import convert_file, markdown_to_text
+
+
+def test_strips_transcript_markup():
+    md = (
+        "# Fastapi CRUD app\n\n"
+        "**Kokchun Giang:** [00:00:00] Hello and welcome to ~~Fast ~~FastAPI, see "
+        "[the docs](https://fastapi.tiangolo.com) and `uvicorn`.\n\n\n\n"
+        "**Kokchun Giang-1:** here I am in *Visual Studio Code*.\n"
+    )
+    assert markdown_to_text(md) == (
+        "Fastapi CRUD app\n\n"
+        "Hello and welcome to FastAPI, see the docs and uvicorn.\n\n"
+        "here I am in Visual Studio Code.\n"
+    )
+
+
+def test_keeps_code_and_table_content():
+    md = "```python\nx = 1\n```\n\n| col | val |\n|-----|-----|\n| a | 1 |\n\n- item_one\n"
+    assert markdown_to_text(md) == "x = 1\n\ncol val\na 1\n\nitem_one\n"
+
+
+def test_convert_file_skips_up_to_date_output(tmp_path):
+    md_path = tmp_path / "video.md"
+    md_path.write_text("# Title\n\nBody text.\n", encoding="utf-8")
+
+    assert convert_file(md_path) == "written"
+    assert (tmp_path / "video.txt").read_text(encoding="utf-8") == "Title\n\nBody text.\n"
+    assert convert_file(md_path) == "skipped"
+
+    # Touched but content-identical source: output is left alone.
+    later = os.stat(md_path).st_mtime + 10
+    os.utime(md_path, (later, later))
+    assert convert_file(md_path) == "unchanged"
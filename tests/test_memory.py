@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from backend.config import settings
+from knowledge_base import memory
+from knowledge_base.bundle import IndexBundle, write_bundle
+from knowledge_base.embedders import HashEmbedder
+from knowledge_base.memory import MB, ByteBudgetCache, enforce_budget, register_cache, release_heap, rss_bytes
+from knowledge_base.retriever import RetrievedChunk
+from knowledge_base.sessions import SessionStore
+
+
+def test_byte_budget_cache_evicts_least_recently_used():
+    cache = ByteBudgetCache(max_bytes=100)
+    for key in "abc":
+        cache.put(key, key.upper(), 40)
+    assert cache.get("a") is None and cache.bytes == 80  # "a" evicted to fit "c"
+    assert cache.get("b") == "B"
+    cache.put("d", "D", 40)
+    assert cache.get("c") is None and cache.get("b") == "B"
+    assert cache.trim(40) == 40 and len(cache) == 1
+    assert cache.stats()["evictions"] == 3
+
+
+@pytest.mark.skipif(not memory._proc_status_kb("VmRSS"), reason="needs /proc/self/status")
+def test_large_corpus_stays_under_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, "_caches", {})
+    monkeypatch.setattr(settings, "hash_cache_mb", 2)
+    n, dim = 300_000, 64
+    path = tmp_path / "segments-big.bundle"
+    write_bundle(
+        path,
+        vectors=np.random.default_rng(0).random((n, dim), dtype=np.float32),
+        texts=[f"chunk {i}" for i in range(n)],
+        source_files=[f"video_{i // 100}.md" for i in range(n)],
+        chunk_indices=[i % 100 for i in range(n)],
+        collections=["transcripts"] * n,
+    )
+    release_heap()
+    budget = rss_bytes() + 40 * MB  # the mapped vectors alone are 73 MB
+
+    bundle = IndexBundle(path, verify=False)
+    register_cache("bundle", bundle.memory_stats, bundle.release)
+    q = np.full(dim, 0.5, dtype=np.float32)
+    top = [h.row for h in bundle.search(q, k=5)]
+    assert bundle.find_rows({"video_7.md": [0, 99, 100]}) == [700, 799]
+    stats = bundle.memory_stats()
+    assert stats["row_index_bytes"] == 16 * n
+    assert stats["resident_bytes"] >= n * dim * 4 and stats["bytes"] == stats["resident_bytes"] + 16 * n
+
+    embedder = HashEmbedder(256)
+    embedder.embed([" ".join(f"term{i}x{j}" for j in range(200)) for i in range(100)])  # 20k distinct words
+    assert embedder._cache.bytes <= 2 * MB and embedder._cache.stats()["evictions"] > 0
+
+    store = SessionStore(max_sessions=1000, ttl_s=600, max_bytes=MB)
+    register_cache("chat_sessions", store.stats, store.release)
+    for i in range(200):
+        session, _ = store.get_or_create()
+        session.chunks = [RetrievedChunk("video.md", j, "x" * 2000) for j in range(5)]
+        store.record_turn(session, reused=False, prompt_tokens=0)
+    assert store.bytes <= MB and len(store) < 200
+
+    assert rss_bytes() > budget
+    action = enforce_budget(budget)
+    assert action is not None and action["released"][0] == "bundle"  # the largest, counting mapped pages
+    assert rss_bytes() <= budget
+    assert bundle.memory_stats()["resident_bytes"] < 4 * MB
+    assert [h.row for h in bundle.search(q, k=5)] == top  # pages fault back in from the file
+    bundle.close()
+
+
+def test_middleware_enforces_budget_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(memory, "_last_check", 0.0)
+    threads = []
+    monkeypatch.setattr(memory, "enforce_budget", lambda: threads.append(threading.current_thread()))
+
+    async def app(scope, receive, send):
+        pass
+
+    async def run():
+        middleware = memory.MemoryBudgetMiddleware(app)
+        await middleware({"type": "http"}, None, None)
+        await middleware({"type": "http"}, None, None)  # throttled
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+    assert len(threads) == 1 and threads[0] is not loop_thread
@@ -0,0 +1,93 @@
+import lancedb
+import numpy as np
+
+from knowledge_base import neighbors
+from knowledge_base.bundle import IndexBundle, write_bundle
+from knowledge_base.ingestion import chunk_spans
+from knowledge_base.retriever import RetrievedChunk
+
+
+TEXT = "  " + " ".join(f"sentence number {i} about lancedb and chunking." for i in range(120)) + "\n"
+
+
+def rows_for(text):
+    return [
+        {"source_file": "a.md", "chunk_index": i, "char_start": s, "char_end": e, "text": chunk}
+        for i, (s, e, chunk) in enumerate(chunk_spans(text, chunk_size=300, overlap=60))
+    ]
+
+
+def test_chunk_spans_are_offsets_into_stripped_text():
+    stripped = TEXT.strip()
+    spans = chunk_spans(TEXT, chunk_size=300, overlap=60)
+    assert len(spans) > 5
+    for start, end, chunk in spans:
+        assert stripped[start:end] == chunk
+
+
+def test_stitch_drops_overlap_between_consecutive_chunks():
+    rows = rows_for(TEXT)
+    assert neighbors.stitch(rows[2:5]) == TEXT.strip()[rows[2]["char_start"]:rows[4]["char_end"]]
+
+
+def test_merge_passages_joins_adjacent_windows_and_keeps_hit_order():
+    rows = {("a.md", r["chunk_index"]): r for r in rows_for(TEXT)}
+    hits = [
+        RetrievedChunk("a.md", 8, rows[("a.md", 8)]["text"], score=0.2),
+        RetrievedChunk("a.md", 2, rows[("a.md", 2)]["text"], score=0.3),
+        RetrievedChunk("a.md", 3, rows[("a.md", 3)]["text"], score=0.4),
+    ]
+
+    passages = neighbors.merge_passages(hits, rows, n=1)
+
+    assert [(p.chunk_index, p.end_chunk_index) for p in passages] == [(7, 9), (1, 4)]
+    assert passages[0].score == 0.2 and passages[1].score == 0.3
+    assert passages[1].chunk_label == "1-4"
+    assert passages[1].text == TEXT.strip()[rows[("a.md", 1)]["char_start"]:rows[("a.md", 4)]["char_end"]]
+
+
+def test_merge_passages_stops_at_missing_neighbour():
+    rows = {("a.md", r["chunk_index"]): r for r in rows_for(TEXT)}
+    del rows[("a.md", 4)]
+    hits = [RetrievedChunk("a.md", 5, rows[("a.md", 5)]["text"], score=0.2)]
+
+    passages = neighbors.merge_passages(hits, rows, n=2)
+
+    assert [(p.chunk_index, p.end_chunk_index) for p in passages] == [(5, 7)]  # chunk 3 is not joined across the gap
+
+
+def test_fetch_chunks_uses_one_filtered_query(tmp_path, monkeypatch):
+    db = lancedb.connect(str(tmp_path))
+    data = rows_for(TEXT)
+    data += [dict(r, source_file="b's.md") for r in data]
+    table = db.create_table("t", data=[dict(r, embedding=[1.0, 0.0]) for r in data])
+    monkeypatch.setattr(neighbors, "load_bundle", lambda: None)
+    monkeypatch.setattr(neighbors, "active_table_name", lambda: "t")
+    monkeypatch.setattr(neighbors, "get_table", lambda name: table)
+
+    rows = neighbors.fetch_chunks({"a.md": [(0, 1)], "b's.md": [(4, 6)]})
+
+    assert sorted(rows) == [("a.md", 0), ("a.md", 1), ("b's.md", 4), ("b's.md", 5), ("b's.md", 6)]
+    assert rows[("b's.md", 5)]["char_start"] == data[5]["char_start"]
+
+
+def test_bundle_lookup_returns_offsets(tmp_path, monkeypatch):
+    data = rows_for(TEXT)
+    path = tmp_path / "t-v1.bundle"
+    write_bundle(
+        path,
+        vectors=np.ones((len(data), 2), dtype=np.float32),
+        texts=[r["text"] for r in data],
+        source_files=[r["source_file"] for r in data],
+        chunk_indices=[r["chunk_index"] for r in data],
+        collections=["transcripts"] * len(data),
+        char_spans=[(r["char_start"], r["char_end"]) for r in data],
+    )
+    bundle = IndexBundle(path)
+    monkeypatch.setattr(neighbors, "load_bundle", lambda: bundle)
+
+    rows = neighbors.fetch_chunks({"a.md": [(3, 4)], "missing.md": [(0, 1)]})
+
+    assert rows[("a.md", 4)] == data[4] | {"collection": "transcripts"}
+    assert len(rows) == 2
+    bundle.close()
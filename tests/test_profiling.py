@@ -0,0 +1,72 @@
+import json
+import pstats
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.config import settings
+from knowledge_base.profiling import ProfilingMiddleware, install_profiling
+
+
+def busy_search():
+    end = time.perf_counter() + 0.05
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.post("/rag/query")
+    async def query():
+        busy_search()
+        return {"answer": "ok"}
+
+    @app.get("/")
+    async def root():
+        return {"status": "ok"}
+
+    return app
+
+
+def test_not_installed_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "profile_header", False)
+    app = make_app()
+    assert install_profiling(app) is False
+    assert not any(m.cls is ProfilingMiddleware for m in app.user_middleware)
+
+
+def test_header_request_writes_speedscope_profile(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "profile_header", True)
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "profile_format", "speedscope")
+    monkeypatch.setattr(settings, "profile_dir", tmp_path)
+    app = make_app()
+    assert install_profiling(app)
+    client = TestClient(app)
+
+    assert "x-profile-file" not in client.post("/rag/query").headers
+    assert "x-profile-file" not in client.get("/", headers={"X-Profile": "1"}).headers  # outside profile_paths
+
+    res = client.post("/rag/query", headers={"X-Profile": "1"})
+    assert res.json() == {"answer": "ok"}
+    profile = json.loads((tmp_path / res.headers["x-profile-file"]).read_text(encoding="utf-8"))
+    names = {f["name"] for f in profile["shared"]["frames"]}
+    assert "busy_search" in names
+    assert all(p["type"] == "sampled" and len(p["samples"]) == len(p["weights"]) for p in profile["profiles"])
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_sampled_request_writes_pstats(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "profile_header", False)
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "profile_format", "pstats")
+    monkeypatch.setattr(settings, "profile_dir", tmp_path)
+    app = make_app()
+    install_profiling(app)
+
+    res = TestClient(app).post("/rag/query")
+    stats = pstats.Stats(str(tmp_path / res.headers["x-profile-file"]))
+    assert any(func[2] == "busy_search" for func in stats.stats)
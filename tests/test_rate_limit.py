@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+from google.genai import errors as genai_errors
+
+from knowledge_base.rate_limit import RateLimiter, TokenBucket, call_with_retry, is_retryable, retry_after_s
+
+
+class FlakyEmbedHandler(BaseHTTPRequestHandler):
+    """Stand-in embedding endpoint: first `fail_first` calls get 429, all calls are slow."""
+
+    fail_first = 2
+    latency = 0.02
+    calls = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        with self.lock:
+            type(self).calls += 1
+            n = type(self).calls
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+
+        if n <= self.fail_first:
+            self.send_response(429)
+            self.end_headers()
+            self.wfile.write(b'{"status": "RESOURCE_EXHAUSTED"}')
+            return
+
+        body = json.dumps({"embeddings": [{"values": [0.1, 0.2, 0.3]}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def embed_server():
+    FlakyEmbedHandler.calls = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyEmbedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/embed"
+    server.shutdown()
+
+
+def post_embed(url):
+    req = urllib.request.Request(url, data=b'{"contents": ["hi"]}', method="POST")
+    with urllib.request.urlopen(req, timeout=5) as res:
+        return json.loads(res.read())
+
+
+def test_retries_through_429s(embed_server):
+    sleeps = []
+    data = call_with_retry(lambda: post_embed(embed_server), max_retries=5, sleep=sleeps.append)
+
+    assert data["embeddings"][0]["values"] == [0.1, 0.2, 0.3]
+    assert FlakyEmbedHandler.calls == 3
+    assert len(sleeps) == 2
+
+
+def test_gives_up_after_max_retries(embed_server):
+    FlakyEmbedHandler.fail_first = 10
+    try:
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            call_with_retry(lambda: post_embed(embed_server), max_retries=2, sleep=lambda s: None)
+        assert exc.value.code == 429
+        assert FlakyEmbedHandler.calls == 3
+    finally:
+        FlakyEmbedHandler.fail_first = 2
+
+
+def test_non_retryable_error_is_raised_immediately():
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        call_with_retry(bad_request, sleep=lambda s: None)
+    assert len(calls) == 1
+
+
+def test_backoff_is_jittered_and_capped():
+    sleeps = []
+
+    class Quota(Exception):
+        code = 429
+
+    def always_429():
+        raise Quota()
+
+    with pytest.raises(Quota):
+        call_with_retry(always_429, max_retries=8, base_delay=1.0, max_delay=4.0, sleep=sleeps.append)
+
+    assert len(sleeps) == 8
+    assert all(0 <= s <= 4.0 for s in sleeps)
+
+
+def test_token_bucket_waits_when_empty():
+    bucket = TokenBucket(capacity=60, period=60.0)  # 1 unit / second
+    now = bucket.updated
+    assert bucket.reserve(60, now) == 0.0
+    assert bucket.reserve(2, now) == pytest.approx(2.0)
+
+
+def test_limiter_enforces_requests_and_tokens():
+    waits = []
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=100, sleep=waits.append)
+
+    limiter.acquire(tokens=10)
+    limiter.acquire(tokens=10)
+    assert waits == []
+
+    # Third request exceeds the 2 req/min bucket: ~30 s until one refills.
+    limiter.acquire(tokens=10)
+    assert waits and waits[0] == pytest.approx(30.0, rel=0.01)
+
+
+def test_limiter_shared_across_threads(embed_server):
+    FlakyEmbedHandler.fail_first = 0
+    waits = []
+    limiter = RateLimiter(requests_per_minute=5, sleep=waits.append)
+    try:
+        threads = [
+            threading.Thread(target=lambda: call_with_retry(lambda: post_embed(embed_server), limiter=limiter))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        FlakyEmbedHandler.fail_first = 2
+
+    assert FlakyEmbedHandler.calls == 8
+    # 5 fit the initial bucket, the remaining 3 had to wait for refill.
+    assert len(waits) == 3
+
+
+def test_network_errors_of_http_clients_are_retryable():
+    request = httpx.Request("POST", "https://generativelanguage.googleapis.com")
+    assert is_retryable(httpx.ConnectError("dns", request=request))
+    assert is_retryable(httpx.ReadTimeout("slow", request=request))
+    assert is_retryable(httpx.RemoteProtocolError("reset", request=request))
+    assert is_retryable(requests.exceptions.ConnectionError("refused"))
+    assert is_retryable(requests.exceptions.ReadTimeout("slow"))
+    assert not is_retryable(httpx.HTTPStatusError("bad", request=request, response=httpx.Response(400)))
+
+
+def test_retry_after_is_honoured_for_429_and_503():
+    request = httpx.Request("POST", "https://api")
+    limited = httpx.HTTPStatusError("quota", request=request,
+                                    response=httpx.Response(429, headers={"Retry-After": "7"}, request=request))
+    assert retry_after_s(limited) == 7.0
+    gemini = genai_errors.ClientError(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "details": [
+        {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "17s"}]}})
+    assert retry_after_s(gemini) == 17.0
+    not_quota = httpx.HTTPStatusError("boom", request=request,
+                                      response=httpx.Response(500, headers={"Retry-After": "7"}, request=request))
+    assert retry_after_s(not_quota) is None
+
+    sleeps = []
+    attempts = iter([limited, limited])
+
+    def flaky():
+        error = next(attempts, None)
+        if error is not None:
+            raise error
+        return "ok"
+
+    assert call_with_retry(flaky, base_delay=0.01, sleep=sleeps.append) == "ok"
+    assert sleeps == [7.0, 7.0]
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+
+from backend.config import settings
+from backend.routing import choose_route, classify_question, model_metrics, tier_route
+from knowledge_base import rag_agent
+from knowledge_base.deadline import Deadline
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(settings, "route_policy", "auto")
+    model_metrics.reset()
+    yield
+    model_metrics.reset()
+
+
+def test_questions_are_routed_by_type_and_context_size():
+    assert classify_question("What is LanceDB?") == "lookup"
+    assert classify_question("How do I deploy FastAPI to Azure and why use ASGI?") == "explain"
+    assert classify_question("Tell me about the course") == "general"
+
+    assert choose_route("What is LanceDB?", 1500).tier == "fast"
+    assert choose_route("What is LanceDB?", 6000).tier == "default"  # lookup, but lots of context
+    assert choose_route("Tell me about the course", 1500).model == settings.chat_model
+    assert choose_route("Tell me about the course", 20000).reason == "large_context"
+    assert choose_route("Compare LanceDB and pgvector", 1500).tier == "large"
+    assert choose_route("Compare LanceDB and pgvector", 1500, policy="default").tier == "default"
+    with pytest.raises(ValueError):
+        choose_route("q", 0, policy="cheapest")
+
+
+def test_slow_tiers_are_stepped_down_to_fit_the_budget():
+    for _ in range(10):
+        model_metrics.record(tier_route("large", "explain"), 8.0, 1000, 400)
+        model_metrics.record(tier_route("default", "general"), 3.0, 1000, 200)
+
+    assert choose_route("Why is ASGI faster?", 1500, budget_s=20).tier == "large"
+    route = choose_route("Why is ASGI faster?", 1500, budget_s=5)
+    assert route.tier == "default" and route.reason.startswith("latency:large")
+    assert choose_route("Why is ASGI faster?", 1500, budget_s=2).tier == "fast"
+
+    stats = model_metrics.snapshot()["models"][settings.route_large_model]
+    assert stats["calls"] == 10 and stats["p95_ms"] == 8000.0 and stats["mean_output_tokens"] == 400
+
+
+def test_stepped_down_tier_is_retried_once_its_samples_age_out(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(model_metrics, "_clock", lambda: now[0])
+    monkeypatch.setattr(model_metrics, "_max_age_s", 60.0)
+    for _ in range(10):
+        model_metrics.record(tier_route("large", "explain"), 8.0)
+    assert choose_route("Why is ASGI faster?", 1500, budget_s=5).tier == "default"
+
+    now[0] += 61  # no large-tier traffic since: its slow samples expire
+    assert choose_route("Why is ASGI faster?", 1500, budget_s=5).tier == "large"
+    for _ in range(10):
+        model_metrics.record(tier_route("large", "explain"), 2.0)  # recovered
+    assert choose_route("Why is ASGI faster?", 1500, budget_s=5).tier == "large"
+    assert model_metrics.snapshot()["models"][settings.route_large_model]["p95_ms"] == 2000.0
+
+
+def test_generation_uses_the_route_and_records_metrics(monkeypatch):
+    chunk = rag_agent.RetrievedChunk("lancedb.md", 0, "LanceDB is an embedded vector database.", score=0.3)
+    monkeypatch.setattr(rag_agent, "embed_query", lambda q, deadline=None: [0.0])
+    monkeypatch.setattr(rag_agent, "retrieve", lambda question, k, qvec: [chunk])
+    seen = {}
+
+    async def llm(messages, info):
+        seen["max_tokens"] = info.model_settings["max_tokens"]
+        seen["prompt"] = messages[-1].parts[-1].content
+        return ModelResponse(parts=[TextPart("An embedded vector database.")])
+
+    with rag_agent.agent.override(model=FunctionModel(llm)):
+        result = asyncio.run(rag_agent.answer_with_sources(
+            "What is LanceDB?", deadline=Deadline.after(5), compress=False, expand="off", neighbors=0,
+        ))
+
+    assert result.route.tier == "fast" and seen["max_tokens"] == settings.route_fast_max_tokens
+    assert seen["prompt"].endswith(result.route.hint)
+    snapshot = model_metrics.snapshot()
+    assert snapshot["models"][settings.route_fast_model]["calls"] == 1
+    assert snapshot["routes"] == {"fast:lookup": 1}
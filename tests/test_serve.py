@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+from backend.config import settings
+from knowledge_base import bundle, embedders, rate_limit
+from knowledge_base.serve import preload
+
+
+def test_lazy_clients_are_reset_in_forked_child(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_api_key", "test-key")
+    embedders.get_client()
+    rate_limit.embed_limiter()
+    assert embedders.get_client.cache_info().currsize == 1
+
+    pid = os.fork()
+    if pid == 0:
+        ok = embedders.get_client.cache_info().currsize == 0 and rate_limit._embed_limiter is None
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert embedders.get_client.cache_info().currsize == 1  # parent keeps its client
+    embedders.get_client.cache_clear()
+
+
+def test_preload_maps_active_bundle(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "bundle_dir", tmp_path)
+    monkeypatch.setattr(settings, "use_bundle", True)
+    monkeypatch.setattr(bundle, "_bundle", None)
+    assert preload() is None
+
+    vectors = np.eye(3, 8, dtype=np.float32)
+    bundle.write_bundle(
+        bundle.bundle_path("v1"), vectors=vectors, texts=["a", "b", "c"], source_files=["x.md"] * 3,
+        chunk_indices=[0, 1, 2], collections=["transcripts"] * 3, meta={"version": "v1"},
+    )
+    bundle.activate("v1")
+    assert preload() == "bundle v1 (3 rows)"
+    assert bundle.load_bundle() is bundle._bundle
+    bundle._bundle.close()
@@ -0,0 +1,94 @@
+import asyncio
+
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+
+from backend.config import settings
+from knowledge_base import rag_agent
+from knowledge_base.deadline import Deadline
+from knowledge_base.retriever import RetrievedChunk
+from knowledge_base.sessions import SessionStore, chat
+
+
+FASTAPI = RetrievedChunk("fastapi.md", 3, "FastAPI is a Python web framework. You deploy it with uvicorn, "
+                         "or to Azure Functions through the ASGI middleware.", score=0.3)
+DOCKER = RetrievedChunk("docker.md", 1, "Docker packages an application and its dependencies into an image.",
+                        score=0.4)
+
+
+def run_chat(monkeypatch, store, messages):
+    searched, prompts = [], []
+
+    def retrieve(query, k, qvec):
+        searched.append(query)
+        return [DOCKER] if "docker" in query.lower() else [FASTAPI]
+
+    async def llm(messages_, info):
+        prompts.append(messages_[-1].parts[-1].content)
+        return ModelResponse(parts=[TextPart(f"Answer number {len(prompts)}. More detail here.\nSources\n- x")])
+
+    monkeypatch.setattr(rag_agent, "embed_query", lambda q, deadline=None: [0.0])
+    monkeypatch.setattr(rag_agent, "retrieve", retrieve)
+    replies, session_id = [], None
+    with rag_agent.agent.override(model=FunctionModel(llm)):
+        for message in messages:
+            reply = asyncio.run(chat(message, session_id, deadline=Deadline.after(5), store=store))
+            session_id = reply.session_id
+            replies.append(reply)
+    return replies, searched, prompts
+
+
+def test_follow_ups_reuse_context_and_new_topics_retrieve(monkeypatch):
+    monkeypatch.setattr(settings, "query_expansion", "off")
+    monkeypatch.setattr(settings, "neighbor_window", 0)
+    monkeypatch.setattr(settings, "compress_context", False)
+    store = SessionStore(max_sessions=10, ttl_s=60)
+    replies, searched, prompts = run_chat(monkeypatch, store, [
+        "What is FastAPI?",
+        "And how do I deploy it?",  # covered by the FastAPI chunk
+        "What is Docker?",
+        "How does it compare to virtual machines?",  # refers back, but a new subject
+    ])
+
+    assert [r.reused_context for r in replies] == [False, True, False, False]
+    assert replies[0].new_session and not replies[1].new_session and replies[3].turn == 4
+    assert searched == [
+        "What is FastAPI?", "What is Docker?", "What is Docker? How does it compare to virtual machines?",
+    ]
+    assert "CONVERSATION SO FAR:\nUser: What is FastAPI?\nAssistant: Answer number 1." in prompts[1]
+    assert "Sources\n- x" not in prompts[1].split("TRANSCRIPT CONTEXT")[0]
+    assert "fastapi.md" in prompts[1] and "docker.md" in prompts[2]
+
+    metrics = store.metrics()
+    assert metrics["turns"] == 4 and metrics["retrievals"] == 3 and metrics["retrievals_avoided"] == 1
+    assert set(metrics["prompt_tokens_by_turn"]) == {"1", "2", "3", "4"}
+
+
+def test_long_conversations_keep_prompts_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "chat_history_turns", 2)
+    monkeypatch.setattr(settings, "chat_summary_chars", 300)
+    store = SessionStore(max_sessions=10, ttl_s=60)
+    questions = [f"What is FastAPI feature number {i}?" for i in range(12)]
+    replies, _, prompts = run_chat(monkeypatch, store, questions)
+
+    history = prompts[-1].split("TRANSCRIPT CONTEXT")[0]
+    assert "Earlier in this conversation:\n- Q: What is FastAPI feature number" in history
+    assert "number 0?" not in history  # oldest summary lines dropped
+    assert history.count("User:") == 2
+    tokens = [r.result.prompt_tokens for r in replies]
+    assert max(tokens[8:]) - min(tokens[8:]) <= 2  # levels off instead of growing per turn
+
+
+def test_store_evicts_least_recently_used_and_idle_sessions():
+    now = [0.0]
+    store = SessionStore(max_sessions=2, ttl_s=100, clock=lambda: now[0])
+    a, _ = store.get_or_create()
+    b, _ = store.get_or_create()
+    assert store.get_or_create(a.id) == (a, False)  # a is now the most recent
+    c, _ = store.get_or_create()
+    assert len(store) == 2 and store.get_or_create(b.id)[1]  # b was evicted: a new session starts
+
+    now[0] = 500.0
+    assert store.get_or_create(a.id)[0] is not a  # expired
+    metrics = store.metrics()
+    assert metrics["sessions_evicted"] >= 1 and metrics["sessions_expired"] >= 1 and len(store) == 1
@@ -0,0 +1,88 @@
+import lancedb
+import numpy as np
+import pyarrow as pa
+
+from knowledge_base.shards import ShardedTable, open_table, replace_rows, table_exists
+from knowledge_base.tables import cleanup_versions, publish_table, table_names
+
+
+SCHEMA = pa.schema([
+    ("collection", pa.string()),
+    ("source_file", pa.string()),
+    ("chunk_index", pa.int64()),
+    ("text", pa.string()),
+    ("embedding", pa.list_(pa.float32(), 8)),
+])
+
+
+def make_rows(n=300):
+    rng = np.random.default_rng(0)
+    return [
+        {"collection": "transcripts" if i % 3 else "misc", "source_file": f"video_{i // 10}.md",
+         "chunk_index": i % 10, "text": f"chunk {i}", "embedding": rng.normal(size=8).astype(np.float32).tolist()}
+        for i in range(n)
+    ]
+
+
+def test_scatter_gather_matches_single_table(tmp_path):
+    db = lancedb.connect(str(tmp_path))
+    rows = make_rows()
+    single = db.create_table("segments_single", data=rows, schema=SCHEMA)
+    sharded = ShardedTable.create(db, "segments_sharded", SCHEMA, "hash", 4)
+    sharded.add(rows)
+
+    assert sorted(table_names(db))[:4] == [f"segments_sharded__s0{i}" for i in range(4)]
+    assert sharded.count_rows() == 300
+    # every file lands in exactly one shard
+    for shard in sharded.shards.values():
+        files = set(shard.to_arrow().column("source_file").to_pylist())
+        assert all(f not in set(s.to_arrow().column("source_file").to_pylist())
+                   for s in sharded.shards.values() if s is not shard for f in files)
+
+    q = np.random.default_rng(1).normal(size=8).astype(np.float32)
+    expected = single.search(q).where("collection = 'transcripts'").limit(7).to_list()
+    got = open_table(db, "segments_sharded").search(q).where("collection = 'transcripts'").limit(7).to_list()
+    assert [r["text"] for r in got] == [r["text"] for r in expected]
+    assert np.allclose([r["_distance"] for r in got], [r["_distance"] for r in expected])
+
+    found = sharded.search().where("source_file = 'video_3.md'").limit(None).to_list()
+    assert sorted(r["chunk_index"] for r in found) == list(range(10))
+
+
+def test_collection_shards_prune_filtered_searches_and_versions_drop_together(tmp_path, monkeypatch):
+    from backend.config import settings
+
+    monkeypatch.setattr(settings, "lancedb_dir", tmp_path)
+    monkeypatch.setattr(settings, "active_table", "")
+    db = lancedb.connect(str(tmp_path))
+    old = "segments_m_0123abcd_20261019000000_000000"
+    new = "segments_m_0123abcd_20261019000001_000001"
+    for name in (old, new):
+        ShardedTable.create(db, name, SCHEMA, "collection", 0).add(make_rows(30))
+    table = open_table(db, new)
+
+    assert set(table.shards) == {"misc", "transcripts"}
+    assert table.route("collection = 'transcripts'") == [table.shards["transcripts"]]
+    assert table.route("collection = 'other'") == []
+    assert len(table.route("chunk_index = 1")) == 2
+
+    publish_table(new)
+    assert cleanup_versions(db, keep=0) == [old]
+    assert not table_exists(db, old) and table_exists(db, new)
+
+
+def test_replace_rows_swaps_a_file_in_one_commit(tmp_path):
+    db = lancedb.connect(str(tmp_path))
+    rows = make_rows(30)
+    single = db.create_table("segments_single", data=rows, schema=SCHEMA)
+    sharded = ShardedTable.create(db, "segments_sharded", SCHEMA, "hash", 2)
+    sharded.add(rows)
+    new = [dict(r, text=f"new {r['chunk_index']}") for r in rows if r["source_file"] == "video_1.md"][:4]
+
+    version = single.version
+    for table in (single, sharded):
+        replace_rows(table, "source_file = 'video_1.md'", new, ["source_file", "chunk_index"])
+        found = table.search().where("source_file = 'video_1.md'").limit(None).to_list()
+        assert sorted(r["text"] for r in found) == [f"new {i}" for i in range(4)]  # chunks 4-9 deleted
+        assert table.count_rows() == 24
+    assert single.version == version + 1
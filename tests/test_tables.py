@@ -0,0 +1,84 @@
+import lancedb
+
+from backend.config import settings
+from knowledge_base.tables import (
+    active_table_name,
+    cleanup_versions,
+    publish_table,
+    read_pointer,
+    table_names,
+    table_versions,
+    version_prefix,
+)
+
+
+def test_version_prefix_changes_with_embedder_and_chunking(monkeypatch):
+    monkeypatch.setattr(settings, "lancedb_table", "segments")
+    monkeypatch.setattr(settings, "chunk_size", 1200)
+    base = version_prefix("models/text-embedding-004", 768)
+    assert base.startswith("segments_models-text-embedding-004_")
+    assert version_prefix("models/text-embedding-004", 768) == base
+    assert version_prefix("hash-ngram-v1", 4096) != base
+
+    monkeypatch.setattr(settings, "chunk_size", 800)
+    assert version_prefix("models/text-embedding-004", 768) != base
+
+
+def test_cleanup_keeps_active_rollback_and_staging(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "lancedb_dir", tmp_path)
+    monkeypatch.setattr(settings, "lancedb_table", "segments")
+    monkeypatch.setattr(settings, "active_table", "")
+    db = lancedb.connect(str(tmp_path))
+    names = [f"segments_hash-ngram-v1_0123abcd_2026101900000{i}_00000{i}" for i in range(5)]
+    for name in names + ["segments_notes"]:
+        db.create_table(name, data=[{"text": "x", "embedding": [0.0, 1.0]}])
+
+    assert table_versions(db) == names  # oldest first; tables without a run id are not versions
+    publish_table(names[1])
+    assert publish_table(names[2]) == names[1]
+    assert active_table_name() == names[2]
+
+    dropped = cleanup_versions(db, keep=1, protect=(names[4],))
+    # active (2) stays, the last published (1) is kept for rollback, staging (4) is protected;
+    # 0 and 3 were never published
+    assert dropped == [names[0], names[3]]
+    assert set(table_names(db)) == {names[1], names[2], names[4], "segments_notes"}
+
+    monkeypatch.setattr(settings, "active_table", names[4])
+    assert active_table_name() == names[4]  # pinned in settings, overrides the pointer
+
+
+def test_abandoned_staging_table_is_not_kept_as_rollback(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "lancedb_dir", tmp_path)
+    monkeypatch.setattr(settings, "lancedb_table", "segments")
+    monkeypatch.setattr(settings, "active_table", "")
+    db = lancedb.connect(str(tmp_path))
+    prev, partial, new = (f"segments_m_0123abcd_2026101900000{i}_00000{i}" for i in range(1, 4))
+    for name in (prev, partial, new):
+        db.create_table(name, data=[{"text": "x", "embedding": [0.0, 1.0]}])
+    publish_table(prev)  # partial: a run that crashed and was restarted with --fresh
+    publish_table(new)
+
+    assert cleanup_versions(db) == [partial]
+    assert set(table_names(db)) == {prev, new}
+
+    publish_table(prev)  # roll back, then forward again: history has no repeats
+    publish_table(new)
+    assert read_pointer()["history"] == [prev]
+
+
+def test_cleanup_keeps_pointer_target_while_a_table_is_pinned(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "lancedb_dir", tmp_path)
+    monkeypatch.setattr(settings, "lancedb_table", "segments")
+    monkeypatch.setattr(settings, "active_table", "")
+    db = lancedb.connect(str(tmp_path))
+    a, b, c = (f"segments_m_0123abcd_2026101900000{i}_00000{i}" for i in range(1, 4))
+    for name in (a, b, c):
+        db.create_table(name, data=[{"text": "x", "embedding": [0.0, 1.0]}])
+    publish_table(a)
+    publish_table(b)
+    monkeypatch.setattr(settings, "active_table", a)
+    publish_table(c)  # e.g. ingestion.main while ACTIVE_TABLE pins a
+
+    assert cleanup_versions(db, keep=1) == []  # a pinned, c published, b the rollback target
+    assert read_pointer()["table"] == c and set(table_names(db)) == {a, b, c}
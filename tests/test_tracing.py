@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.config import settings
+from knowledge_base import tracing
+from knowledge_base.tracing import TracingMiddleware, otlp_payload, span
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.post("/rag/query")
+    async def query():
+        with span("retrieve", k=5) as s:
+            await asyncio.to_thread(lambda: span_in_thread())
+            s.set(chunks=3)
+        return {"answer": "ok"}
+
+    app.add_middleware(TracingMiddleware)
+    return app
+
+
+def span_in_thread():
+    with span("search", backend="bundle") as s:
+        s.set(rows_returned=3)
+
+
+def test_spans_are_nested_exported_and_trace_id_returned(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "trace_exporter", "jsonl")
+    monkeypatch.setattr(settings, "trace_file", tmp_path / "spans.jsonl")
+
+    res = TestClient(make_app()).post("/rag/query", headers={"X-Request-ID": "req-42"})
+    tracing.exporter.flush()
+
+    assert res.headers["x-request-id"] == "req-42"
+    spans = {s["name"]: s for s in map(json.loads, (tmp_path / "spans.jsonl").read_text().splitlines())}
+    root, retrieve, search = spans["POST /rag/query"], spans["retrieve"], spans["search"]
+    assert {s["trace_id"] for s in spans.values()} == {res.headers["x-trace-id"]}
+    assert root["parent_id"] is None and root["kind"] == "server"
+    assert root["attributes"]["http.status_code"] == 200
+    assert retrieve["parent_id"] == root["span_id"]
+    assert search["parent_id"] == retrieve["span_id"]  # followed into the worker thread
+    assert retrieve["attributes"] == {"k": 5, "chunks": 3}
+
+
+def test_incoming_traceparent_is_continued_and_none_records_nothing(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "trace_exporter", "none")
+    monkeypatch.setattr(settings, "trace_file", tmp_path / "spans.jsonl")
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+    res = TestClient(make_app()).post(
+        "/rag/query", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01", "X-Request-ID": "bad id!"}
+    )
+    tracing.exporter.flush()
+
+    assert res.headers["x-trace-id"] == trace_id
+    assert res.headers["x-request-id"] != "bad id!"
+    assert not (tmp_path / "spans.jsonl").exists()
+
+
+def test_otlp_payload_shape():
+    s = tracing.Span("llm.generate", "a" * 32, "b" * 16, "c" * 16, start_ns=1, end_ns=2,
+                     attributes={"prompt_chars": 1200, "model": "gemini", "ok": True, "budget_s": 1.5})
+    otlp = otlp_payload([s])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert otlp["parentSpanId"] == "c" * 16 and otlp["kind"] == 1
+    assert otlp["startTimeUnixNano"] == "1" and otlp["status"] == {"code": 1}
+    values = {a["key"]: a["value"] for a in otlp["attributes"]}
+    assert values == {
+        "prompt_chars": {"intValue": "1200"},
+        "model": {"stringValue": "gemini"},
+        "ok": {"boolValue": True},
+        "budget_s": {"doubleValue": 1.5},
+    }
+
+
+def test_exporter_is_bounded_and_backs_off_while_the_collector_is_down(monkeypatch):
+    monkeypatch.setattr(settings, "trace_exporter", "otlp")
+    monkeypatch.setattr(settings, "trace_export_backoff_max_s", 4.0)
+    now = [0.0]
+    calls = []
+
+    def collector_down(spans, endpoint):
+        calls.append(len(spans))
+        raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(tracing, "export_otlp", collector_down)
+    exporter = tracing._Exporter(maxsize=2, clock=lambda: now[0])
+    monkeypatch.setattr(exporter, "_start", lambda: None)  # no thread: drive the queue by hand
+
+    for _ in range(5):
+        exporter.submit([])
+    assert exporter.stats()["queued"] == 2 and exporter.dropped == 3
+
+    exporter.export(exporter._queue.get())  # fails: pause 1 s
+    exporter.export(exporter._queue.get())  # within the pause: dropped without a request
+    assert calls == [0] and exporter.dropped == 5
+    for expected_pause in (2.0, 4.0, 4.0):  # doubles up to trace_export_backoff_max_s
+        now[0] = exporter._retry_at
+        exporter.export([])
+        assert exporter._retry_at - now[0] == expected_pause
+
+    monkeypatch.setattr(tracing, "export_otlp", lambda spans, endpoint: None)
+    now[0] = exporter._retry_at
+    exporter.export([])
+    assert exporter.stats()["failures"] == 0 and exporter.exported == 1
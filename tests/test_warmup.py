@@ -0,0 +1,94 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from backend.config import settings
+from knowledge_base import warmup
+from knowledge_base.api import app
+
+
+def test_ready_is_503_until_warmup_finishes(monkeypatch):
+    gate = asyncio.Event()
+
+    async def slow_warm_up():
+        warmup.state.started = True
+        await gate.wait()
+        warmup.state.ready = True
+        return warmup.state
+
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+    monkeypatch.setattr(warmup, "_task", None)
+    monkeypatch.setattr(warmup, "warm_up", slow_warm_up)
+
+    with TestClient(app) as client:
+        res = client.get("/ready")
+        assert res.status_code == 503
+        assert res.json()["status"] == "warming"
+
+        client.portal.call(gate.set)
+        for _ in range(50):
+            if client.get("/ready").status_code == 200:
+                break
+        assert client.get("/ready").json()["status"] == "ready"
+
+
+def test_optional_step_failure_does_not_block_readiness(monkeypatch):
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+    monkeypatch.setattr(warmup, "load_index", lambda: "index")
+    monkeypatch.setattr(warmup, "get_client", lambda: None)
+    monkeypatch.setattr(warmup, "answer_store", lambda: None)
+
+    def quota(text):
+        raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+    monkeypatch.setattr(warmup, "embed_query", quota)
+
+    state = asyncio.run(warmup.warm_up())
+    assert state.ready
+    assert "embed" in state.warnings
+    assert set(state.steps_ms) == {"index", "clients", "embed"}
+
+
+def test_index_failure_marks_not_ready(monkeypatch):
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+
+    def missing():
+        raise FileNotFoundError("no table")
+
+    monkeypatch.setattr(warmup, "load_index", missing)
+
+    state = asyncio.run(warmup.warm_up())
+    assert not state.ready
+    assert state.to_dict()["status"] == "failed"
+
+
+def test_failed_warmup_is_retried_until_ready(monkeypatch):
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+    monkeypatch.setattr(warmup, "_task", None)
+    monkeypatch.setattr(warmup, "get_client", lambda: None)
+    monkeypatch.setattr(warmup, "answer_store", lambda: None)
+    monkeypatch.setattr(settings, "warmup_embed", False)
+    monkeypatch.setattr(settings, "warmup_retry_s", 0.0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FileNotFoundError("no table yet")
+        return "index"
+
+    monkeypatch.setattr(warmup, "load_index", flaky)
+
+    with TestClient(app) as client:
+        for _ in range(100):
+            res = client.get("/ready")
+            if res.status_code == 200:
+                break
+        assert res.json()["status"] == "ready" and res.json()["error"] is None
+        assert len(attempts) == 3 and warmup.state.failures == 0
+
+
+def test_retry_delay_backs_off(monkeypatch):
+    monkeypatch.setattr(settings, "warmup_retry_s", 5.0)
+    monkeypatch.setattr(settings, "warmup_retry_max_s", 30.0)
+    assert [warmup.retry_delay(n) for n in (1, 2, 3, 4, 5)] == [5.0, 10.0, 20.0, 30.0, 30.0]